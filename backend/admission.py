@@ -0,0 +1,218 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; retry_after is a hint in seconds"""
+
+    def __init__(self, provider_id: str, model_id: str, reason: str, retry_after: float):
+        self.provider_id = provider_id
+        self.model_id = model_id
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit for {provider_id}/{model_id}: {reason}")
+
+def estimate_request_tokens(messages, files=None, max_output_tokens: int = 1500) -> int:
+    """Cheap upper estimate of a request's token usage (about 4 characters per token) for rate limiting"""
+    chars = 0
+    for msg in messages:
+        content = msg.get("content")
+        chars += len(content) if isinstance(content, str) else len(str(content or ""))
+    for file in files or []:
+        chars += len(file.get("content") or "")
+    return chars // 4 + 4 * len(messages) + 1000 * sum(1 for f in files or [] if f.get("is_image")) + max_output_tokens
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute, holding at most one minute of budget"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken (0 if available now)"""
+        self._refill()
+        # Requests larger than the whole bucket are allowed once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+class _Waiter:
+    def __init__(self, tokens: int, future: asyncio.Future):
+        self.tokens = tokens
+        self.future = future
+
+class _ModelScheduler:
+    """
+    Admission for one provider/model: request and token buckets, and a bounded
+    wait queue served round-robin across users so one heavy user cannot
+    starve the others
+    """
+
+    def __init__(self, provider_id: str, model_id: str, requests_per_minute: Optional[float],
+                 tokens_per_minute: Optional[float], max_queue: int, max_wait: float):
+        self.provider_id = provider_id
+        self.model_id = model_id
+        self.limits = (requests_per_minute, tokens_per_minute)
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._queued = 0
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.admitted = 0
+        self.rejected = 0
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = 0.0
+        if self.request_bucket:
+            wait = max(wait, self.request_bucket.wait_time(1))
+        if self.token_bucket:
+            wait = max(wait, self.token_bucket.wait_time(tokens))
+        return wait
+
+    def _take(self, tokens: int):
+        if self.request_bucket:
+            self.request_bucket.take(1)
+        if self.token_bucket:
+            self.token_bucket.take(tokens)
+        self.admitted += 1
+
+    def _queue_drain_estimate(self) -> float:
+        """Rough time for the current queue to drain, used as the Retry-After hint"""
+        if self.request_bucket:
+            return (self._queued + 1) / self.request_bucket.rate
+        return self.max_wait
+
+    async def acquire(self, user_id: str, tokens: int):
+        # Fast path: nobody is waiting and the budget is available
+        if self._queued == 0 and self._wait_time(tokens) == 0:
+            self._take(tokens)
+            return
+
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(self.provider_id, self.model_id, "queue is full", self._queue_drain_estimate())
+
+        waiter = _Waiter(tokens, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(user_id, deque()).append(waiter)
+        self._queued += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted right at the deadline
+                return
+            waiter.future.cancel()
+            self.rejected += 1
+            raise AdmissionRejected(self.provider_id, self.model_id, "queue wait deadline exceeded", self._queue_drain_estimate())
+        except asyncio.CancelledError:
+            waiter.future.cancel()
+            raise
+
+    async def _dispatch(self):
+        """Grant queued requests as budget frees up, taking one request per user in turn"""
+        while self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+
+            if waiter.future.cancelled():
+                self._pop(user_id, queue)
+                continue
+
+            wait = self._wait_time(waiter.tokens)
+            if wait > 0:
+                await asyncio.sleep(min(wait, 1.0))
+                continue
+
+            self._take(waiter.tokens)
+            waiter.future.set_result(None)
+            self._pop(user_id, queue)
+            # Rotate this user to the back for fairness
+            if user_id in self._queues:
+                self._queues.move_to_end(user_id)
+
+    def _pop(self, user_id: str, queue: Deque[_Waiter]):
+        queue.popleft()
+        self._queued -= 1
+        if not queue:
+            del self._queues[user_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider_id,
+            "model": self.model_id,
+            "queued": self._queued,
+            "users_waiting": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": self.rejected
+        }
+
+class AdmissionController:
+    """
+    Per provider/model rate limiting in front of the providers. Limits come from
+    the model's (or provider's) "rate_limits" entry in ai_providers_config.json;
+    models without limits are admitted immediately.
+    """
+
+    def __init__(self, limits_lookup: Callable[[str, str], Optional[Dict[str, Any]]],
+                 max_queue: int = 100, max_wait: float = 10.0):
+        self.limits_lookup = limits_lookup
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._schedulers: Dict[Tuple[str, str], Optional[_ModelScheduler]] = {}
+
+    def _limits(self, provider_id: str, model_id: str) -> Tuple[Optional[float], Optional[float]]:
+        limits = self.limits_lookup(provider_id, model_id) or {}
+        return limits.get("requests_per_minute") or None, limits.get("tokens_per_minute") or None
+
+    def _scheduler(self, provider_id: str, model_id: str) -> Optional[_ModelScheduler]:
+        key = (provider_id, model_id)
+        if key not in self._schedulers:
+            rpm, tpm = self._limits(provider_id, model_id)
+            self._schedulers[key] = _ModelScheduler(
+                provider_id, model_id, rpm, tpm, self.max_queue, self.max_wait
+            ) if (rpm or tpm) else None
+        return self._schedulers[key]
+
+    async def acquire(self, user_id: Optional[str], provider_id: str, model_id: str, tokens: int):
+        """Wait for admission; raises AdmissionRejected when the queue is full or the deadline passes"""
+        scheduler = self._scheduler(provider_id, model_id)
+        if scheduler is None:
+            return
+        await scheduler.acquire(user_id or "anonymous", tokens)
+
+    def refresh(self):
+        """
+        Re-read limits after a configuration reload. Only schedulers whose
+        limits changed are dropped; the others keep their bucket levels, so a
+        reload does not hand every model a fresh minute of budget.
+        """
+        for key, scheduler in list(self._schedulers.items()):
+            current = scheduler.limits if scheduler is not None else (None, None)
+            if self._limits(*key) != current:
+                del self._schedulers[key]
+
+    def stats(self):
+        return [scheduler.stats() for scheduler in self._schedulers.values() if scheduler is not None]
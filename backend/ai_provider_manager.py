@@ -1,9 +1,21 @@
 import os
-import json
+import time
+import asyncio
 import logging
 from dotenv import load_dotenv
-import requests
 from typing import Dict, List, Optional, Any, Tuple
+from response_cache import ResponseCache, build_cache_key
+from single_flight import SingleFlight
+from provider_health import LatencyTracker, ProviderHealth, ProviderUnavailableError
+from local_inference import local_inference_available
+from admission import AdmissionController, AdmissionRejected, estimate_request_tokens
+from provider_registry import ProviderRegistry
+from tokenizer import count_tokens
+from tracing import tracer
+from retry import DeadlineExceeded, check_deadline, deadline_expired
+from metrics import (
+    PROVIDER_REQUEST_SECONDS, PROVIDER_FIRST_CHUNK_SECONDS, PROVIDER_REQUESTS_IN_FLIGHT, COMPLETION_TOKENS
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,49 +25,426 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 class AIProviderManager:
-    def __init__(self, config_path: str = "ai_providers_config.json"):
-        """Initialize the AI Provider Manager with the configuration file"""
-        self.config_path = config_path
-        self.providers_config = self._load_config()
+    def __init__(self, config_path: Optional[str] = None):
+        """Initialize the AI Provider Manager with the configuration file (located automatically when not given)"""
+        self.registry = ProviderRegistry(
+            config_path,
+            reload_interval=float(os.getenv("PROVIDER_CONFIG_RELOAD_SECONDS", "5"))
+        )
+        self.config_path = self.registry.config_path
         self.api_keys = {
             "openai": os.getenv("OPENAI_API_KEY"),
             "gemini": os.getenv("GEMINI_API_KEY"),
             "deepseek": os.getenv("DEEPSEEK_API_KEY"),
             "mistral": os.getenv("MISTRAL_API_KEY")
         }
+        # The local Hugging Face backend needs no key, only its optional dependencies
+        self.local_inference_enabled = local_inference_available()
+        self.cache_enabled = os.getenv("RESPONSE_CACHE_ENABLED", "True").lower() in ["true", "1", "yes"]
+        self.response_cache = ResponseCache(
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+            max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+        )
+        self.single_flight = SingleFlight(
+            default_timeout=float(os.getenv("SINGLE_FLIGHT_TIMEOUT_SECONDS", "180"))
+        )
 
-    def _load_config(self) -> List[Dict[str, Any]]:
-        """Load the provider configuration from JSON file"""
-        try:
-            with open(self.config_path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading AI provider configuration: {str(e)}")
-            return []
+        # Hedging: fire a backup request when the primary is slower than its recent p95
+        self.hedging_enabled = os.getenv("HEDGING_ENABLED", "True").lower() in ["true", "1", "yes"]
+        self.hedge_percentile = float(os.getenv("HEDGE_PERCENTILE", "95"))
+        self.hedge_min_samples = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+        self.hedge_default_delay = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "10"))
+        self.hedge_min_delay = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "0.5"))
+        self.max_hedges = int(os.getenv("HEDGE_MAX_BACKUPS", "1"))
+        # Completion latency for blocking calls, time to first chunk for streams
+        self.completion_latency = LatencyTracker()
+        self.first_chunk_latency = LatencyTracker()
+
+        # Health scoring and circuit breaking per provider/model
+        self.health = ProviderHealth(
+            alpha=float(os.getenv("HEALTH_EWMA_ALPHA", "0.2")),
+            error_rate_threshold=float(os.getenv("CIRCUIT_ERROR_RATE_THRESHOLD", "0.5")),
+            timeout_rate_threshold=float(os.getenv("CIRCUIT_TIMEOUT_RATE_THRESHOLD", "0.3")),
+            min_requests=int(os.getenv("CIRCUIT_MIN_REQUESTS", "5")),
+            open_seconds=float(os.getenv("CIRCUIT_OPEN_SECONDS", "30")),
+            half_open_probes=int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1"))
+        )
+
+        # Rate limiting and admission control per provider/model
+        self.admission = AdmissionController(
+            self.get_rate_limits,
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "100")),
+            max_wait=float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "10"))
+        )
+        # Rebuild the rate limiters of models whose limits changed when the configuration is reloaded
+        self.registry.add_listener(lambda snapshot: self.admission.refresh())
 
     def has_valid_api_key(self, provider_id: str) -> bool:
         """Check if a provider has a valid API key configured"""
+        if provider_id == "huggingface":
+            return self.local_inference_enabled
         api_key = self.api_keys.get(provider_id)
         return api_key is not None and len(api_key) > 0 and api_key != f"your_{provider_id}_api_key_here"
 
+    def get_model_config(self, provider_id: str, model_id: str) -> Optional[Dict[str, Any]]:
+        """Get the configuration entry for a provider's model"""
+        model = self.registry.model(provider_id, model_id)
+        return model.config if model else None
+
+    def get_rate_limits(self, provider_id: str, model_id: str) -> Optional[Dict[str, Any]]:
+        """Get the rate limits of a model, falling back to its provider's limits"""
+        model = self.registry.model(provider_id, model_id)
+        if model is not None:
+            return model.rate_limits
+        provider = self.registry.provider(provider_id)
+        return provider.rate_limits if provider else None
+
+    async def admit(self, user_id: Optional[str], provider_id: str, model_id: str, messages, files=None):
+        """Wait for a model's rate limits to admit a request (raises AdmissionRejected)"""
+        tokens = estimate_request_tokens(messages, files)
+        await self.admission.acquire(user_id, provider_id, model_id, tokens)
+
+    def get_fallback_chain(self, provider_id: str, model_id: str) -> List[Tuple[str, str]]:
+        """Get the configured fallback (provider_id, model_id) pairs for a model, in order"""
+        model = self.registry.model(provider_id, model_id)
+        return list(model.fallbacks) if model else []
+
+    def get_candidates(self, provider_id: str, model_id: str, fallback: bool = True) -> List[Tuple[str, str]]:
+        """
+        Get the ordered list of (provider_id, model_id) pairs to try for a request:
+        the requested model followed by its fallback chain (unless fallback is
+        False), skipping providers without a valid API key and those whose
+        circuit breaker is open
+        """
+        # Fallback chains are de-duplicated and exclude the model itself when the registry compiles them
+        chain = [(provider_id, model_id)]
+        if fallback:
+            chain.extend(self.get_fallback_chain(provider_id, model_id))
+
+        candidates = [candidate for candidate in chain if self.has_valid_api_key(candidate[0])]
+        if not candidates:
+            logger.warning(f"No valid API key for {provider_id} or any of its fallbacks")
+            return [(provider_id, model_id)]
+
+        healthy = [candidate for candidate in candidates if self.health.is_available(*candidate)]
+        if not healthy:
+            retry_after = min(self.health.retry_after(*candidate) for candidate in candidates)
+            raise ProviderUnavailableError(candidates, retry_after)
+
+        if healthy[0] != (provider_id, model_id):
+            logger.warning(f"{provider_id}/{model_id} is unavailable, routing to {healthy[0][0]}/{healthy[0][1]}")
+        return healthy
+
     def get_model_details(self, provider_id: str, model_id: str) -> Tuple[str, str, bool]:
         """
         Get model details and determine if fallback is needed
         Returns: (provider_id, model_id, use_fallback)
         """
-        # Check if the primary provider has a valid API key
-        if not self.has_valid_api_key(provider_id):
-            logger.warning(f"No valid API key for {provider_id}")
-            return provider_id, model_id, False
-        
-        return provider_id, model_id, False
-
-    def execute_with_fallback(self, provider_id: str, model_id: str, execution_func, *args, **kwargs):
-        """Execute a function with the specified provider"""
-        effective_provider, effective_model, _ = self.get_model_details(provider_id, model_id)
-        
+        effective_provider, effective_model = self.get_candidates(provider_id, model_id)[0]
+        return effective_provider, effective_model, (effective_provider, effective_model) != (provider_id, model_id)
+
+    def hedge_delay(self, tracker: LatencyTracker, provider_id: str, model_id: str) -> float:
+        """Delay before hedging a request: the recent p95 latency, or a default until enough samples exist"""
+        delay = tracker.percentile(provider_id, model_id, self.hedge_percentile, self.hedge_min_samples)
+        if delay is None:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, delay)
+
+    def _cache_key(self, provider_id: str, model_id: str, messages, files, has_images) -> str:
+        """Cache key for a completion: provider, model, messages, file digests and generation params"""
+        return build_cache_key(provider_id, model_id, messages, files, {"has_images": has_images})
+
+    async def execute_with_fallback(self, provider_id: str, model_id: str, execution_func,
+                                    messages, files=None, has_images=False, use_cache: bool = True,
+                                    user_id: Optional[str] = None, fallback: bool = True):
+        """
+        Execute a coroutine function with the specified provider, serving repeated
+        identical requests from the response cache and coalescing identical
+        requests that are already in flight onto a single upstream call.
+        Only answers from the requested model are cached. Failures move down the model's fallback chain, and a slow primary is
+        hedged with a backup request to the next candidate. Every candidate
+        call, including fallbacks and hedges, is admitted against its own
+        model's rate limits; a candidate that is rejected counts as a failure
+        and the chain moves on. With fallback=False only the requested model
+        is tried.
+        execution_func should be an async function taking (provider_id, model_id, messages, files, has_images)
+        """
+        cache_key = self._cache_key(provider_id, model_id, messages, files, has_images)
+        use_cache = use_cache and self.cache_enabled
+        if use_cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Response cache hit for {provider_id}/{model_id}")
+                return cached
+
+        candidates = self.get_candidates(provider_id, model_id, fallback)
+
+        async def call():
+            result, served_by = await self._execute_candidates(
+                candidates, execution_func, messages, files, has_images, user_id
+            )
+            # The cache key names the requested model, so a fallback's answer is not stored under it
+            if use_cache and isinstance(result, str) and served_by == (provider_id, model_id):
+                self.response_cache.set(cache_key, result)
+            return result
+
+        # A call restricted to the requested model must not share the outcome of one that may fall back
+        return await self.single_flight.do(f"{cache_key}:{'fallback' if fallback else 'exact'}", call)
+
+    def _record_error(self, provider_id: str, model_id: str, error: BaseException) -> str:
+        """Record a failed call in the provider's health and return its outcome label"""
+        # A rate limit rejection never reached the provider, and a client deadline
+        # that ran out says nothing about it; neither may open the circuit
+        if isinstance(error, AdmissionRejected):
+            self.health.on_cancel(provider_id, model_id)
+            return "rejected"
+        if isinstance(error, DeadlineExceeded) or deadline_expired():
+            self.health.on_cancel(provider_id, model_id)
+            return "deadline"
+        self.health.record_failure(provider_id, model_id, error)
+        return "error"
+
+    async def _timed_call(self, provider_id: str, model_id: str, execution_func, messages, files, has_images,
+                          user_id: Optional[str] = None):
+        """Admit and run one provider call, and record its latency and outcome"""
+        # Rejected or out of time before the call started: not the provider's fault, so health is untouched
+        await self.admit(user_id, provider_id, model_id, messages, files)
+        check_deadline()
+        self.health.on_request(provider_id, model_id)
+        in_flight = PROVIDER_REQUESTS_IN_FLIGHT.labels(provider_id, model_id)
+        in_flight.inc()
+        started = time.monotonic()
         try:
-            return execution_func(effective_provider, effective_model, *args, **kwargs)
+            with tracer.child_span("provider.request", provider=provider_id, model=model_id):
+                result = await execution_func(provider_id, model_id, messages, files, has_images)
+        except asyncio.CancelledError:
+            self.health.on_cancel(provider_id, model_id)
+            PROVIDER_REQUEST_SECONDS.labels(provider_id, model_id, "cancelled").observe(time.monotonic() - started)
+            raise
         except Exception as e:
-            logger.error(f"Error executing with provider {effective_provider}, model {effective_model}: {str(e)}")
+            outcome = self._record_error(provider_id, model_id, e)
+            PROVIDER_REQUEST_SECONDS.labels(provider_id, model_id, outcome).observe(time.monotonic() - started)
             raise
+        finally:
+            in_flight.dec()
+        latency = time.monotonic() - started
+        self.completion_latency.record(provider_id, model_id, latency)
+        self.health.record_success(provider_id, model_id, latency)
+        PROVIDER_REQUEST_SECONDS.labels(provider_id, model_id, "success").observe(latency)
+        if isinstance(result, str):
+            COMPLETION_TOKENS.labels(provider_id, model_id).observe(count_tokens(result, provider_id, model_id))
+        return result
+
+    async def _execute_candidates(self, candidates: List[Tuple[str, str]], execution_func, messages, files, has_images,
+                                  user_id: Optional[str] = None):
+        """
+        Try candidates in order, hedging slow calls; the first successful result wins
+        Returns: (result, (provider_id, model_id) of the candidate that produced it)
+        """
+        remaining = list(candidates)
+        running: Dict[asyncio.Task, Tuple[str, str]] = {}
+        hedges_left = self.max_hedges if self.hedging_enabled else 0
+        last_error: Optional[Exception] = None
+        hedge_at = None
+
+        def launch():
+            nonlocal hedge_at
+            provider, model = remaining.pop(0)
+            task = asyncio.ensure_future(
+                self._timed_call(provider, model, execution_func, messages, files, has_images, user_id)
+            )
+            running[task] = (provider, model)
+            hedge_at = time.monotonic() + self.hedge_delay(self.completion_latency, provider, model)
+
+        launch()
+        try:
+            while running:
+                timeout = None
+                if hedges_left > 0 and remaining:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    slow_provider, slow_model = next(reversed(running.values()))
+                    logger.info(f"Hedging slow request to {slow_provider}/{slow_model} with {remaining[0][0]}/{remaining[0][1]}")
+                    hedges_left -= 1
+                    launch()
+                    continue
+
+                for task in done:
+                    provider, model = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return task.result(), (provider, model)
+                    last_error = error
+                    logger.error(f"Error executing with provider {provider}, model {model}: {str(error)}")
+
+                # Only move down the chain when nothing else is still in flight and time is left
+                if not running and remaining and not deadline_expired():
+                    logger.warning(f"Falling back to {remaining[0][0]}/{remaining[0][1]}")
+                    launch()
+
+            raise last_error
+        finally:
+            # Cancel the losers of a hedge race
+            for task in running:
+                task.cancel()
+
+    async def stream_with_fallback(self, provider_id: str, model_id: str, stream_func,
+                                   messages, files=None, has_images=False, use_cache: bool = True,
+                                   user_id: Optional[str] = None, admitted: bool = False):
+        """
+        Stream results from a generator function with the specified provider.
+        A cached response is replayed as a single chunk; a completed stream is cached.
+        Fallback and hedging apply until the first chunk arrives; after that the
+        winning stream is relayed to the end. Every candidate stream is admitted
+        against its own model's rate limits; admitted=True means the caller
+        already admitted the requested model.
+        stream_func should be an async generator function taking (provider_id, model_id, messages, files, has_images)
+        """
+        cache_key = self._cache_key(provider_id, model_id, messages, files, has_images)
+        use_cache = use_cache and self.cache_enabled
+        if use_cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Response cache hit for {provider_id}/{model_id}")
+                yield cached
+                return
+
+        candidates = self.get_candidates(provider_id, model_id)
+        check_deadline()
+        started = time.monotonic()
+        # Not made current: a span set inside a generator would leak into the consumer's context
+        span = tracer.start_span("provider.stream", {"provider": provider_id, "model": model_id})
+        try:
+            stream, first_chunk, (effective_provider, effective_model) = await self._open_stream(
+                candidates, stream_func, messages, files, has_images, user_id,
+                (provider_id, model_id) if admitted else None
+            )
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {str(e)}"
+            tracer.end_span(span)
+            raise
+        span.set_attribute("effective_provider", effective_provider)
+        span.set_attribute("effective_model", effective_model)
+        span.set_attribute("first_chunk_ms", round((time.monotonic() - started) * 1000, 1))
+
+        chunks = []
+        in_flight = PROVIDER_REQUESTS_IN_FLIGHT.labels(effective_provider, effective_model)
+        in_flight.inc()
+        try:
+            if first_chunk is not None:
+                chunks.append(first_chunk)
+                yield first_chunk
+            async for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {str(e)}"
+            outcome = self._record_error(effective_provider, effective_model, e)
+            PROVIDER_REQUEST_SECONDS.labels(effective_provider, effective_model, outcome).observe(time.monotonic() - started)
+            logger.error(f"Error streaming with provider {effective_provider}, model {effective_model}: {str(e)}")
+            raise
+        finally:
+            in_flight.dec()
+            tracer.end_span(span)
+            await stream.aclose()
+
+        text = "".join(chunks)
+        PROVIDER_REQUEST_SECONDS.labels(effective_provider, effective_model, "success").observe(time.monotonic() - started)
+        COMPLETION_TOKENS.labels(effective_provider, effective_model).observe(count_tokens(text, effective_provider, effective_model))
+
+        if use_cache and (effective_provider, effective_model) == (provider_id, model_id):
+            self.response_cache.set(cache_key, text)
+
+    async def _first_chunk(self, stream, provider_id: str, model_id: str, user_id: Optional[str],
+                           messages, files, admit: bool):
+        """
+        Admit a candidate stream (unless the caller already did) and wait for its first chunk
+        Returns: (first_chunk, started); first_chunk is None for an empty stream
+        """
+        if admit:
+            await self.admit(user_id, provider_id, model_id, messages, files)
+        started = time.monotonic()
+        try:
+            return await stream.__anext__(), started
+        except StopAsyncIteration:
+            return None, started
+
+    async def _open_stream(self, candidates: List[Tuple[str, str]], stream_func, messages, files, has_images,
+                           user_id: Optional[str] = None, admitted: Optional[Tuple[str, str]] = None):
+        """
+        Start streams down the candidate chain until one produces its first chunk,
+        hedging a slow first chunk with the next candidate. admitted is a
+        candidate the caller already admitted.
+        Returns: (stream, first_chunk, (provider_id, model_id)); first_chunk is None for an empty stream
+        """
+        remaining = list(candidates)
+        running: Dict[asyncio.Task, Tuple[Any, str, str]] = {}
+        hedges_left = self.max_hedges if self.hedging_enabled else 0
+        last_error: Optional[Exception] = None
+        hedge_at = None
+        winner = None
+
+        def launch():
+            nonlocal hedge_at
+            provider, model = remaining.pop(0)
+            stream = stream_func(provider, model, messages, files, has_images)
+            self.health.on_request(provider, model)
+            task = asyncio.ensure_future(self._first_chunk(
+                stream, provider, model, user_id, messages, files, (provider, model) != admitted
+            ))
+            running[task] = (stream, provider, model)
+            hedge_at = time.monotonic() + self.hedge_delay(self.first_chunk_latency, provider, model)
+
+        launch()
+        try:
+            while running and winner is None:
+                timeout = None
+                if hedges_left > 0 and remaining:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    logger.info(f"Hedging slow stream with {remaining[0][0]}/{remaining[0][1]}")
+                    hedges_left -= 1
+                    launch()
+                    continue
+
+                for task in done:
+                    stream, provider, model = running.pop(task)
+                    error = task.exception()
+                    if winner is None and error is None:
+                        first_chunk, started = task.result()
+                        latency = time.monotonic() - started
+                        self.first_chunk_latency.record(provider, model, latency)
+                        PROVIDER_FIRST_CHUNK_SECONDS.labels(provider, model).observe(latency)
+                        self.health.record_success(provider, model, latency)
+                        winner = (stream, first_chunk, (provider, model))
+                        continue
+                    if error is not None:
+                        self._record_error(provider, model, error)
+                        last_error = error
+                        logger.error(f"Error streaming with provider {provider}, model {model}: {str(error)}")
+                    await stream.aclose()
+
+                if winner is None and not running and remaining and not deadline_expired():
+                    logger.warning(f"Falling back to {remaining[0][0]}/{remaining[0][1]}")
+                    launch()
+
+            if winner is None:
+                raise last_error
+            return winner
+        finally:
+            # Cancel the losers of a hedge race and release their connections
+            for task, (stream, provider, model) in running.items():
+                self.health.on_cancel(provider, model)
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+                await stream.aclose()
@@ -0,0 +1,229 @@
+import json
+import zlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import and_, bindparam, delete, insert, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import ChatThread, Message, FileAttachment, AIJob, MessageArchive
+from loaders import MESSAGE_WITH_FILES
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Version of the archived payload layout
+ARCHIVE_FORMAT = 1
+
+# Tables whose size the archiver reports
+ARCHIVE_TABLES = ["messages", "file_attachments", "message_archives"]
+
+def pack_messages(messages: List[Message]) -> Dict[str, Any]:
+    """Compress a thread's messages and attachments; returns the MessageArchive column values"""
+    raw = json.dumps({
+        "format": ARCHIVE_FORMAT,
+        "messages": [{
+            "id": message.id,
+            "content": message.content,
+            "sender": message.sender,
+            "timestamp": message.timestamp.isoformat() if message.timestamp else None,
+            "user_id": message.user_id,
+            "files": [{
+                "id": file.id,
+                "name": file.name,
+                "type": file.type,
+                "size": file.size,
+                "url": file.url,
+                "preview": file.preview
+            } for file in message.files]
+        } for message in messages]
+    }, separators=(",", ":")).encode()
+    return {
+        "message_count": len(messages),
+        "original_bytes": len(raw),
+        "payload": zlib.compress(raw, 6)
+    }
+
+def unpack_messages(payload: bytes) -> List[Dict[str, Any]]:
+    data = json.loads(zlib.decompress(payload))
+    if data.get("format") != ARCHIVE_FORMAT:
+        raise ValueError(f"Unsupported archive format {data.get('format')}")
+    return data["messages"]
+
+async def archive_thread(db: AsyncSession, thread_id: str, cutoff: datetime) -> Optional[Dict[str, int]]:
+    """
+    Move the messages of a thread idle since before cutoff into
+    message_archives, in one transaction
+    Returns: {"messages", "original_bytes", "archived_bytes"}, or None if the
+    thread was skipped (empty, already archived or written to since cutoff)
+    """
+    # Lock the thread so a message written meanwhile waits for the archive to commit
+    locked = (await db.execute(
+        select(ChatThread.id).where(
+            ChatThread.id == thread_id,
+            ChatThread.archived_at.is_(None),
+            ChatThread.updated_at < cutoff
+        ).with_for_update()
+    )).scalar_one_or_none()
+    if locked is None:
+        await db.rollback()
+        return None
+
+    messages = (await db.execute(
+        select(Message).options(*MESSAGE_WITH_FILES).where(
+            Message.thread_id == thread_id
+        ).order_by(Message.timestamp, Message.id)
+    )).scalars().all()
+    if not messages:
+        await db.rollback()
+        return None
+
+    now = datetime.utcnow()
+    packed = pack_messages(messages)
+    db.add(MessageArchive(thread_id=thread_id, archived_at=now, **packed))
+    message_ids = select(Message.id).where(Message.thread_id == thread_id)
+    # Jobs keep their status and error; only the link to the answer is dropped
+    await db.execute(
+        update(AIJob).where(AIJob.message_id.in_(message_ids)).values(message_id=None).execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        delete(FileAttachment).where(FileAttachment.message_id.in_(message_ids)).execution_options(synchronize_session=False)
+    )
+    await db.execute(delete(Message).where(Message.thread_id == thread_id).execution_options(synchronize_session=False))
+    # updated_at is listed so the column's onupdate does not mark the thread as active
+    await db.execute(
+        update(ChatThread).where(ChatThread.id == thread_id).values(
+            archived_at=now, updated_at=ChatThread.updated_at
+        ).execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return {
+        "messages": packed["message_count"],
+        "original_bytes": packed["original_bytes"],
+        "archived_bytes": len(packed["payload"])
+    }
+
+async def rehydrate_thread(db: AsyncSession, thread_id: str) -> int:
+    """
+    Move an archived thread's messages back into the messages table
+    Returns: number of messages restored (0 if another request restored them first)
+    """
+    archive = (await db.execute(
+        select(MessageArchive).where(MessageArchive.thread_id == thread_id).with_for_update()
+    )).scalar_one_or_none()
+    if archive is None:
+        await db.rollback()
+        return 0
+
+    messages = unpack_messages(archive.payload)
+    message_rows, file_rows = [], []
+    for message in messages:
+        message_rows.append({
+            "id": message["id"],
+            "content": message["content"],
+            "sender": message["sender"],
+            "timestamp": datetime.fromisoformat(message["timestamp"]) if message["timestamp"] else None,
+            "thread_id": thread_id,
+            "user_id": message["user_id"]
+        })
+        file_rows.extend(dict(file, message_id=message["id"]) for file in message["files"])
+
+    if message_rows:
+        await db.execute(insert(Message), message_rows)
+    if file_rows:
+        await db.execute(insert(FileAttachment), file_rows)
+    await db.execute(delete(MessageArchive).where(MessageArchive.thread_id == thread_id))
+    await db.execute(
+        update(ChatThread).where(ChatThread.id == thread_id).values(
+            archived_at=None, updated_at=ChatThread.updated_at
+        ).execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    logger.info(f"Restored {len(message_rows)} archived messages of thread {thread_id}")
+    return len(message_rows)
+
+async def archive_idle_threads(
+    Session,
+    older_than: timedelta,
+    batch_size: int = 100,
+    max_threads: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Archive threads not updated for older_than, oldest first, one
+    transaction per thread. Session is an async session factory.
+    """
+    cutoff = datetime.utcnow() - older_than
+    totals = {"threads": 0, "messages": 0, "original_bytes": 0, "archived_bytes": 0}
+    last = None
+    while max_threads is None or totals["threads"] < max_threads:
+        # Walk the candidates in (updated_at, id) order so skipped threads are not selected again
+        query = select(ChatThread.id, ChatThread.updated_at).where(
+            ChatThread.archived_at.is_(None),
+            ChatThread.updated_at < cutoff
+        )
+        if last is not None:
+            query = query.where(or_(
+                ChatThread.updated_at > last.updated_at,
+                and_(ChatThread.updated_at == last.updated_at, ChatThread.id > last.id)
+            ))
+        async with Session() as db:
+            candidates = (await db.execute(
+                query.order_by(ChatThread.updated_at, ChatThread.id).limit(batch_size)
+            )).all()
+        if not candidates:
+            break
+        last = candidates[-1]
+
+        for candidate in candidates:
+            if max_threads is not None and totals["threads"] >= max_threads:
+                break
+            async with Session() as db:
+                archived = await archive_thread(db, candidate.id, cutoff)
+            if archived is None:
+                continue
+            totals["threads"] += 1
+            for key, value in archived.items():
+                totals[key] += value
+    return totals
+
+async def restore_all_threads(Session) -> Dict[str, int]:
+    """Rehydrate every archived thread"""
+    totals = {"threads": 0, "messages": 0}
+    while True:
+        async with Session() as db:
+            thread_ids = (await db.execute(select(MessageArchive.thread_id).limit(100))).scalars().all()
+        if not thread_ids:
+            return totals
+        for thread_id in thread_ids:
+            async with Session() as db:
+                totals["messages"] += await rehydrate_thread(db, thread_id)
+            totals["threads"] += 1
+
+async def table_sizes(db: AsyncSession, analyze: bool = True) -> List[Dict[str, Any]]:
+    """
+    Row counts and on-disk size of the archive-related tables. MySQL sizes
+    come from information_schema (refreshed with ANALYZE TABLE when analyze
+    is set); other databases report exact row counts only.
+    """
+    if (await db.connection()).dialect.name == "mysql":
+        if analyze:
+            await db.execute(text(f"ANALYZE TABLE {', '.join(ARCHIVE_TABLES)}"))
+        rows = (await db.execute(
+            text(
+                "SELECT table_name AS name, table_rows AS row_count, data_length + index_length AS size "
+                "FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name IN :names"
+            ).bindparams(bindparam("names", expanding=True)),
+            {"names": ARCHIVE_TABLES}
+        )).mappings().all()
+        found = {row["name"]: row for row in rows}
+        return [{
+            "table": name,
+            "rows": int(found[name]["row_count"] or 0) if name in found else 0,
+            "bytes": int(found[name]["size"] or 0) if name in found else None
+        } for name in ARCHIVE_TABLES]
+
+    sizes = []
+    for name in ARCHIVE_TABLES:
+        count = (await db.execute(text(f"SELECT COUNT(*) FROM {name}"))).scalar()
+        sizes.append({"table": name, "rows": count, "bytes": None})
+    return sizes
@@ -0,0 +1,98 @@
+"""
+Message archiver.
+
+Moves the messages and attachments of threads that have not been updated
+for --older-than-days into the compressed message_archives table, keeping
+the messages table (and its indexes and backups) down to the active
+threads. Archived threads stay listed; their messages are restored the
+first time a member opens or writes to the thread. Prints the size of the
+affected tables before and after. Run it from cron, e.g. nightly.
+
+Usage:
+    python archive_messages.py [--older-than-days 90] [--batch-size 100] [--max-threads N]
+                               [--dry-run] [--restore-all] [--database-url URL]
+"""
+import os
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from database import ASYNC_DATABASE_URL
+from models import ChatThread, Message
+from archive import archive_idle_threads, restore_all_threads, table_sizes
+
+# Load environment variables
+load_dotenv()
+
+def format_bytes(size) -> str:
+    if size is None:
+        return "n/a"
+    if size < 1024:
+        return f"{size} B"
+    for unit in ["KiB", "MiB", "GiB"]:
+        size /= 1024
+        if size < 1024 or unit == "GiB":
+            return f"{size:.1f} {unit}"
+
+def print_sizes(title: str, sizes: List[Dict[str, Any]]):
+    print(title)
+    for entry in sizes:
+        print(f"  {entry['table']:<18} {entry['rows']:>12,} rows  {format_bytes(entry['bytes']):>12}")
+
+async def run(args):
+    engine = create_async_engine(args.database_url)
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    try:
+        async with Session() as db:
+            print_sizes("Before:", await table_sizes(db))
+
+        if args.restore_all:
+            totals = await restore_all_threads(Session)
+            print(f"Restored {totals['messages']:,} messages of {totals['threads']:,} threads")
+        elif args.dry_run:
+            cutoff = datetime.utcnow() - timedelta(days=args.older_than_days)
+            async with Session() as db:
+                threads, messages = (await db.execute(
+                    select(func.count(func.distinct(ChatThread.id)), func.count(Message.id)).join(
+                        Message, Message.thread_id == ChatThread.id
+                    ).where(
+                        ChatThread.archived_at.is_(None),
+                        ChatThread.updated_at < cutoff
+                    )
+                )).one()
+            print(f"Would archive {messages:,} messages of {threads:,} threads idle since {cutoff:%Y-%m-%d}")
+            return
+        else:
+            totals = await archive_idle_threads(
+                Session,
+                timedelta(days=args.older_than_days),
+                batch_size=args.batch_size,
+                max_threads=args.max_threads
+            )
+            ratio = totals["original_bytes"] / totals["archived_bytes"] if totals["archived_bytes"] else 0
+            print(
+                f"Archived {totals['messages']:,} messages of {totals['threads']:,} threads: "
+                f"{format_bytes(totals['original_bytes'])} compressed to {format_bytes(totals['archived_bytes'])} ({ratio:.1f}x)"
+            )
+
+        async with Session() as db:
+            print_sizes("After:", await table_sizes(db))
+    finally:
+        await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive the messages of idle threads")
+    parser.add_argument("--older-than-days", type=float, default=float(os.getenv("ARCHIVE_AFTER_DAYS", "90")))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("ARCHIVE_BATCH_SIZE", "100")))
+    parser.add_argument("--max-threads", type=int, help="stop after archiving this many threads")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be archived")
+    parser.add_argument("--restore-all", action="store_true", help="move every archived thread back")
+    parser.add_argument("--database-url", default=ASYNC_DATABASE_URL, help="async SQLAlchemy URL (default: the app database)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Round-trip benchmark for loading a large thread.
+
+Creates a thread with many messages and attachments, then loads and
+serialises it the way GET /api/threads/{thread_id} does, counting the
+statements sent to the database. For comparison it also runs the old plan,
+where pydantic lazy loads each message's attachments. Fails (exit code 1)
+when the endpoint plan needs more than --max-queries round trips.
+
+Usage:
+    python benchmark_thread_load.py [--messages 1000] [--attachments 500] [--runs 5]
+                                    [--max-queries 3] [--database-url URL] [--create-schema]
+"""
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from database import ASYNC_DATABASE_URL, Base
+from models import User, ChatThread, Message, FileAttachment, user_thread
+from schemas import ChatThreadResponse
+from loaders import THREAD_WITH_MESSAGES
+from query_counter import count_queries
+
+async def create_thread(Session, messages: int, attachments: int) -> str:
+    """Insert a user and a thread with the requested number of messages and attachments; returns the thread id"""
+    user_id, thread_id = str(uuid.uuid4()), str(uuid.uuid4())
+    started = datetime.utcnow() - timedelta(seconds=messages)
+    message_rows = [{
+        "id": str(uuid.uuid4()),
+        "content": f"Benchmark message {index} " + "lorem ipsum " * 20,
+        "sender": "user" if index % 2 == 0 else "assistant",
+        "timestamp": started + timedelta(seconds=index),
+        "thread_id": thread_id,
+        "user_id": user_id if index % 2 == 0 else None
+    } for index in range(messages)]
+    # Spread the attachments over the user messages
+    user_messages = [row["id"] for row in message_rows if row["sender"] == "user"] or [row["id"] for row in message_rows]
+    file_rows = [{
+        "id": str(uuid.uuid4()),
+        "name": f"file-{index}.txt",
+        "type": "text/plain",
+        "size": 1024,
+        "url": f"/uploads/benchmark-{index}.txt",
+        "message_id": user_messages[index % len(user_messages)]
+    } for index in range(attachments)]
+
+    async with Session() as db:
+        await db.execute(insert(User).values(
+            id=user_id, name="Benchmark", email=f"benchmark-{user_id}@example.com", password="-"
+        ))
+        await db.execute(insert(ChatThread).values(
+            id=thread_id, title="Benchmark thread", created_at=datetime.utcnow(), updated_at=datetime.utcnow()
+        ))
+        await db.execute(insert(user_thread).values(user_id=user_id, thread_id=thread_id))
+        if message_rows:
+            await db.execute(insert(Message), message_rows)
+        if file_rows:
+            await db.execute(insert(FileAttachment), file_rows)
+        await db.commit()
+    return thread_id
+
+async def remove_thread(Session, thread_id: str):
+    async with Session() as db:
+        user_ids = select(user_thread.c.user_id).where(user_thread.c.thread_id == thread_id)
+        users = (await db.execute(user_ids)).scalars().all()
+        message_ids = select(Message.id).where(Message.thread_id == thread_id)
+        await db.execute(delete(FileAttachment).where(FileAttachment.message_id.in_(message_ids)))
+        await db.execute(delete(Message).where(Message.thread_id == thread_id))
+        await db.execute(delete(user_thread).where(user_thread.c.thread_id == thread_id))
+        await db.execute(delete(ChatThread).where(ChatThread.id == thread_id))
+        await db.execute(delete(User).where(User.id.in_(users)))
+        await db.commit()
+
+async def load_with_endpoint_plan(Session, thread_id: str) -> int:
+    """Load and serialise the thread with the loader options used by the API; returns the payload size"""
+    async with Session() as db:
+        thread = (await db.execute(
+            select(ChatThread).options(*THREAD_WITH_MESSAGES).where(ChatThread.id == thread_id)
+        )).scalar_one()
+        return len(ChatThreadResponse.model_validate(thread).model_dump_json())
+
+async def load_with_lazy_plan(Session, thread_id: str) -> int:
+    """Load and serialise the thread relying on lazy loading, as the routes did before"""
+    def serialise(db):
+        thread = db.get(ChatThread, thread_id)
+        return len(ChatThreadResponse.model_validate(thread).model_dump_json())
+
+    async with Session() as db:
+        return await db.run_sync(serialise)
+
+async def measure(engine, Session, loader, thread_id: str, runs: int):
+    """Returns: (statements per load, best seconds, payload bytes)"""
+    best = None
+    queries = 0
+    size = 0
+    for _ in range(runs):
+        with count_queries(engine) as counter:
+            started = time.perf_counter()
+            size = await loader(Session, thread_id)
+            elapsed = time.perf_counter() - started
+        queries = counter.count
+        best = elapsed if best is None else min(best, elapsed)
+    return queries, best, size
+
+async def run(args) -> bool:
+    engine = create_async_engine(args.database_url)
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    if args.create_schema:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    thread_id = await create_thread(Session, args.messages, args.attachments)
+    try:
+        print(f"Thread with {args.messages} messages and {args.attachments} attachments")
+        ok = True
+        for name, loader in [("endpoint plan", load_with_endpoint_plan), ("lazy loading", load_with_lazy_plan)]:
+            queries, seconds, size = await measure(engine, Session, loader, thread_id, args.runs)
+            print(f"  {name:<14} {queries:>5} queries  {seconds * 1000:8.1f} ms  {size / 1024:8.1f} KiB")
+            if loader is load_with_endpoint_plan and queries > args.max_queries:
+                print(f"FAIL: the endpoint plan used {queries} queries (budget {args.max_queries})")
+                ok = False
+        return ok
+    finally:
+        await remove_thread(Session, thread_id)
+        await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Count database round trips for loading a large thread")
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--attachments", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-queries", type=int, default=3, help="round-trip budget for the endpoint plan")
+    parser.add_argument("--database-url", default=ASYNC_DATABASE_URL, help="async SQLAlchemy URL (default: the app database)")
+    parser.add_argument("--create-schema", action="store_true", help="create missing tables first")
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
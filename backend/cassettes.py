@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import uuid
+import base64
+import hashlib
+import logging
+from urllib.parse import parse_qsl, urlsplit
+from typing import Any, Dict, List, Optional
+import httpx
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Query parameters and headers that carry credentials and must never be written to disk
+SECRET_QUERY_PARAMS = {"key", "api_key"}
+# content-encoding is kept so a body the provider compressed anyway is replayed with it
+RECORDED_RESPONSE_HEADERS = {"content-type", "content-encoding"}
+
+def parse_body(body: bytes) -> Any:
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        pass
+    try:
+        return body.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(body).decode("ascii")}
+
+def encode_chunk(chunk: bytes) -> Dict[str, str]:
+    """Cassette form of a response chunk: text when it is valid UTF-8, base64 otherwise"""
+    try:
+        return {"data": chunk.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"data_base64": base64.b64encode(chunk).decode("ascii")}
+
+def decode_chunk(chunk: Dict[str, Any]) -> bytes:
+    """The exact bytes of a recorded chunk"""
+    if "data_base64" in chunk:
+        return base64.b64decode(chunk["data_base64"])
+    return chunk["data"].encode("utf-8")
+
+def cassette_key(method: str, path: str, query: str, body: Any) -> str:
+    """
+    Canonical key of a provider request: method, path relative to the
+    provider base URL, non-secret query parameters and the JSON body
+    """
+    params = sorted((name, value) for name, value in parse_qsl(query) if name not in SECRET_QUERY_PARAMS)
+    canonical = json.dumps(
+        {"method": method.upper(), "path": path, "query": params, "body": body},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def relative_path(url_path: str, base_path: str) -> str:
+    """Strip the provider base URL's path prefix from a request path"""
+    base_path = base_path.rstrip("/")
+    if base_path and url_path.startswith(base_path):
+        return url_path[len(base_path):] or "/"
+    return url_path
+
+class _RecordingStream(httpx.AsyncByteStream):
+    """Relays a response body while capturing each chunk and its offset from the request start"""
+
+    def __init__(self, inner: httpx.AsyncByteStream, cassette: Dict[str, Any], started: float, path: str):
+        self._inner = inner
+        self._cassette = cassette
+        self._started = started
+        self._path = path
+        self._saved = False
+
+    async def __aiter__(self):
+        chunks = self._cassette["response"]["chunks"]
+        async for chunk in self._inner:
+            chunks.append({
+                "offset_ms": round((time.monotonic() - self._started) * 1000, 2),
+                **encode_chunk(chunk)
+            })
+            yield chunk
+
+    async def aclose(self):
+        await self._inner.aclose()
+        if not self._saved:
+            self._saved = True
+            with open(self._path, "w", encoding="utf-8") as f:
+                json.dump(self._cassette, f, ensure_ascii=False, indent=2)
+            logger.info(f"Recorded cassette {self._path}")
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that forwards requests to the real provider and writes each
+    exchange, including streamed chunks and their timing, to a cassette file.
+    Chunks are stored as the exact bytes received (base64 when not UTF-8).
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, provider: str, base_url: str, cassette_dir: str):
+        self._inner = inner
+        self.provider = provider
+        self.base_path = urlsplit(base_url).path
+        self.directory = os.path.join(cassette_dir, provider)
+        os.makedirs(self.directory, exist_ok=True)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        path = relative_path(request.url.path, self.base_path)
+        query = request.url.query.decode("ascii") if isinstance(request.url.query, bytes) else request.url.query
+        key = cassette_key(request.method, path, query, parse_body(body))
+
+        # The recorder sees the body as sent on the wire; ask for it uncompressed
+        # so cassettes stay readable and replay byte for byte
+        request.headers["Accept-Encoding"] = "identity"
+        started = time.monotonic()
+        response = await self._inner.handle_async_request(request)
+
+        cassette = {
+            "provider": self.provider,
+            "key": key,
+            "recorded_at": time.time(),
+            "request": {
+                "method": request.method,
+                "path": path,
+                "query": [[name, value] for name, value in parse_qsl(query) if name not in SECRET_QUERY_PARAMS],
+                "body": parse_body(body)
+            },
+            "response": {
+                "status_code": response.status_code,
+                "headers": {
+                    name: value for name, value in response.headers.items()
+                    if name.lower() in RECORDED_RESPONSE_HEADERS
+                },
+                "headers_ms": round((time.monotonic() - started) * 1000, 2),
+                "chunks": []
+            }
+        }
+        path_on_disk = os.path.join(self.directory, f"{key[:16]}-{uuid.uuid4().hex[:8]}.json")
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, cassette, started, path_on_disk),
+            extensions=response.extensions
+        )
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+class CassetteLibrary:
+    """
+    Cassettes loaded from a directory and indexed by provider and request key.
+    Repeated identical requests cycle through all recordings made for them.
+    """
+
+    def __init__(self, cassette_dir: str):
+        self.cassette_dir = cassette_dir
+        self._cassettes: Dict[str, List[Dict[str, Any]]] = {}
+        self._next: Dict[str, int] = {}
+        self.load()
+
+    def load(self):
+        self._cassettes.clear()
+        count = 0
+        for root, _, filenames in os.walk(self.cassette_dir):
+            for filename in sorted(filenames):
+                if not filename.endswith(".json"):
+                    continue
+                with open(os.path.join(root, filename), "r", encoding="utf-8") as f:
+                    cassette = json.load(f)
+                index_key = f"{cassette['provider']}:{cassette['key']}"
+                self._cassettes.setdefault(index_key, []).append(cassette)
+                count += 1
+        logger.info(f"Loaded {count} cassettes from {self.cassette_dir}")
+
+    def find(self, provider: str, key: str) -> Optional[Dict[str, Any]]:
+        recordings = self._cassettes.get(f"{provider}:{key}")
+        if not recordings:
+            return None
+        index_key = f"{provider}:{key}"
+        position = self._next.get(index_key, 0)
+        self._next[index_key] = (position + 1) % len(recordings)
+        return recordings[position]
+
+    def __len__(self) -> int:
+        return sum(len(recordings) for recordings in self._cassettes.values())
@@ -0,0 +1,122 @@
+"""
+Import-time budget check for the API worker.
+
+Imports `main:app` in a fresh interpreter with `-X importtime`, reports the
+slowest imports and fails (exit code 1) when total startup import time
+exceeds the budget or when a heavy dependency that should be lazy-loaded
+is imported at startup.
+
+Single imports vary by several hundred milliseconds, so the app and a
+baseline of the framework imports are measured alternately and the fastest
+run of each is compared. The budget is a multiple of the baseline, which
+scales with the machine; --budget-ms adds an absolute cap.
+
+Usage:
+    python check_import_time.py [--budget-ratio 3] [--budget-ms MS] [--top 15] [--runs 5]
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+# Heavy dependencies that must only be imported on first use
+LAZY_MODULES = ["torch", "transformers", "tiktoken", "PyPDF2", "docx", "PIL"]
+
+# Framework imports every worker pays for; the budget is relative to them
+BASELINE_MODULES = "fastapi, pydantic, sqlalchemy.ext.asyncio"
+
+# Fewer runs than this let one slow import decide the result
+MIN_RUNS = 3
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+def measure_imports(module: str) -> Tuple[List[Tuple[str, int, int]], int]:
+    """
+    Import a module in a fresh interpreter and parse its -X importtime output
+    Returns: ([(name, self_us, cumulative_us), ...], total_us)
+    """
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr[-4000:])
+        raise SystemExit(f"Importing {module} failed")
+
+    imports = []
+    total = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match.group(1)), int(match.group(2)), match.group(3), match.group(4)
+        imports.append((name, self_us, cumulative_us))
+        # Top-level imports carry a single space of indentation; their cumulative times add up to the total
+        if len(indent) == 1:
+            total += cumulative_us
+    return imports, total
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the startup import time of the API worker")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--budget-ratio", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_RATIO", "3")),
+                        help="Budget as a multiple of the baseline import time")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "0")) or None,
+                        help="Absolute budget in milliseconds, checked in addition to the ratio")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to report")
+    parser.add_argument("--runs", type=int, default=5, help=f"Take the best of this many runs (at least {MIN_RUNS})")
+    args = parser.parse_args()
+    runs = max(args.runs, MIN_RUNS)
+
+    best_total = None
+    best_imports = []
+    baseline_total = None
+    # Alternate the two measurements so a slow spell affects both alike
+    for _ in range(runs):
+        imports, total = measure_imports(args.module)
+        if best_total is None or total < best_total:
+            best_total, best_imports = total, imports
+        _, total = measure_imports(BASELINE_MODULES)
+        if baseline_total is None or total < baseline_total:
+            baseline_total = total
+    budget_ms = baseline_total / 1000 * args.budget_ratio
+
+    # Aggregate by top-level package so nested submodules don't crowd the report
+    by_package: Dict[str, int] = {}
+    for name, self_us, _ in best_imports:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+
+    print(f"Import time for '{args.module}': {best_total / 1000:.1f} ms (best of {runs})")
+    print(
+        f"Budget: {budget_ms:.0f} ms ({args.budget_ratio:g} x {baseline_total / 1000:.1f} ms for {BASELINE_MODULES})"
+        + (f", at most {args.budget_ms:.0f} ms" if args.budget_ms else "")
+    )
+    print(f"\nSlowest packages (self time):")
+    for package, self_us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+
+    failures = []
+    imported = {name.split(".")[0] for name, _, _ in best_imports}
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        failures.append(f"Heavy modules imported at startup: {', '.join(eager)}")
+    if best_total / 1000 > budget_ms:
+        failures.append(f"Import time {best_total / 1000:.1f} ms exceeds {args.budget_ratio:g} x the baseline ({budget_ms:.0f} ms)")
+    if args.budget_ms and best_total / 1000 > args.budget_ms:
+        failures.append(f"Import time {best_total / 1000:.1f} ms exceeds budget of {args.budget_ms:.0f} ms")
+
+    if failures:
+        print()
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("\nOK")
+
+if __name__ == "__main__":
+    main()
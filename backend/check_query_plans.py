@@ -0,0 +1,270 @@
+"""
+Query plan regression check for the hot queries.
+
+Runs the queries behind the thread, history, message and job routes, then
+EXPLAINs every statement they sent and fails (exit code 1) when a plan
+reads a whole table or sorts rows outside an index (MySQL "Using filesort"
+or "Using temporary", SQLite "USE TEMP B-TREE"). Plans depend on table
+statistics, so by default synthetic users, threads and messages are
+inserted first and removed afterwards; use --no-seed to check the plans
+against the data already in the database.
+
+Usage:
+    python check_query_plans.py [--database-url URL] [--users 20] [--threads 20]
+                                [--messages 50] [--no-seed] [--verbose]
+"""
+import sys
+import uuid
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+from sqlalchemy import create_engine, delete, event, insert, select
+from sqlalchemy.orm import Session
+from database import DATABASE_URL
+from models import User, ChatThread, Message, FileAttachment, AIJob, user_thread
+from jobs import JOB_QUEUED, JOB_COMPLETED
+from pagination import page_size
+from queries import (
+    thread_list_query, history_query, membership_query, thread_archived_query, thread_with_messages_query,
+    message_page_query, context_history_query, last_user_message_query, thread_members_query,
+    job_query, queued_jobs_query, user_by_email_query
+)
+
+class HotQuery:
+    """
+    A query on the request path. run(db, sample) executes the statement the
+    route builds; allow_filesort is for queries whose sort cannot come from an
+    index and is bounded by the filter (e.g. one user's threads).
+    """
+
+    def __init__(self, name: str, run: Callable[[Session, Dict[str, Any]], Any], allow_filesort: bool = False):
+        self.name = name
+        self.run = run
+        self.allow_filesort = allow_filesort
+
+# Each hot query runs the statement the route builds, from the shared builders in queries.py
+def _thread_list(db, sample):
+    # GET /api/threads: the sort key lives on chat_threads while the filter is
+    # on user_thread, so the user's threads are sorted after the join
+    db.execute(thread_list_query(sample["user_id"]).limit(page_size(None) + 1)).all()
+
+def _history(db, sample):
+    # GET /api/history, sorted like the thread list
+    db.execute(history_query(sample["user_id"], "+02:00")).all()
+
+def _thread_membership(db, sample):
+    # MembershipCache.is_member on a cache miss
+    db.execute(membership_query(sample["user_id"], sample["thread_id"])).first()
+
+def _thread_archived(db, sample):
+    # MembershipCache.restore_if_archived, when a loader finds no messages
+    db.execute(thread_archived_query(sample["thread_id"])).first()
+
+def _thread_with_messages(db, sample):
+    db.execute(thread_with_messages_query(sample["thread_id"])).unique().scalars().all()
+
+def _message_page(db, sample):
+    db.execute(message_page_query(sample["thread_id"]).limit(page_size(None) + 1)).scalars().all()
+
+def _context_history(db, sample):
+    db.execute(context_history_query(sample["thread_id"]).limit(200)).all()
+
+def _context_history_page(db, sample):
+    # ContextBuilder reading older history past the cached messages
+    before = (datetime.utcnow(), sample["thread_id"])
+    db.execute(context_history_query(sample["thread_id"], before).limit(200)).all()
+
+def _last_user_message(db, sample):
+    db.execute(last_user_message_query(sample["thread_id"])).scalars().all()
+
+def _thread_members(db, sample):
+    db.execute(thread_members_query(sample["thread_id"])).all()
+
+def _job(db, sample):
+    db.execute(job_query(sample["job_id"], sample["user_id"])).unique().scalars().all()
+
+def _queued_jobs(db, sample):
+    db.execute(queued_jobs_query(1000)).all()
+
+def _user_by_email(db, sample):
+    db.execute(user_by_email_query(sample["email"])).all()
+
+HOT_QUERIES = [
+    HotQuery("thread list", _thread_list, allow_filesort=True),
+    HotQuery("history", _history, allow_filesort=True),
+    HotQuery("thread membership", _thread_membership),
+    HotQuery("thread archived", _thread_archived),
+    HotQuery("thread with messages", _thread_with_messages),
+    HotQuery("message page", _message_page),
+    HotQuery("context history", _context_history),
+    HotQuery("context history page", _context_history_page),
+    HotQuery("last user message", _last_user_message),
+    HotQuery("thread members", _thread_members),
+    HotQuery("job", _job),
+    HotQuery("queued jobs", _queued_jobs),
+    HotQuery("user by email", _user_by_email),
+]
+
+def _sqlite_convert_tz(value, from_tz, to_tz):
+    # SQLite has no CONVERT_TZ; only the plan of the history query is checked, not its days
+    return value
+
+def seed(engine, users: int, threads: int, messages: int) -> Dict[str, Any]:
+    """Insert synthetic data; returns the sample values the queries filter on and the ids to remove"""
+    now = datetime.utcnow()
+    user_rows, thread_rows, membership_rows, message_rows, file_rows, job_rows = [], [], [], [], [], []
+    for user_index in range(users):
+        user_id = str(uuid.uuid4())
+        user_rows.append({"id": user_id, "name": "Plan check", "email": f"plan-{user_id}@example.com", "password": "-"})
+        for thread_index in range(threads):
+            thread_id = str(uuid.uuid4())
+            updated_at = now - timedelta(minutes=user_index * threads + thread_index)
+            thread_rows.append({"id": thread_id, "title": "Plan check", "created_at": updated_at, "updated_at": updated_at})
+            membership_rows.append({"user_id": user_id, "thread_id": thread_id})
+            for message_index in range(messages):
+                message_id = str(uuid.uuid4())
+                sender = "user" if message_index % 2 == 0 else "assistant"
+                message_rows.append({
+                    "id": message_id, "content": "Plan check", "sender": sender,
+                    "timestamp": updated_at - timedelta(seconds=messages - message_index),
+                    "thread_id": thread_id, "user_id": user_id if sender == "user" else None
+                })
+                if message_index % 10 == 0:
+                    file_rows.append({
+                        "id": str(uuid.uuid4()), "name": "plan.txt", "type": "text/plain",
+                        "size": 1, "url": "/uploads/plan.txt", "message_id": message_id
+                    })
+            job_rows.append({
+                "id": str(uuid.uuid4()), "status": JOB_QUEUED if thread_index == 0 else JOB_COMPLETED,
+                "provider": "openai", "model": "gpt-4o", "created_at": updated_at,
+                "user_id": user_id, "thread_id": thread_id
+            })
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), user_rows)
+        conn.execute(insert(ChatThread), thread_rows)
+        conn.execute(insert(user_thread), membership_rows)
+        if message_rows:
+            conn.execute(insert(Message), message_rows)
+        if file_rows:
+            conn.execute(insert(FileAttachment), file_rows)
+        conn.execute(insert(AIJob), job_rows)
+
+    return {
+        "user_id": user_rows[0]["id"],
+        "email": user_rows[0]["email"],
+        "thread_id": thread_rows[0]["id"],
+        "job_id": job_rows[0]["id"],
+        "timestamp": now,
+        "user_ids": [row["id"] for row in user_rows],
+        "thread_ids": [row["id"] for row in thread_rows]
+    }
+
+def existing_sample(engine) -> Dict[str, Any]:
+    """Sample values taken from the data already in the database"""
+    with Session(engine) as db:
+        user = db.execute(select(User.id, User.email)).first()
+        thread_id = db.execute(select(user_thread.c.thread_id).where(user_thread.c.user_id == user.id)).scalar() if user else None
+        job_id = db.execute(select(AIJob.id)).scalar()
+    if user is None or thread_id is None:
+        raise SystemExit("The database has no users with threads; run without --no-seed")
+    return {"user_id": user.id, "email": user.email, "thread_id": thread_id, "job_id": job_id or "", "timestamp": datetime.utcnow()}
+
+def remove_seed(engine, sample: Dict[str, Any]):
+    thread_ids, user_ids = sample["thread_ids"], sample["user_ids"]
+    message_ids = select(Message.id).where(Message.thread_id.in_(thread_ids))
+    with engine.begin() as conn:
+        conn.execute(delete(AIJob).where(AIJob.thread_id.in_(thread_ids)))
+        conn.execute(delete(FileAttachment).where(FileAttachment.message_id.in_(message_ids)))
+        conn.execute(delete(Message).where(Message.thread_id.in_(thread_ids)))
+        conn.execute(delete(user_thread).where(user_thread.c.thread_id.in_(thread_ids)))
+        conn.execute(delete(ChatThread).where(ChatThread.id.in_(thread_ids)))
+        conn.execute(delete(User).where(User.id.in_(user_ids)))
+
+def capture_statements(engine, query: HotQuery, sample: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    """Run a hot query and return the (statement, parameters) it sent to the database"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with Session(engine) as db:
+            query.run(db, sample)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return statements
+
+def plan_problems(conn, statement: str, parameters: Any, allow_filesort: bool) -> Tuple[List[str], List[str]]:
+    """
+    EXPLAIN a statement
+    Returns: (plan lines, problems)
+    """
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        lines = [row[3] for row in rows]
+        problems = []
+        for detail in lines:
+            # SEARCH uses an index; SCAN reads the whole table (or index)
+            if detail.startswith("SCAN ") and "CONSTANT ROW" not in detail:
+                problems.append(f"full scan: {detail}")
+            if "USE TEMP B-TREE" in detail and not allow_filesort:
+                problems.append(f"sort outside an index: {detail}")
+        return lines, problems
+
+    rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).mappings().all()
+    lines, problems = [], []
+    for row in rows:
+        extra = row.get("Extra") or ""
+        lines.append(f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} {extra}".rstrip())
+        if row["type"] == "ALL":
+            problems.append(f"full scan of {row['table']}")
+        if ("Using filesort" in extra or "Using temporary" in extra) and not allow_filesort:
+            problems.append(f"sort outside an index on {row['table']}: {extra}")
+    return lines, problems
+
+def check(engine, sample: Dict[str, Any], verbose: bool) -> bool:
+    ok = True
+    for query in HOT_QUERIES:
+        statements = capture_statements(engine, query, sample)
+        with engine.connect() as conn:
+            for index, (statement, parameters) in enumerate(statements):
+                lines, problems = plan_problems(conn, statement, parameters, query.allow_filesort)
+                label = query.name if len(statements) == 1 else f"{query.name} ({index + 1}/{len(statements)})"
+                print(f"{'FAIL' if problems else 'ok':<4}  {label}")
+                if problems or verbose:
+                    print("      " + " ".join(statement.split())[:300])
+                    for line in lines:
+                        print(f"      | {line}")
+                    for problem in problems:
+                        print(f"      ! {problem}")
+                ok = ok and not problems
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN the hot queries and fail on full scans or filesorts")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="SQLAlchemy URL (default: the app database)")
+    parser.add_argument("--users", type=int, default=20, help="synthetic users to insert")
+    parser.add_argument("--threads", type=int, default=20, help="threads per synthetic user")
+    parser.add_argument("--messages", type=int, default=50, help="messages per synthetic thread")
+    parser.add_argument("--no-seed", action="store_true", help="check against the existing data only")
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", lambda dbapi_conn, record: dbapi_conn.create_function("convert_tz", 3, _sqlite_convert_tz))
+    if args.no_seed:
+        ok = check(engine, existing_sample(engine), args.verbose)
+    else:
+        sample = seed(engine, max(args.users, 2), max(args.threads, 1), args.messages)
+        try:
+            ok = check(engine, sample, args.verbose)
+        finally:
+            remove_seed(engine, sample)
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from queries import context_history_query, last_user_message_query
+from file_processors import prepare_files_for_ai
+from tokenizer import CHARS_PER_TOKEN, count_tokens, tokenizer_family
+from metrics import PROMPT_TOKENS
+from tracing import tracer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+SYSTEM_PROMPT = "You are a helpful assistant that provides accurate, informative, and friendly responses."
+
+# Tokens reserved for the completion (matches max_tokens sent to the providers)
+MAX_OUTPUT_TOKENS = 1500
+
+# Per-message framing overhead (role markers, separators) added by chat formats
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Rough cost of an attached image; providers bill images by tile, this is a conservative average
+IMAGE_TOKEN_ESTIMATE = 1000
+
+# How many history rows to fetch per query while packing
+HISTORY_PAGE_SIZE = 50
+
+class ThreadContext:
+    """
+    Cached context of one thread: the newest messages (oldest first) and
+    the attachments of the latest user message with their prepared payloads
+    """
+
+    def __init__(self, messages: List[Dict[str, Any]], complete: bool, last_user_files: Optional[List[Any]]):
+        self.messages = messages
+        # True when messages holds the thread's entire history
+        self.complete = complete
+        self.last_user_files = last_user_files
+        self.files_content: Optional[List[Dict[str, Any]]] = None
+        self.files_prepared = False
+        self.loaded_at = time.monotonic()
+        # Size accounted for by ThreadContextCache
+        self.size = 0
+
+def context_size(entry: ThreadContext) -> int:
+    """Approximate bytes held by a context: message texts and prepared file payloads (base64 for images)"""
+    size = sum(len(message["content"] or "") for message in entry.messages)
+    for file in entry.files_content or []:
+        size += sum(len(value) for value in file.values() if isinstance(value, str))
+    return size
+
+def file_refs(files) -> Optional[List[SimpleNamespace]]:
+    """Detached (name, url) snapshots of attachments, safe to keep after the session closes"""
+    if not files:
+        return None
+    return [SimpleNamespace(name=file.name, url=file.url) for file in files]
+
+class ThreadContextCache:
+    """
+    LRU cache of per-thread formatted context. Entries are updated in place
+    when messages are written through this worker and dropped when the
+    thread is deleted; the TTL bounds staleness from writes made by other
+    workers. Besides the thread count, the total size of the cached message
+    texts and file payloads is bounded by max_bytes; an entry larger than
+    that on its own is not kept.
+    """
+
+    def __init__(self, max_threads: int = 512, max_messages: int = 200, ttl_seconds: float = 300,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.max_threads = max_threads
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, ThreadContext]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, thread_id: str) -> Optional[ThreadContext]:
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None or time.monotonic() - entry.loaded_at > self.ttl_seconds:
+                if entry is not None:
+                    self._remove(thread_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(thread_id)
+            self.hits += 1
+            return entry
+
+    def put(self, thread_id: str, entry: ThreadContext):
+        with self._lock:
+            if thread_id in self._entries:
+                self._remove(thread_id)
+            self._entries[thread_id] = entry
+            entry.size = 0
+            self._resize(thread_id, entry)
+
+    def resize(self, thread_id: str, entry: ThreadContext):
+        """Account for a change to an entry's contents, e.g. file payloads prepared after it was cached"""
+        with self._lock:
+            if self._entries.get(thread_id) is entry:
+                self._resize(thread_id, entry)
+
+    def _resize(self, thread_id: str, entry: ThreadContext):
+        # Caller holds the lock
+        size = context_size(entry)
+        self._bytes += size - entry.size
+        entry.size = size
+        if size > self.max_bytes:
+            self._remove(thread_id)
+            self.evictions += 1
+            return
+        while len(self._entries) > self.max_threads or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, thread_id: str):
+        # Caller holds the lock
+        entry = self._entries.pop(thread_id)
+        self._bytes -= entry.size
+
+    def append_message(self, thread_id: str, message_id: str, sender: str, content: Optional[str], timestamp: datetime,
+                       files: Optional[List[Any]] = None):
+        """Append a just-written message to a cached thread (no-op if the thread is not cached)"""
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None:
+                return
+            entry.messages.append({"id": message_id, "sender": sender, "content": content, "timestamp": timestamp})
+            if len(entry.messages) > self.max_messages:
+                del entry.messages[:len(entry.messages) - self.max_messages]
+                entry.complete = False
+            if sender == "user":
+                entry.last_user_files = file_refs(files)
+                entry.files_content = None
+                entry.files_prepared = False
+            self._resize(thread_id, entry)
+
+    def invalidate(self, thread_id: str):
+        with self._lock:
+            if thread_id in self._entries:
+                self._remove(thread_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "threads": len(self._entries),
+                "bytes": self._bytes
+            }
+
+class ContextBuilder:
+    """
+    Packs a thread's newest messages and the latest file attachments into a
+    per-model token budget. Token counts of stored messages are cached by
+    message id, so each turn only tokenizes messages it has not seen before.
+    """
+
+    def __init__(
+        self,
+        model_config_lookup: Callable[[str, str], Optional[Dict[str, Any]]],
+        max_budget: int = 16000,
+        cache_size: int = 100000,
+        thread_cache: Optional[ThreadContextCache] = None,
+        restore_archived: Optional[Callable[[AsyncSession, str], Awaitable[bool]]] = None
+    ):
+        self.model_config_lookup = model_config_lookup
+        self.max_budget = max_budget
+        self.cache_size = cache_size
+        self.thread_cache = thread_cache
+        self.restore_archived = restore_archived
+        self._token_counts: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def token_budget(self, provider_id: str, model_id: str) -> int:
+        """Input token budget: the model's context window minus the completion reserve, capped by max_budget"""
+        model_config = self.model_config_lookup(provider_id, model_id) or {}
+        context_window = model_config.get("context_window")
+        if not context_window:
+            return self.max_budget
+        return max(0, min(self.max_budget, context_window - MAX_OUTPUT_TOKENS))
+
+    def message_tokens(self, message_id: str, content: Optional[str], provider_id: str, model_id: str) -> int:
+        """Token count of a stored message, cached per (message id, tokenizer family)"""
+        key = (message_id, tokenizer_family(provider_id, model_id))
+        with self._lock:
+            cached = self._token_counts.get(key)
+            if cached is not None:
+                self._token_counts.move_to_end(key)
+                return cached
+
+        tokens = count_tokens(content, provider_id, model_id) + MESSAGE_OVERHEAD_TOKENS
+
+        with self._lock:
+            self._token_counts[key] = tokens
+            while len(self._token_counts) > self.cache_size:
+                self._token_counts.popitem(last=False)
+        return tokens
+
+    def files_tokens(self, files: Optional[List[Dict[str, Any]]], provider_id: str, model_id: str) -> int:
+        """Token cost of prepared file payloads"""
+        total = 0
+        for file in files or []:
+            if file.get("is_image"):
+                total += IMAGE_TOKEN_ESTIMATE
+            else:
+                total += count_tokens(file.get("content"), provider_id, model_id) + MESSAGE_OVERHEAD_TOKENS
+        return total
+
+    def fit_files(self, files: List[Dict[str, Any]], budget: int, provider_id: str, model_id: str) -> List[Dict[str, Any]]:
+        """Truncate text file contents so the files fit within budget tokens"""
+        fitted = []
+        remaining = budget
+        for file in files:
+            if file.get("is_image") or not file.get("content"):
+                remaining -= IMAGE_TOKEN_ESTIMATE if file.get("is_image") else 0
+                fitted.append(file)
+                continue
+
+            tokens = count_tokens(file["content"], provider_id, model_id) + MESSAGE_OVERHEAD_TOKENS
+            if tokens <= remaining:
+                remaining -= tokens
+                fitted.append(file)
+                continue
+
+            # Keep the head of the document, sized by the approximate chars-per-token ratio
+            keep_chars = max(0, (remaining - MESSAGE_OVERHEAD_TOKENS) * CHARS_PER_TOKEN)
+            logger.info(f"Truncating {file.get('name')} to fit the context budget")
+            fitted.append({**file, "content": file["content"][:keep_chars] + "\n[... truncated ...]"})
+            remaining = 0
+        return fitted
+
+    async def _load_thread(self, db: AsyncSession, thread_id: str, limit: int) -> ThreadContext:
+        """Load the newest messages of a thread and the attachments of its latest user message"""
+        with tracer.child_span("context.load_history", limit=limit):
+            return await self._query_thread(db, thread_id, limit)
+
+    async def _query_thread(self, db: AsyncSession, thread_id: str, limit: int) -> ThreadContext:
+        rows = (await db.execute(context_history_query(thread_id).limit(limit))).all()
+        # An archived thread has no rows in messages; restore it and read again
+        if not rows and self.restore_archived is not None and await self.restore_archived(db, thread_id):
+            rows = (await db.execute(context_history_query(thread_id).limit(limit))).all()
+
+        last_user_files = None
+        last_message = (await db.execute(last_user_message_query(thread_id))).scalar_one_or_none()
+        if last_message and last_message.files:
+            last_user_files = file_refs(last_message.files)
+
+        messages = [
+            {"id": row.id, "sender": row.sender, "content": row.content, "timestamp": row.timestamp}
+            for row in reversed(rows)
+        ]
+        return ThreadContext(messages, complete=len(rows) < limit, last_user_files=last_user_files)
+
+    async def _thread_context(self, db: AsyncSession, thread_id: str) -> ThreadContext:
+        if self.thread_cache is None:
+            return await self._load_thread(db, thread_id, HISTORY_PAGE_SIZE)
+
+        entry = self.thread_cache.get(thread_id)
+        if entry is None:
+            entry = await self._load_thread(db, thread_id, self.thread_cache.max_messages)
+            self.thread_cache.put(thread_id, entry)
+        return entry
+
+    async def _iter_history(self, db: AsyncSession, thread_id: str, entry: ThreadContext):
+        """Yield (id, sender, content) newest first, from the cached entry then from the database"""
+        for msg in reversed(entry.messages):
+            yield msg["id"], msg["sender"], msg["content"]
+        if entry.complete:
+            return
+
+        # Continue after the oldest cached message in (timestamp, id) order, so
+        # each page seeks on the index instead of skipping rows with OFFSET
+        before = (entry.messages[0]["timestamp"], entry.messages[0]["id"]) if entry.messages else None
+        while True:
+            page = (await db.execute(
+                context_history_query(thread_id, before).limit(HISTORY_PAGE_SIZE)
+            )).all()
+            for row in page:
+                yield row.id, row.sender, row.content
+            if len(page) < HISTORY_PAGE_SIZE:
+                return
+            before = (page[-1].timestamp, page[-1].id)
+
+    async def build(self, db: AsyncSession, thread_id: str, content: str, provider_id: str, model_id: str):
+        """
+        Build the provider message list and file payloads for a thread
+        Returns: (messages, files_content)
+        """
+        with tracer.child_span("context.build", provider=provider_id, model=model_id):
+            entry = await self._thread_context(db, thread_id)
+            return await self._pack(db, thread_id, content, entry, provider_id, model_id)
+
+    async def build_many(self, db: AsyncSession, thread_id: str, content: str, targets: List[Tuple[str, str]]):
+        """
+        Build the context for several (provider_id, model_id) targets from a
+        single load of the thread and a single pass over its attachments
+        Returns: [(messages, files_content), ...] in the order of targets
+        """
+        with tracer.child_span("context.build", targets=len(targets)):
+            entry = await self._thread_context(db, thread_id)
+            return [await self._pack(db, thread_id, content, entry, provider_id, model_id) for provider_id, model_id in targets]
+
+    async def _pack(self, db: AsyncSession, thread_id: str, content: str, entry: ThreadContext, provider_id: str, model_id: str):
+        """Pack the system prompt, attachments, history and current message into the model's budget"""
+        budget = self.token_budget(provider_id, model_id)
+        system_message = {"role": "system", "content": SYSTEM_PROMPT}
+        current_message = {"role": "user", "content": content}
+        used = (
+            count_tokens(SYSTEM_PROMPT, provider_id, model_id)
+            + count_tokens(content, provider_id, model_id)
+            + 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+
+        # Process file attachments of the latest user message, they take priority over old history
+        if not entry.files_prepared:
+            if entry.last_user_files:
+                with tracer.child_span("files.prepare", files=len(entry.last_user_files)):
+                    entry.files_content = prepare_files_for_ai(entry.last_user_files)
+            else:
+                entry.files_content = None
+            entry.files_prepared = True
+            if self.thread_cache is not None:
+                self.thread_cache.resize(thread_id, entry)
+
+        files_content = entry.files_content
+        if files_content:
+            files_cost = self.files_tokens(files_content, provider_id, model_id)
+            if used + files_cost > budget:
+                files_content = self.fit_files(files_content, max(0, budget - used), provider_id, model_id)
+                files_cost = self.files_tokens(files_content, provider_id, model_id)
+            used += files_cost
+
+        # Walk history newest first until the budget is spent
+        history = []
+        async for message_id, sender, message_content in self._iter_history(db, thread_id, entry):
+            tokens = self.message_tokens(message_id, message_content, provider_id, model_id)
+            if used + tokens > budget:
+                break
+            used += tokens
+            history.append({
+                "role": "user" if sender == "user" else "assistant",
+                "content": message_content
+            })
+
+        # Reverse to get chronological order
+        history.reverse()
+
+        PROMPT_TOKENS.labels(provider_id, model_id).observe(used)
+        messages = [system_message] + history + [current_message]
+        return messages, files_content
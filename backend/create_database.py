@@ -2,8 +2,8 @@
 import os
 import pymysql
 from dotenv import load_dotenv
-from models import Base
 from database import engine
+from migrate import upgrade
 
 # Load environment variables
 load_dotenv()
@@ -38,9 +38,9 @@ def create_database():
         conn.close()
 
 def create_tables():
-    # Create all tables defined in models.py
-    Base.metadata.create_all(bind=engine)
-    print("Tables created successfully.")
+    # Create the tables and indexes by applying the pending schema migrations
+    applied = upgrade(engine)
+    print(f"Tables up to date ({len(applied)} migration(s) applied).")
 
 if __name__ == "__main__":
     create_database()
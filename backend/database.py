@@ -1,9 +1,13 @@
-
 import os
+import time
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
+from metrics import DB_POOL_WAIT_SECONDS, stats_collector
 
 # Load environment variables
 load_dotenv()
@@ -15,22 +19,70 @@ DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "your_password")
 DB_NAME = os.getenv("DB_NAME", "chat_app")
 
-# SQLAlchemy database URL
+# SQLAlchemy database URLs: PyMySQL for scripts, aiomysql for the app
 DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DATABASE_URL = f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# Connection pool settings; recycle stays below MySQL's wait_timeout (8 hours by default)
+POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "True").lower() in ["true", "1", "yes"]
+}
+
+class _TimedPoolMixin:
+    """Records how long each checkout waited for a free connection, and checkouts that timed out"""
+
+    pool_name = "sync"
+    timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            type(self).timeouts += 1
+            raise
+        finally:
+            DB_POOL_WAIT_SECONDS.labels(self.pool_name).observe(time.perf_counter() - started)
 
-# Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pool_name = "sync"
 
-# Create SessionLocal class
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pool_name = "async"
+
+# Create SQLAlchemy engines
+engine = create_engine(DATABASE_URL, poolclass=TimedQueuePool, **POOL_SETTINGS)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=TimedAsyncQueuePool, **POOL_SETTINGS)
+
+# Create session factories; async sessions keep loaded attributes after commit,
+# since reloading them lazily is not possible outside an await
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Create Base class
 Base = declarative_base()
 
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+def pool_stats():
+    """Connection pool occupancy of both engines"""
+    stats = []
+    for pool in (engine.pool, async_engine.pool):
+        stats.append({
+            "pool": pool.pool_name,
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(0, pool.overflow()),
+            "idle": pool.checkedin(),
+            "timeouts": type(pool).timeouts
+        })
+    return stats
+
+stats_collector.register("db_pool", pool_stats)
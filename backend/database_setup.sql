@@ -21,7 +21,8 @@ CREATE TABLE IF NOT EXISTS chat_threads (
     id VARCHAR(36) PRIMARY KEY,
     title VARCHAR(255) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    archived_at TIMESTAMP NULL
 );
 
 -- User-thread association table
@@ -57,7 +58,43 @@ CREATE TABLE IF NOT EXISTS file_attachments (
     FOREIGN KEY (message_id) REFERENCES messages(id) ON DELETE CASCADE
 );
 
--- Create indexes for performance
-CREATE INDEX idx_messages_thread_id ON messages(thread_id);
+-- Background AI jobs table
+CREATE TABLE IF NOT EXISTS ai_jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    provider VARCHAR(50) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    content TEXT,
+    has_images BOOLEAN DEFAULT FALSE,
+    use_cache BOOLEAN DEFAULT TRUE,
+    error TEXT,
+    status_code INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL,
+    user_id VARCHAR(36) NOT NULL,
+    thread_id VARCHAR(36) NOT NULL,
+    message_id VARCHAR(36),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (thread_id) REFERENCES chat_threads(id) ON DELETE CASCADE,
+    FOREIGN KEY (message_id) REFERENCES messages(id) ON DELETE SET NULL
+);
+
+-- Compressed messages and attachments of idle threads
+CREATE TABLE IF NOT EXISTS message_archives (
+    thread_id VARCHAR(36) PRIMARY KEY,
+    archived_at TIMESTAMP NOT NULL,
+    message_count INT NOT NULL,
+    original_bytes INT NOT NULL,
+    payload LONGBLOB NOT NULL,
+    FOREIGN KEY (thread_id) REFERENCES chat_threads(id) ON DELETE CASCADE
+);
+
+-- Create indexes for performance (kept in step with the migrations in migrations/)
+CREATE INDEX ix_messages_thread_id_timestamp ON messages(thread_id, timestamp, id);
+CREATE INDEX ix_messages_thread_id_sender_timestamp ON messages(thread_id, sender, timestamp);
 CREATE INDEX idx_messages_user_id ON messages(user_id);
+CREATE INDEX ix_user_thread_thread_id ON user_thread(thread_id);
 CREATE INDEX idx_file_attachments_message_id ON file_attachments(message_id);
+CREATE INDEX idx_ai_jobs_user_id ON ai_jobs(user_id);
+CREATE INDEX ix_ai_jobs_status_created_at ON ai_jobs(status, created_at);
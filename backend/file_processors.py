@@ -1,13 +1,19 @@
 
 import os
+import time
 import base64
 from typing import List, Dict, Any, Optional
 import mimetypes
-from PIL import Image
 from io import BytesIO
-import PyPDF2
-import docx
 import csv
+from lazy_import import lazy_import
+from metrics import FILE_EXTRACTION_SECONDS
+from tracing import tracer
+
+# Document and image libraries are imported on first use to keep worker startup fast
+Image = lazy_import("PIL.Image")
+PyPDF2 = lazy_import("PyPDF2")
+docx = lazy_import("docx")
 
 def prepare_files_for_ai(files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Process file attachments for AI input"""
@@ -31,37 +37,40 @@ def prepare_files_for_ai(files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             file_data = f.read()
         
         # Process based on file type
-        processed_file = {
-            "name": file.name,
-            "type": file_type,
-            "is_image": file_type.startswith("image/")
-        }
-        
-        # For images, convert to base64
-        if processed_file["is_image"]:
-            try:
-                # Resize large images to save bandwidth
-                with Image.open(BytesIO(file_data)) as img:
-                    if max(img.size) > 1024:  # if either dimension is > 1024px
-                        img.thumbnail((1024, 1024), Image.LANCZOS)
-                        buffered = BytesIO()
-                        img.save(buffered, format=img.format)
-                        file_data = buffered.getvalue()
-                
-                # Convert to base64
-                processed_file["base64"] = base64.b64encode(file_data).decode("utf-8")
-            except Exception as e:
-                print(f"Error processing image {file.name}: {str(e)}")
-                continue
-        else:
-            # Extract text from documents
-            content = extract_text_from_file(file_path, file_type)
-            if content:
-                processed_file["content"] = content
+        started = time.perf_counter()
+        with tracer.child_span("file.process", name=file.name, mime_type=file_type):
+            processed_file = {
+                "name": file.name,
+                "type": file_type,
+                "is_image": file_type.startswith("image/")
+            }
+            
+            # For images, convert to base64
+            if processed_file["is_image"]:
+                try:
+                    # Resize large images to save bandwidth
+                    with Image.open(BytesIO(file_data)) as img:
+                        if max(img.size) > 1024:  # if either dimension is > 1024px
+                            img.thumbnail((1024, 1024), Image.LANCZOS)
+                            buffered = BytesIO()
+                            img.save(buffered, format=img.format)
+                            file_data = buffered.getvalue()
+                    
+                    # Convert to base64
+                    processed_file["base64"] = base64.b64encode(file_data).decode("utf-8")
+                except Exception as e:
+                    print(f"Error processing image {file.name}: {str(e)}")
+                    continue
             else:
-                # If text extraction failed, provide base64 for binary files
-                processed_file["base64"] = base64.b64encode(file_data).decode("utf-8")
+                # Extract text from documents
+                content = extract_text_from_file(file_path, file_type)
+                if content:
+                    processed_file["content"] = content
+                else:
+                    # If text extraction failed, provide base64 for binary files
+                    processed_file["base64"] = base64.b64encode(file_data).decode("utf-8")
         
+        FILE_EXTRACTION_SECONDS.labels(file_type).observe(time.perf_counter() - started)
         processed_files.append(processed_file)
     
     return processed_files
@@ -0,0 +1,93 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from fastapi import HTTPException, status
+
+# Offsets accepted by MySQL's CONVERT_TZ without the time zone tables loaded
+_OFFSET_PATTERN = re.compile(r"^([+-])(\d{2}):(\d{2})$")
+_MAX_OFFSET_MINUTES = 14 * 60
+
+def utc_offset(tz: Optional[str]) -> str:
+    """
+    Resolve a `tz` parameter (an IANA name such as "Europe/Paris" or an
+    offset such as "+02:00") to a "+HH:MM" offset for CONVERT_TZ. Names use
+    their current offset, so threads from the other side of a DST change may
+    land a day off around midnight. Raises a 400 for an unknown zone.
+    """
+    if not tz or tz.upper() == "UTC":
+        return "+00:00"
+    match = _OFFSET_PATTERN.match(tz)
+    if match:
+        sign, hours, minutes = match.groups()
+        offset = int(hours) * 60 + int(minutes)
+        valid = int(minutes) < 60
+        if sign == "-":
+            offset = -offset
+    else:
+        try:
+            offset = int(datetime.now(ZoneInfo(tz)).utcoffset().total_seconds() // 60)
+            valid = True
+        except (ZoneInfoNotFoundError, ValueError):
+            valid = False
+    if not valid or abs(offset) > _MAX_OFFSET_MINUTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid time zone"
+        )
+    sign = "-" if offset < 0 else "+"
+    return f"{sign}{abs(offset) // 60:02d}:{abs(offset) % 60:02d}"
+
+class HistoryCache:
+    """
+    LRU cache of each user's thread history grouped by day, one entry per
+    user and UTC offset. Entries are dropped when a thread of the user is
+    created, renamed, deleted or gets a new message through this worker; the
+    TTL bounds staleness from writes made by other workers.
+    """
+
+    def __init__(self, max_users: int = 1024, ttl_seconds: float = 60):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        # user id -> {offset: (loaded_at, history)}
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str, offset: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(user_id, {}).get(offset)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[user_id][offset]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: str, offset: str, history: Dict[str, Any]):
+        with self._lock:
+            self._entries.setdefault(user_id, {})[offset] = (time.monotonic(), history)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "users": len(self._entries)
+            }
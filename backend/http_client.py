@@ -0,0 +1,126 @@
+import os
+import logging
+import importlib.util
+from typing import Dict, Optional
+import httpx
+from dotenv import load_dotenv
+from cassettes import RecordingTransport
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Providers that get a dedicated connection pool
+PROVIDERS = ["openai", "gemini", "mistral", "deepseek"]
+
+# Providers whose APIs negotiate HTTP/2 over TLS
+HTTP2_PROVIDERS = {"openai", "gemini", "mistral", "deepseek"}
+
+# Default API base URLs, overridable with e.g. OPENAI_BASE_URL (used to point at a replay server)
+DEFAULT_BASE_URLS = {
+    "openai": "https://api.openai.com",
+    "gemini": "https://generativelanguage.googleapis.com",
+    "mistral": "https://api.mistral.ai",
+    "deepseek": "https://api.deepseek.com"
+}
+
+def provider_base_url(provider: str) -> str:
+    return os.getenv(f"{provider.upper()}_BASE_URL", DEFAULT_BASE_URLS[provider]).rstrip("/")
+
+def provider_url(provider: str, path: str) -> str:
+    """Full URL of a provider API path, honoring the configured base URL"""
+    return f"{provider_base_url(provider)}{path}"
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+def _provider_setting(provider: str, name: str) -> Optional[str]:
+    """Read a per-provider override such as OPENAI_HTTP_MAX_CONNECTIONS"""
+    return os.getenv(f"{provider.upper()}_HTTP_{name}")
+
+class ProviderHTTPClients:
+    """
+    Shared async HTTP clients for the AI providers, one keep-alive
+    connection pool per provider. Clients are created on app startup and
+    closed on shutdown; get() lazily creates a client if called outside
+    the app lifecycle (e.g. from scripts).
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.http2_available = importlib.util.find_spec("h2") is not None
+
+    def _build_timeout(self, provider: str) -> httpx.Timeout:
+        """Timeouts in seconds, overridable globally or per provider"""
+        def setting(name: str, default: float) -> float:
+            value = _provider_setting(provider, f"{name}_TIMEOUT")
+            return float(value) if value is not None else _env_float(f"PROVIDER_{name}_TIMEOUT", default)
+
+        return httpx.Timeout(
+            connect=setting("CONNECT", 5.0),
+            read=setting("READ", 120.0),
+            write=setting("WRITE", 30.0),
+            pool=setting("POOL", 10.0)
+        )
+
+    def _build_limits(self, provider: str) -> httpx.Limits:
+        """Connection pool limits, overridable globally or per provider"""
+        def setting(name: str, default: int) -> int:
+            value = _provider_setting(provider, name)
+            return int(value) if value is not None else _env_int(f"PROVIDER_{name}", default)
+
+        return httpx.Limits(
+            max_connections=setting("MAX_CONNECTIONS", 200),
+            max_keepalive_connections=setting("MAX_KEEPALIVE_CONNECTIONS", 50),
+            keepalive_expiry=_env_float("PROVIDER_KEEPALIVE_EXPIRY", 60.0)
+        )
+
+    def _create_client(self, provider: str) -> httpx.AsyncClient:
+        use_http2 = (
+            provider in HTTP2_PROVIDERS
+            and self.http2_available
+            and os.getenv("PROVIDER_HTTP2", "True").lower() in ["true", "1", "yes"]
+        )
+        transport = httpx.AsyncHTTPTransport(http2=use_http2, limits=self._build_limits(provider))
+
+        # Record every exchange to cassettes for offline replay when a directory is configured
+        record_dir = os.getenv("PROVIDER_RECORD_DIR")
+        if record_dir:
+            transport = RecordingTransport(transport, provider, provider_base_url(provider), record_dir)
+
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=self._build_timeout(provider)
+        )
+
+    async def startup(self):
+        """Open a client per provider (called on app startup)"""
+        if not self.http2_available:
+            logger.warning("Package 'h2' is not installed, provider clients will use HTTP/1.1")
+        for provider in PROVIDERS:
+            if provider not in self._clients:
+                self._clients[provider] = self._create_client(provider)
+        logger.info(f"Opened HTTP clients for providers: {', '.join(self._clients)}")
+
+    async def shutdown(self):
+        """Close all provider clients and their pooled connections (called on app shutdown)"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        """Get the pooled client for a provider"""
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._create_client(provider)
+            self._clients[provider] = client
+        return client
+
+# Shared instance used by the provider handlers
+http_clients = ProviderHTTPClients()
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+from tracing import tracer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Job states stored in AIJob.status
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+FINISHED_STATES = {JOB_COMPLETED, JOB_FAILED}
+
+class JobRunner:
+    """
+    Bounded pool of asyncio workers executing background jobs by id. Job
+    state lives in the database; the runner only holds the queue of ids and
+    wakes up long-polling requests on this worker when a job finishes.
+    """
+
+    def __init__(self, max_workers: int = 8, max_queue: int = 1000, poll_interval: float = 1.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.poll_interval = poll_interval
+        self._handler: Optional[Callable[[str], Awaitable[None]]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._finished: Dict[str, asyncio.Event] = {}
+        self.active = 0
+        self.completed = 0
+
+    async def startup(self, handler: Callable[[str], Awaitable[None]]):
+        """Start the worker pool (called on app startup); handler runs one job given its id"""
+        self._handler = handler
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.max_workers)]
+        logger.info(f"Started {self.max_workers} job workers")
+
+    async def shutdown(self):
+        """Stop the workers (called on app shutdown); queued jobs stay queued in the database"""
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def is_full(self) -> bool:
+        return self._queue is None or self._queue.full()
+
+    def submit(self, job_id: str) -> bool:
+        """Queue a job for execution; returns False if the runner is not started or the queue is full"""
+        if self.is_full():
+            return False
+        self._finished[job_id] = asyncio.Event()
+        self._queue.put_nowait(job_id)
+        return True
+
+    async def wait(self, job_id: str, timeout: float):
+        """
+        Wait up to timeout seconds for a job to finish. Jobs run by another
+        process are not signalled here, so callers re-check the database at
+        least every poll_interval seconds.
+        """
+        event = self._finished.get(job_id)
+        if event is None:
+            await asyncio.sleep(min(timeout, self.poll_interval))
+            return
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self.active += 1
+            try:
+                # Each job is the root of its own trace
+                with tracer.span("job.run", job_id=job_id):
+                    await self._handler(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}")
+            finally:
+                self.active -= 1
+                self.completed += 1
+                self._queue.task_done()
+                event = self._finished.pop(job_id, None)
+                if event is not None:
+                    event.set()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "active": self.active,
+            "completed": self.completed
+        }
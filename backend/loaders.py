@@ -0,0 +1,36 @@
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+from models import ChatThread, Message, FileAttachment, AIJob
+
+# Loader strategies for the objects the routes serialise. Async sessions
+# cannot lazy load, and pydantic walks every relationship in the response
+# schema, so each query states what it loads and raises on anything else.
+#
+# - collections of messages use selectinload: one extra query per level, no
+#   duplication of the parent row
+# - attachments are joined onto the messages query, so a thread with any
+#   number of messages and attachments costs two round trips
+# - single many-to-one parents use joinedload on the same query
+
+# Thread with messages and their attachments (ChatThreadResponse)
+THREAD_WITH_MESSAGES = (
+    selectinload(ChatThread.messages).joinedload(Message.files),
+    raiseload("*")
+)
+
+# Messages with their attachments (MessageResponse)
+MESSAGE_WITH_FILES = (
+    selectinload(Message.files),
+    raiseload("*")
+)
+
+# Job with its answer message (JobResponse)
+JOB_WITH_MESSAGE = (
+    joinedload(AIJob.message).selectinload(Message.files),
+    raiseload("*")
+)
+
+# Attachment with the message it belongs to (ownership check on delete)
+FILE_WITH_MESSAGE = (
+    joinedload(FileAttachment.message),
+    raiseload("*")
+)
@@ -0,0 +1,198 @@
+import os
+import asyncio
+import logging
+import importlib.util
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+def local_inference_available() -> bool:
+    """Whether the local backend is enabled and its dependencies are installed (without importing them)"""
+    enabled = os.getenv("LOCAL_INFERENCE_ENABLED", "True").lower() in ["true", "1", "yes"]
+    return enabled and all(importlib.util.find_spec(name) is not None for name in ("torch", "transformers"))
+
+class _PendingRequest:
+    def __init__(self, messages: List[Dict[str, Any]], future: asyncio.Future):
+        self.messages = messages
+        self.future = future
+
+class LocalInferenceEngine:
+    """
+    CPU inference for Hugging Face causal LMs with dynamic batching.
+    Models are loaded on first use. Concurrent prompts for the same model are
+    queued and grouped into one generate() call of up to max_batch_size
+    prompts, waiting at most max_wait_ms for a batch to fill. Loaded models
+    are kept in LRU order and unloaded when their combined parameter memory
+    exceeds max_resident_bytes.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20,
+        max_resident_bytes: int = 4 * 1024 ** 3,
+        max_new_tokens: int = 512,
+        num_threads: Optional[int] = None
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_resident_bytes = max_resident_bytes
+        self.max_new_tokens = max_new_tokens
+        self.num_threads = num_threads
+        # A single worker thread: batches run one at a time and own all model state
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-inference")
+        self._models: "OrderedDict[str, Tuple[Any, Any, int]]" = OrderedDict()
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    # Model residency (runs on the inference thread)
+
+    def _load_model(self, model_id: str):
+        cached = self._models.get(model_id)
+        if cached is not None:
+            self._models.move_to_end(model_id)
+            return cached[0], cached[1]
+
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+        logger.info(f"Loading local model {model_id}")
+        tokenizer = AutoTokenizer.from_pretrained(model_id)
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32)
+        model.eval()
+
+        size = sum(p.numel() * p.element_size() for p in model.parameters())
+        self._models[model_id] = (model, tokenizer, size)
+        self._evict(keep=model_id)
+        return model, tokenizer
+
+    def _evict(self, keep: str):
+        """Unload least recently used models until resident memory fits the bound"""
+        resident = sum(size for _, _, size in self._models.values())
+        for model_id in list(self._models):
+            if resident <= self.max_resident_bytes:
+                break
+            if model_id == keep:
+                continue
+            _, _, size = self._models.pop(model_id)
+            resident -= size
+            logger.info(f"Unloaded local model {model_id} ({size / 1024 ** 2:.0f} MB)")
+
+        import gc
+        gc.collect()
+
+    def resident_models(self) -> List[Dict[str, Any]]:
+        return [{"model": model_id, "bytes": size} for model_id, (_, _, size) in self._models.items()]
+
+    def _run_batch(self, model_id: str, conversations: List[List[Dict[str, Any]]]) -> List[str]:
+        import torch
+
+        model, tokenizer = self._load_model(model_id)
+        prompts = [self._format_prompt(tokenizer, messages) for messages in conversations]
+        encoded = tokenizer(prompts, return_tensors="pt", padding=True)
+        with torch.inference_mode():
+            output = model.generate(
+                **encoded,
+                max_new_tokens=self.max_new_tokens,
+                do_sample=False,
+                pad_token_id=tokenizer.pad_token_id
+            )
+        # Left padding aligns every prompt to the same length, so new tokens start at the same index
+        generated = output[:, encoded["input_ids"].shape[1]:]
+        return tokenizer.batch_decode(generated, skip_special_tokens=True)
+
+    # Prompt formatting
+
+    @staticmethod
+    def _format_prompt(tokenizer, messages: List[Dict[str, Any]]) -> str:
+        """Render chat messages with the model's chat template when it has one"""
+        if getattr(tokenizer, "chat_template", None):
+            return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        lines = [f"{msg['role']}: {msg['content']}" for msg in messages]
+        return "\n".join(lines) + "\nassistant:"
+
+    # Request queueing and batching
+
+    async def generate(self, model_id: str, messages: List[Dict[str, Any]]) -> str:
+        """Generate a completion, batched with other concurrent requests for the same model"""
+        loop = asyncio.get_running_loop()
+        queue = self._queues.get(model_id)
+        if queue is None:
+            queue = asyncio.Queue()
+            self._queues[model_id] = queue
+            self._workers[model_id] = asyncio.ensure_future(self._batch_loop(model_id, queue))
+
+        future = loop.create_future()
+        await queue.put(_PendingRequest(messages, future))
+        return await future
+
+    async def _batch_loop(self, model_id: str, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            # Take whatever is already queued, then wait out the window for more
+            while len(batch) < self.max_batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [request for request in batch if not request.future.cancelled()]
+            if not batch:
+                continue
+
+            logger.info(f"Running local batch of {len(batch)} on {model_id}")
+            try:
+                outputs = await loop.run_in_executor(
+                    self._executor, self._run_batch, model_id, [request.messages for request in batch]
+                )
+            except Exception as e:
+                logger.error(f"Local inference failed for {model_id}: {str(e)}")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            for request, output in zip(batch, outputs):
+                if not request.future.done():
+                    request.future.set_result(output.strip())
+
+    async def shutdown(self):
+        """Stop batch workers and release loaded models"""
+        workers, self._workers = self._workers, {}
+        self._queues = {}
+        for worker in workers.values():
+            worker.cancel()
+        self._executor.submit(self._models.clear)
+
+# Shared engine used by the huggingface provider
+local_engine = LocalInferenceEngine(
+    max_batch_size=int(os.getenv("LOCAL_INFERENCE_MAX_BATCH_SIZE", "8")),
+    max_wait_ms=float(os.getenv("LOCAL_INFERENCE_MAX_WAIT_MS", "20")),
+    max_resident_bytes=int(os.getenv("LOCAL_INFERENCE_MAX_RESIDENT_BYTES", str(4 * 1024 ** 3))),
+    max_new_tokens=int(os.getenv("LOCAL_INFERENCE_MAX_NEW_TOKENS", "512")),
+    num_threads=int(os.getenv("LOCAL_INFERENCE_NUM_THREADS", "0")) or None
+)
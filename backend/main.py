@@ -1,6 +1,6 @@
 
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
@@ -11,6 +11,12 @@ load_dotenv()
 
 # Import routers
 from routers import auth, chat, files, email
+from http_client import http_clients
+from local_inference import local_engine
+from database import async_engine
+from metrics import METRICS_ENABLED, MetricsMiddleware, instrument_engine, render_metrics
+from tracing import tracer, TracingMiddleware, TRACE_HEADER
+from pagination import NEXT_CURSOR_HEADER
 
 # Create FastAPI app
 app = FastAPI(
@@ -38,8 +44,54 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Set-Cookie", "Access-Control-Allow-Headers", 
                   "Access-Control-Allow-Origin", "Authorization", "authorization"],
+    expose_headers=[TRACE_HEADER, NEXT_CURSOR_HEADER],
 )
 
+# Prometheus metrics: request latency per route and database statement timing
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(async_engine.sync_engine)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        body, content_type = render_metrics()
+        return Response(content=body, media_type=content_type)
+
+# Tracing: a root span per request, trace id returned in the X-Trace-Id header
+app.add_middleware(TracingMiddleware, tracer=tracer)
+tracer.instrument_engine(async_engine.sync_engine)
+
+# Open pooled provider HTTP clients for the lifetime of the app
+@app.on_event("startup")
+async def startup_http_clients():
+    await http_clients.startup()
+
+@app.on_event("shutdown")
+async def shutdown_http_clients():
+    await http_clients.shutdown()
+    await local_engine.shutdown()
+    await async_engine.dispose()
+    tracer.shutdown()
+
+# Start the background job workers and pick up jobs queued before a restart
+@app.on_event("startup")
+async def startup_job_workers():
+    await chat.job_runner.startup(chat.run_message_job)
+    await chat.resubmit_queued_jobs()
+
+@app.on_event("shutdown")
+async def shutdown_job_workers():
+    await chat.job_runner.shutdown()
+
+# Watch ai_providers_config.json and apply changes without a restart
+@app.on_event("startup")
+async def startup_provider_config_watcher():
+    chat.ai_manager.registry.start_watching()
+
+@app.on_event("shutdown")
+async def shutdown_provider_config_watcher():
+    await chat.ai_manager.registry.stop_watching()
+
 # Include routers
 app.include_router(auth.router, prefix="/api", tags=["Authentication"])
 app.include_router(chat.router, prefix="/api", tags=["Chat"])
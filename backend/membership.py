@@ -0,0 +1,129 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from queries import membership_query, thread_archived_query
+
+class MembershipCache:
+    """
+    Thread membership checks for authorization. A check looks the
+    (user_id, thread_id) pair up in the user_thread primary key and caches
+    confirmed memberships in an LRU with a TTL, so repeated requests on a
+    thread cost a dict lookup. Only memberships are cached, never denials.
+    Entries are added when a thread is created and dropped when it is
+    deleted through this worker.
+
+    A miss also reads whether the thread is archived and restores it with
+    rehydrate(thread_id), which uses a session of its own, before access is
+    granted, so a cached membership is never one of an archived thread when
+    it is added. The archiver runs in another process and cannot drop
+    entries; a thread it archives while cached is restored lazily by the
+    loaders that read its messages (restore, restore_if_archived), which
+    keeps a hit free of database round trips.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 100000,
+        ttl_seconds: float = 60,
+        rehydrate: Optional[Callable[[str], Awaitable[int]]] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.rehydrate = rehydrate
+        self._entries: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        # thread id -> cached member ids, to drop a deleted thread's entries
+        self._members: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rehydrations = 0
+
+    def _cached(self, user_id: str, thread_id: str) -> bool:
+        with self._lock:
+            key = (user_id, thread_id)
+            added_at = self._entries.get(key)
+            if added_at is None or time.monotonic() - added_at > self.ttl_seconds:
+                if added_at is not None:
+                    self._discard(key)
+                self.misses += 1
+                return False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def _discard(self, key: Tuple[str, str]):
+        # Caller holds the lock
+        self._entries.pop(key, None)
+        members = self._members.get(key[1])
+        if members is not None:
+            members.discard(key[0])
+            if not members:
+                del self._members[key[1]]
+
+    async def is_member(self, db: AsyncSession, user_id: str, thread_id: Optional[str]) -> bool:
+        """True if the user belongs to the thread"""
+        if not thread_id:
+            return False
+        if self._cached(user_id, thread_id):
+            return True
+        found = (await db.execute(membership_query(user_id, thread_id))).first()
+        if found is None:
+            return False
+        if found.archived_at is not None:
+            await self.restore(db, thread_id)
+        self.add(user_id, thread_id)
+        return True
+
+    async def restore_if_archived(self, db: AsyncSession, thread_id: str) -> bool:
+        """Restore the thread if it is archived; True if it was"""
+        found = (await db.execute(thread_archived_query(thread_id))).first()
+        if found is None or found.archived_at is None:
+            return False
+        await self.restore(db, thread_id)
+        return True
+
+    async def restore(self, db: AsyncSession, thread_id: str):
+        """Move an archived thread's messages back and make them visible to the request's session"""
+        if self.rehydrate is None:
+            return
+        # End the request's transaction on both sides of the restore: before, so
+        # a row lock it holds cannot block the restore, and after, so it does not
+        # read from a snapshot taken before it (MySQL REPEATABLE READ). Callers
+        # have written nothing yet and sessions do not expire on commit.
+        await db.commit()
+        await self.rehydrate(thread_id)
+        with self._lock:
+            self.rehydrations += 1
+        await db.commit()
+
+    def add(self, user_id: str, thread_id: str):
+        """Record a membership that was just written"""
+        with self._lock:
+            key = (user_id, thread_id)
+            self._entries[key] = time.monotonic()
+            self._entries.move_to_end(key)
+            self._members.setdefault(thread_id, set()).add(user_id)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def remove(self, user_id: str, thread_id: str):
+        """Forget a membership that was removed"""
+        with self._lock:
+            self._discard((user_id, thread_id))
+
+    def invalidate_thread(self, thread_id: str):
+        """Forget every membership of a deleted thread"""
+        with self._lock:
+            for user_id in self._members.pop(thread_id, set()):
+                self._entries.pop((user_id, thread_id), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "rehydrations": self.rehydrations,
+                "entries": len(self._entries)
+            }
@@ -0,0 +1,179 @@
+import os
+import time
+import logging
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+from prometheus_client import Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() in ["true", "1", "yes"]
+
+# Latency buckets in seconds: fast API/DB work up to long generations
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PROVIDER_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "chat_http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=FAST_BUCKETS + PROVIDER_BUCKETS[6:]
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("chat_http_requests_in_flight", "HTTP requests being served")
+
+PROVIDER_REQUEST_SECONDS = Histogram(
+    "chat_provider_request_duration_seconds", "Provider call latency (full completion)",
+    ["provider", "model", "outcome"], buckets=PROVIDER_BUCKETS
+)
+PROVIDER_FIRST_CHUNK_SECONDS = Histogram(
+    "chat_provider_first_chunk_seconds", "Time to the first streamed chunk from a provider",
+    ["provider", "model"], buckets=PROVIDER_BUCKETS
+)
+PROVIDER_REQUESTS_IN_FLIGHT = Gauge(
+    "chat_provider_requests_in_flight", "Provider calls in progress", ["provider", "model"]
+)
+
+PROMPT_TOKENS = Histogram(
+    "chat_prompt_tokens", "Tokens in the packed prompt context", ["provider", "model"], buckets=TOKEN_BUCKETS
+)
+COMPLETION_TOKENS = Histogram(
+    "chat_completion_tokens", "Tokens in provider completions", ["provider", "model"], buckets=TOKEN_BUCKETS
+)
+
+DB_QUERY_SECONDS = Histogram(
+    "chat_db_query_duration_seconds", "Database statement latency by route", ["route"], buckets=FAST_BUCKETS
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "chat_db_pool_wait_seconds", "Time spent waiting for a pooled database connection", ["pool"], buckets=FAST_BUCKETS
+)
+
+FILE_EXTRACTION_SECONDS = Histogram(
+    "chat_file_extraction_duration_seconds", "Attachment processing time by MIME type", ["mime_type"],
+    buckets=FAST_BUCKETS
+)
+
+# Route template of the request being served, read by the database hooks
+_current_route: ContextVar[Optional[Dict[str, Any]]] = ContextVar("metrics_current_route", default=None)
+
+# Endpoint function -> route template, filled on first use of each route
+_route_paths: Dict[Any, str] = {}
+
+# Stats keys that only ever increase, exported as counters
+COUNTER_KEYS = {"hits", "misses", "evictions", "executions", "coalesced", "admitted", "rejected", "completed", "reloads", "reload_errors", "timeouts", "invalidations", "rehydrations"}
+
+def route_label(scope: Dict[str, Any]) -> str:
+    """Route template (e.g. /api/threads/{thread_id}) of a routed request, keeping label cardinality bounded"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    path = _route_paths.get(endpoint)
+    if path is None:
+        app = scope.get("app")
+        for route in getattr(app, "routes", []):
+            if getattr(route, "endpoint", None) is not None and hasattr(route, "path"):
+                _route_paths[route.endpoint] = route.path
+        path = _route_paths.setdefault(endpoint, "other")
+    return path
+
+def current_route() -> str:
+    """Route of the current request, or "background" outside a request"""
+    state = _current_route.get()
+    if state is None:
+        return "background"
+    return route_label(state["scope"])
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency, status and in-flight requests per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _current_route.set({"scope": scope})
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route_label(scope), str(status_code)).observe(
+                time.perf_counter() - started
+            )
+            _current_route.reset(token)
+
+def instrument_engine(engine):
+    """Time every statement run on a SQLAlchemy engine, labelled with the current route"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        DB_QUERY_SECONDS.labels(current_route()).observe(time.perf_counter() - started)
+
+class StatsCollector:
+    """
+    Exports the counters that components already keep (cache hits, queue
+    depth, ...) at scrape time, so the hot path pays nothing extra. A stats
+    function returns a dict of numbers, or a list of dicts whose string
+    values become labels (e.g. one entry per provider/model).
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], Union[Dict[str, Any], List[Dict[str, Any]]]]] = {}
+
+    def register(self, name: str, stats_func: Callable[[], Union[Dict[str, Any], List[Dict[str, Any]]]]):
+        self._sources[name] = stats_func
+
+    def collect(self) -> Iterable[Any]:
+        for name, stats_func in self._sources.items():
+            try:
+                stats = stats_func()
+            except Exception as e:
+                logger.warning(f"Could not collect {name} stats: {str(e)}")
+                continue
+            entries = stats if isinstance(stats, list) else [stats]
+
+            families: Dict[str, Any] = {}
+            for entry in entries:
+                labels = {key: value for key, value in entry.items() if isinstance(value, str)}
+                for key, value in entry.items():
+                    if isinstance(value, bool) or not isinstance(value, (int, float)):
+                        continue
+                    family = families.get(key)
+                    if family is None:
+                        metric_name = f"chat_{name}_{key}"
+                        if key in COUNTER_KEYS:
+                            family = CounterMetricFamily(metric_name, f"{name} {key}", labels=list(labels))
+                        else:
+                            family = GaugeMetricFamily(metric_name, f"{name} {key}", labels=list(labels))
+                        families[key] = family
+                    family.add_metric(list(labels.values()), value)
+            yield from families.values()
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+def render_metrics():
+    """Prometheus text exposition of all registered metrics: (body, content_type)"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,129 @@
+"""
+Schema migration runner.
+
+Applies the versioned migrations in the migrations package in order and
+records each applied version in the schema_migrations table.
+
+Usage:
+    python migrate.py [upgrade] [--to VERSION] [--database-url URL]
+    python migrate.py downgrade --to VERSION [--database-url URL]
+    python migrate.py status [--database-url URL]
+"""
+import os
+import re
+import argparse
+import importlib
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, delete, insert, select
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^m(\d{4})_(\w+)\.py$")
+
+# Kept out of Base.metadata so create_all never touches it
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False)
+)
+
+class Migration:
+    """A migration module: m<version>_<name>.py with upgrade(conn) and downgrade(conn)"""
+
+    def __init__(self, version: int, name: str, module):
+        self.version = version
+        self.name = name
+        self.module = module
+
+    @property
+    def description(self) -> str:
+        return (self.module.__doc__ or self.name).strip().splitlines()[0]
+
+def discover_migrations() -> List[Migration]:
+    """Migrations of the migrations package, ordered by version"""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        module = importlib.import_module(f"migrations.{filename[:-3]}")
+        migrations.append(Migration(int(match.group(1)), match.group(2), module))
+
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise SystemExit(f"Duplicate migration versions in {MIGRATIONS_DIR}")
+    return migrations
+
+def applied_versions(engine) -> List[int]:
+    migration_metadata.create_all(engine)
+    with engine.connect() as conn:
+        return sorted(conn.execute(select(schema_migrations.c.version)).scalars().all())
+
+def upgrade(engine, target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations up to target (default: the latest); returns the applied versions"""
+    done = set(applied_versions(engine))
+    applied = []
+    for migration in discover_migrations():
+        if migration.version in done or (target is not None and migration.version > target):
+            continue
+        logger.info(f"Applying migration {migration.version:04d}: {migration.description}")
+        with engine.begin() as conn:
+            migration.module.upgrade(conn)
+            conn.execute(insert(schema_migrations).values(
+                version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+            ))
+        applied.append(migration.version)
+    return applied
+
+def downgrade(engine, target: int) -> List[int]:
+    """Revert applied migrations newer than target, newest first; returns the reverted versions"""
+    done = set(applied_versions(engine))
+    reverted = []
+    for migration in reversed(discover_migrations()):
+        if migration.version not in done or migration.version <= target:
+            continue
+        logger.info(f"Reverting migration {migration.version:04d}: {migration.description}")
+        with engine.begin() as conn:
+            migration.module.downgrade(conn)
+            conn.execute(delete(schema_migrations).where(schema_migrations.c.version == migration.version))
+        reverted.append(migration.version)
+    return reverted
+
+def status(engine) -> List[Tuple[Migration, bool]]:
+    done = set(applied_versions(engine))
+    return [(migration, migration.version in done) for migration in discover_migrations()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply or revert schema migrations")
+    parser.add_argument("command", nargs="?", default="upgrade", choices=["upgrade", "downgrade", "status"])
+    parser.add_argument("--to", type=int, help="target version (required for downgrade)")
+    parser.add_argument("--database-url", help="SQLAlchemy URL (default: the app database)")
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from database import engine
+
+    if args.command == "status":
+        for migration, applied in status(engine):
+            print(f"{'applied' if applied else 'pending':<8} {migration.version:04d}  {migration.description}")
+    elif args.command == "downgrade":
+        if args.to is None:
+            parser.error("downgrade needs --to VERSION")
+        reverted = downgrade(engine, args.to)
+        print(f"Reverted {len(reverted)} migration(s)")
+    else:
+        applied = upgrade(engine, args.to)
+        print(f"Applied {len(applied)} migration(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Versioned schema migrations, applied in order by migrate.py.
+
+Each module in this package is named `m<version>_<name>.py` and defines
+`upgrade(conn)` and `downgrade(conn)`, which receive a SQLAlchemy
+connection. MySQL commits DDL statements implicitly, so a migration that
+fails halfway cannot be rolled back; migrations are written with the
+idempotent helpers below so that running them again picks up where the
+failed attempt stopped.
+"""
+from typing import List
+from sqlalchemy import Column, Index, MetaData, Table, inspect
+
+def _existing_indexes(conn, table: str) -> List[dict]:
+    """Indexes of a table including its primary key, as [{"name", "columns", "unique"}]"""
+    inspector = inspect(conn)
+    indexes = [
+        {"name": index["name"], "columns": list(index["column_names"]), "unique": bool(index.get("unique"))}
+        for index in inspector.get_indexes(table)
+    ]
+    primary_key = inspector.get_pk_constraint(table).get("constrained_columns") or []
+    if primary_key:
+        indexes.append({"name": "PRIMARY", "columns": list(primary_key), "unique": True})
+    for constraint in inspector.get_unique_constraints(table):
+        indexes.append({"name": constraint["name"], "columns": list(constraint["column_names"]), "unique": True})
+    return indexes
+
+def index_covered(conn, table: str, columns: List[str], unique: bool = False) -> bool:
+    """
+    True if an existing index already serves lookups on columns: one starting
+    with the same columns, or exactly the same columns for a unique index
+    """
+    for index in _existing_indexes(conn, table):
+        if unique:
+            if index["unique"] and index["columns"] == columns:
+                return True
+        elif index["columns"][:len(columns)] == columns:
+            return True
+    return False
+
+def create_index(conn, name: str, table: str, columns: List[str], unique: bool = False, skip_if_covered: bool = True):
+    """Create an index unless one with the same name (or, by default, one covering the same columns) exists"""
+    if any(index["name"] == name for index in _existing_indexes(conn, table)):
+        return
+    if skip_if_covered and index_covered(conn, table, columns, unique):
+        return
+    target = Table(table, MetaData(), autoload_with=conn)
+    Index(name, *[target.c[column] for column in columns], unique=unique).create(conn)
+
+def drop_index(conn, name: str, table: str):
+    """Drop an index if it exists"""
+    target = Table(table, MetaData(), autoload_with=conn)
+    for index in target.indexes:
+        if index.name == name:
+            index.drop(conn)
+
+def column_exists(conn, table: str, name: str) -> bool:
+    return any(column["name"] == name for column in inspect(conn).get_columns(table))
+
+def add_column(conn, table: str, column: Column):
+    """Add a nullable column unless it exists"""
+    if column_exists(conn, table, column.name):
+        return
+    preparer = conn.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.exec_driver_sql(
+        f"ALTER TABLE {preparer.quote(table)} ADD COLUMN {preparer.quote(column.name)} {column_type} NULL"
+    )
+
+def drop_column(conn, table: str, name: str):
+    """Drop a column if it exists"""
+    if not column_exists(conn, table, name):
+        return
+    preparer = conn.dialect.identifier_preparer
+    conn.exec_driver_sql(f"ALTER TABLE {preparer.quote(table)} DROP COLUMN {preparer.quote(name)}")
@@ -0,0 +1,92 @@
+"""Create the tables of the original schema"""
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text, func
+)
+
+# The schema as database_setup.sql created it before migrations existed. It is
+# written out here rather than taken from models.py: the models describe the
+# schema after every migration, and later migrations add their own columns,
+# tables and indexes on top of this one.
+baseline_metadata = MetaData()
+
+Table(
+    "users",
+    baseline_metadata,
+    Column("id", String(36), primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("email", String(100), unique=True, nullable=False),
+    Column("password", String(255), nullable=False),
+    Column("avatar", String(255), nullable=True),
+    Column("created_at", DateTime, server_default=func.now()),
+    Column("updated_at", DateTime, server_default=func.now())
+)
+
+Table(
+    "chat_threads",
+    baseline_metadata,
+    Column("id", String(36), primary_key=True),
+    Column("title", String(255), nullable=False),
+    Column("created_at", DateTime, server_default=func.now()),
+    Column("updated_at", DateTime, server_default=func.now())
+)
+
+Table(
+    "user_thread",
+    baseline_metadata,
+    Column("user_id", String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+    Column("thread_id", String(36), ForeignKey("chat_threads.id", ondelete="CASCADE"), primary_key=True)
+)
+
+Table(
+    "messages",
+    baseline_metadata,
+    Column("id", String(36), primary_key=True),
+    Column("content", Text, nullable=True),
+    Column("sender", String(50), nullable=False),
+    Column("timestamp", DateTime, server_default=func.now()),
+    Column("thread_id", String(36), ForeignKey("chat_threads.id", ondelete="CASCADE"), nullable=False),
+    Column("user_id", String(36), ForeignKey("users.id", ondelete="SET NULL"), nullable=True),
+    Index("idx_messages_thread_id", "thread_id"),
+    Index("idx_messages_user_id", "user_id")
+)
+
+Table(
+    "file_attachments",
+    baseline_metadata,
+    Column("id", String(36), primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("type", String(100), nullable=False),
+    Column("size", Float, nullable=False),
+    Column("url", String(255), nullable=False),
+    Column("preview", String(255), nullable=True),
+    Column("message_id", String(36), ForeignKey("messages.id", ondelete="CASCADE"), nullable=False),
+    Index("idx_file_attachments_message_id", "message_id")
+)
+
+Table(
+    "ai_jobs",
+    baseline_metadata,
+    Column("id", String(36), primary_key=True),
+    Column("status", String(20), nullable=False, server_default="queued"),
+    Column("provider", String(50), nullable=False),
+    Column("model", String(100), nullable=False),
+    Column("content", Text, nullable=True),
+    Column("has_images", Boolean, server_default="0"),
+    Column("use_cache", Boolean, server_default="1"),
+    Column("error", Text, nullable=True),
+    Column("status_code", Integer, nullable=True),
+    Column("created_at", DateTime, server_default=func.now()),
+    Column("started_at", DateTime, nullable=True),
+    Column("finished_at", DateTime, nullable=True),
+    Column("user_id", String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("thread_id", String(36), ForeignKey("chat_threads.id", ondelete="CASCADE"), nullable=False),
+    Column("message_id", String(36), ForeignKey("messages.id", ondelete="SET NULL"), nullable=True),
+    Index("idx_ai_jobs_user_id", "user_id")
+)
+
+def upgrade(conn):
+    # Databases created with create_all or database_setup.sql already have these tables
+    baseline_metadata.create_all(conn, checkfirst=True)
+
+def downgrade(conn):
+    baseline_metadata.drop_all(conn, checkfirst=True)
@@ -0,0 +1,30 @@
+"""Composite indexes for the thread, message and job queries on the request path"""
+from migrations import create_index, drop_index
+
+# (name, table, columns, unique)
+INDEXES = [
+    # A thread's messages newest first: history packing, message pages (id breaks ties) and thread loads
+    ("ix_messages_thread_id_timestamp", "messages", ["thread_id", "timestamp", "id"], False),
+    # Latest user message of a thread, whose attachments are sent with each turn
+    ("ix_messages_thread_id_sender_timestamp", "messages", ["thread_id", "sender", "timestamp"], False),
+    # A user's threads and membership checks; tables from create_all have no key at all
+    ("ux_user_thread_user_id_thread_id", "user_thread", ["user_id", "thread_id"], True),
+    # Members of a thread
+    ("ix_user_thread_thread_id", "user_thread", ["thread_id"], False),
+    # Attachments of the loaded messages
+    ("ix_file_attachments_message_id", "file_attachments", ["message_id"], False),
+    # Queued jobs oldest first
+    ("ix_ai_jobs_status_created_at", "ai_jobs", ["status", "created_at"], False),
+]
+
+def upgrade(conn):
+    for name, table, columns, unique in INDEXES:
+        create_index(conn, name, table, columns, unique)
+    # Superseded by ix_messages_thread_id_timestamp, which also backs the foreign key
+    drop_index(conn, "idx_messages_thread_id", "messages")
+
+def downgrade(conn):
+    # Restore a plain thread_id index first: MySQL keeps one for the foreign key
+    create_index(conn, "idx_messages_thread_id", "messages", ["thread_id"], skip_if_covered=False)
+    for name, table, columns, unique in reversed(INDEXES):
+        drop_index(conn, name, table)
@@ -0,0 +1,30 @@
+"""Archive table for the messages of idle threads"""
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, LargeBinary, MetaData, String, Table, func, inspect, select
+from sqlalchemy.dialects.mysql import LONGBLOB
+from migrations import add_column, drop_column
+
+# The table as this migration creates it, independent of later model changes;
+# chat_threads is only declared for the foreign key
+archive_metadata = MetaData()
+Table("chat_threads", archive_metadata, Column("id", String(36), primary_key=True))
+message_archives = Table(
+    "message_archives",
+    archive_metadata,
+    Column("thread_id", String(36), ForeignKey("chat_threads.id", ondelete="CASCADE"), primary_key=True),
+    Column("archived_at", DateTime, nullable=False),
+    Column("message_count", Integer, nullable=False),
+    Column("original_bytes", Integer, nullable=False),
+    Column("payload", LargeBinary().with_variant(LONGBLOB(), "mysql"), nullable=False)
+)
+
+def upgrade(conn):
+    add_column(conn, "chat_threads", Column("archived_at", DateTime))
+    message_archives.create(conn, checkfirst=True)
+
+def downgrade(conn):
+    # Dropping the table would lose the archived messages
+    if inspect(conn).has_table("message_archives"):
+        if conn.execute(select(func.count()).select_from(message_archives)).scalar():
+            raise RuntimeError("Threads are still archived; restore them first with: python archive_messages.py --restore-all")
+    message_archives.drop(conn, checkfirst=True)
+    drop_column(conn, "chat_threads", "archived_at")
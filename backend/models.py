@@ -1,5 +1,6 @@
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Table, Boolean, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Table, Boolean, Float, Index, LargeBinary
+from sqlalchemy.dialects.mysql import LONGBLOB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -8,12 +9,14 @@ import uuid
 def generate_uuid():
     return str(uuid.uuid4())
 
-# Association table for user-thread relationship
+# Association table for user-thread relationship; the (user_id, thread_id) key
+# serves a user's thread list and membership checks, the thread_id index the
+# reverse lookup of a thread's members
 user_thread = Table(
     "user_thread",
     Base.metadata,
-    Column("user_id", String(36), ForeignKey("users.id")),
-    Column("thread_id", String(36), ForeignKey("chat_threads.id"))
+    Column("user_id", String(36), ForeignKey("users.id"), primary_key=True),
+    Column("thread_id", String(36), ForeignKey("chat_threads.id"), primary_key=True, index=True)
 )
 
 class User(Base):
@@ -38,6 +41,8 @@ class ChatThread(Base):
     title = Column(String(255), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    # Set while the thread's messages are moved out to message_archives
+    archived_at = Column(DateTime, nullable=True)
     
     # Relationships
     users = relationship("User", secondary=user_thread, back_populates="threads")
@@ -59,6 +64,13 @@ class Message(Base):
     thread = relationship("ChatThread", back_populates="messages")
     user = relationship("User", back_populates="messages")
     files = relationship("FileAttachment", back_populates="message", cascade="all, delete-orphan")
+    
+    # Indexes: a thread's messages newest first (id breaks timestamp ties for
+    # keyset pages), and a thread's latest message from one sender
+    __table_args__ = (
+        Index("ix_messages_thread_id_timestamp", "thread_id", "timestamp", "id"),
+        Index("ix_messages_thread_id_sender_timestamp", "thread_id", "sender", "timestamp"),
+    )
 
 class FileAttachment(Base):
     __tablename__ = "file_attachments"
@@ -71,7 +83,46 @@ class FileAttachment(Base):
     preview = Column(String(255), nullable=True)
     
     # Foreign key
-    message_id = Column(String(36), ForeignKey("messages.id"), nullable=False)
+    message_id = Column(String(36), ForeignKey("messages.id"), nullable=False, index=True)
     
     # Relationship
     message = relationship("Message", back_populates="files")
+
+class AIJob(Base):
+    __tablename__ = "ai_jobs"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    status = Column(String(20), nullable=False, default="queued")  # "queued", "running", "completed" or "failed"
+    provider = Column(String(50), nullable=False)
+    model = Column(String(100), nullable=False)
+    content = Column(Text, nullable=True)
+    has_images = Column(Boolean, default=False)
+    use_cache = Column(Boolean, default=True)
+    error = Column(Text, nullable=True)
+    status_code = Column(Integer, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    # Foreign keys
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    thread_id = Column(String(36), ForeignKey("chat_threads.id", ondelete="CASCADE"), nullable=False)
+    message_id = Column(String(36), ForeignKey("messages.id", ondelete="SET NULL"), nullable=True)
+    
+    # Relationship
+    message = relationship("Message")
+    
+    # Index: queued jobs oldest first, resubmitted at startup
+    __table_args__ = (
+        Index("ix_ai_jobs_status_created_at", "status", "created_at"),
+    )
+
+class MessageArchive(Base):
+    __tablename__ = "message_archives"
+
+    # The messages and attachments of an idle thread, as zlib-compressed JSON
+    thread_id = Column(String(36), ForeignKey("chat_threads.id", ondelete="CASCADE"), primary_key=True)
+    archived_at = Column(DateTime, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    original_bytes = Column(Integer, nullable=False)
+    payload = Column(LargeBinary().with_variant(LONGBLOB(), "mysql"), nullable=False)
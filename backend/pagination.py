@@ -0,0 +1,53 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(sort_value: datetime, row_id: str) -> str:
+    """Opaque cursor pointing just past a row in (sort_value, id) order"""
+    raw = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor from encode_cursor; raises a 400 if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), str(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def page_size(limit: Optional[int]) -> int:
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def after_cursor(sort_column, id_column, cursor: Optional[str]):
+    """
+    WHERE clause selecting the rows after a cursor in descending (sort, id)
+    order. The leading range on the sort column lets MySQL seek on a
+    (…, sort, id) index instead of scanning the skipped rows like OFFSET does.
+    """
+    if not cursor:
+        return None
+    sort_value, row_id = decode_cursor(cursor)
+    return after_row(sort_column, id_column, sort_value, row_id)
+
+def after_row(sort_column, id_column, sort_value: datetime, row_id: str):
+    """WHERE clause selecting the rows after (sort_value, row_id) in descending (sort, id) order"""
+    return and_(
+        sort_column <= sort_value,
+        or_(sort_column < sort_value, id_column < row_id)
+    )
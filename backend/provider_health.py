@@ -0,0 +1,224 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import httpx
+from retry import DeadlineExceeded, ProviderAPIError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upstream 4xx statuses that still point at the provider rather than the request
+PROVIDER_FAULT_STATUS_CODES = {408, 429}
+
+def is_provider_fault(error: BaseException) -> bool:
+    """Whether a failed call says something about the provider's health"""
+    # The caller's deadline ran out, which says nothing about the provider
+    if isinstance(error, DeadlineExceeded):
+        return False
+    # A bad request, key or model name is the caller's doing
+    if isinstance(error, ProviderAPIError):
+        return error.upstream_status >= 500 or error.upstream_status in PROVIDER_FAULT_STATUS_CODES
+    return True
+
+class LatencyTracker:
+    """
+    Sliding window of recent latency samples (seconds) per provider/model,
+    used to derive percentile-based hedging delays.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider_id: str, model_id: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get((provider_id, model_id))
+            if samples is None:
+                samples = deque(maxlen=self.window)
+                self._samples[(provider_id, model_id)] = samples
+            samples.append(seconds)
+
+    def percentile(self, provider_id: str, model_id: str, pct: float, min_samples: int = 1) -> Optional[float]:
+        """Return the pct-th percentile latency, or None if there are fewer than min_samples"""
+        with self._lock:
+            samples = self._samples.get((provider_id, model_id))
+            if not samples or len(samples) < min_samples:
+                return None
+            ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+        return ordered[index]
+
+    def count(self, provider_id: str, model_id: str) -> int:
+        with self._lock:
+            samples = self._samples.get((provider_id, model_id))
+            return len(samples) if samples else 0
+
+class ProviderUnavailableError(Exception):
+    """Raised when every candidate provider for a request has an open circuit breaker"""
+
+    def __init__(self, candidates: List[Tuple[str, str]], retry_after: float):
+        self.candidates = candidates
+        self.retry_after = retry_after
+        names = ", ".join(f"{provider}/{model}" for provider, model in candidates)
+        super().__init__(f"All providers are temporarily unavailable ({names})")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class _ModelHealth:
+    """Rolling health statistics and circuit state for one provider/model"""
+
+    def __init__(self):
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.timeout_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+
+class ProviderHealth:
+    """
+    Per provider/model health scoring with a circuit breaker.
+    Latency, error rate and timeout rate are exponentially weighted moving
+    averages. The breaker opens once enough requests have been seen and the
+    error or timeout rate crosses its threshold; after a cool-down it goes
+    half-open and lets a limited number of probe requests through, closing
+    again on a successful probe and re-opening on a failed one.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.2,
+        error_rate_threshold: float = 0.5,
+        timeout_rate_threshold: float = 0.3,
+        min_requests: int = 5,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1
+    ):
+        self.alpha = alpha
+        self.error_rate_threshold = error_rate_threshold
+        self.timeout_rate_threshold = timeout_rate_threshold
+        self.min_requests = min_requests
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._models: Dict[Tuple[str, str], _ModelHealth] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, provider_id: str, model_id: str) -> _ModelHealth:
+        health = self._models.get((provider_id, model_id))
+        if health is None:
+            health = _ModelHealth()
+            self._models[(provider_id, model_id)] = health
+        return health
+
+    def _refresh_state(self, health: _ModelHealth):
+        if health.state == OPEN and time.monotonic() - health.opened_at >= self.open_seconds:
+            health.state = HALF_OPEN
+            health.probes_in_flight = 0
+
+    def is_available(self, provider_id: str, model_id: str) -> bool:
+        """Whether a request may be routed to this provider/model right now"""
+        with self._lock:
+            health = self._get(provider_id, model_id)
+            self._refresh_state(health)
+            if health.state == OPEN:
+                return False
+            if health.state == HALF_OPEN:
+                return health.probes_in_flight < self.half_open_probes
+            return True
+
+    def retry_after(self, provider_id: str, model_id: str) -> float:
+        """Seconds until an open breaker will allow a probe"""
+        with self._lock:
+            health = self._get(provider_id, model_id)
+            if health.state != OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - health.opened_at))
+
+    def on_request(self, provider_id: str, model_id: str):
+        """Register a request being sent (takes a probe slot when half-open)"""
+        with self._lock:
+            health = self._get(provider_id, model_id)
+            self._refresh_state(health)
+            if health.state == HALF_OPEN:
+                health.probes_in_flight += 1
+
+    def on_cancel(self, provider_id: str, model_id: str):
+        """Release the probe slot of a request that was cancelled before finishing"""
+        with self._lock:
+            health = self._get(provider_id, model_id)
+            if health.state == HALF_OPEN and health.probes_in_flight > 0:
+                health.probes_in_flight -= 1
+
+    def record_success(self, provider_id: str, model_id: str, latency: float):
+        with self._lock:
+            health = self._get(provider_id, model_id)
+            health.requests += 1
+            health.ewma_latency = latency if health.ewma_latency is None else (
+                self.alpha * latency + (1 - self.alpha) * health.ewma_latency
+            )
+            health.error_rate = (1 - self.alpha) * health.error_rate
+            health.timeout_rate = (1 - self.alpha) * health.timeout_rate
+            if health.state == HALF_OPEN:
+                logger.info(f"Circuit closed for {provider_id}/{model_id} after successful probe")
+                health.state = CLOSED
+                health.error_rate = 0.0
+                health.timeout_rate = 0.0
+                health.probes_in_flight = 0
+
+    def record_failure(self, provider_id: str, model_id: str, error: BaseException):
+        # Failures the provider did not cause leave its health untouched
+        if not is_provider_fault(error):
+            self.on_cancel(provider_id, model_id)
+            return
+        is_timeout = isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException))
+        with self._lock:
+            health = self._get(provider_id, model_id)
+            health.requests += 1
+            health.failures += 1
+            health.error_rate = self.alpha + (1 - self.alpha) * health.error_rate
+            health.timeout_rate = (1 - self.alpha) * health.timeout_rate + (self.alpha if is_timeout else 0.0)
+            if is_timeout:
+                health.timeouts += 1
+
+            if health.state == HALF_OPEN:
+                self._open(provider_id, model_id, health, "probe failed")
+            elif health.state == CLOSED and health.requests >= self.min_requests:
+                if health.error_rate >= self.error_rate_threshold:
+                    self._open(provider_id, model_id, health, f"error rate {health.error_rate:.2f}")
+                elif health.timeout_rate >= self.timeout_rate_threshold:
+                    self._open(provider_id, model_id, health, f"timeout rate {health.timeout_rate:.2f}")
+
+    def _open(self, provider_id: str, model_id: str, health: _ModelHealth, reason: str):
+        logger.warning(f"Circuit opened for {provider_id}/{model_id}: {reason}")
+        health.state = OPEN
+        health.opened_at = time.monotonic()
+        health.probes_in_flight = 0
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Current health and circuit state of every provider/model seen so far"""
+        with self._lock:
+            result = []
+            for (provider_id, model_id), health in self._models.items():
+                self._refresh_state(health)
+                result.append({
+                    "provider": provider_id,
+                    "model": model_id,
+                    "state": health.state,
+                    "ewma_latency": health.ewma_latency,
+                    "error_rate": round(health.error_rate, 4),
+                    "timeout_rate": round(health.timeout_rate, 4),
+                    "requests": health.requests,
+                    "failures": health.failures,
+                    "timeouts": health.timeouts
+                })
+            return result
@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+CONFIG_FILE_NAME = "ai_providers_config.json"
+
+RATE_LIMIT_KEYS = {"requests_per_minute", "tokens_per_minute"}
+PRICING_KEYS = {"input_per_million", "output_per_million"}
+
+class ConfigError(ValueError):
+    """Raised when ai_providers_config.json cannot be read or fails validation"""
+
+    def __init__(self, path: str, problems: List[str]):
+        self.path = path
+        self.problems = problems
+        super().__init__(f"Invalid provider configuration {path}: " + "; ".join(problems))
+
+class ModelRecord:
+    """Compiled configuration of one provider model"""
+
+    def __init__(self, provider_id: str, config: Dict[str, Any], rate_limits: Optional[Dict[str, Any]],
+                 fallbacks: Tuple[Tuple[str, str], ...]):
+        self.provider_id = provider_id
+        self.model_id = config["id"]
+        self.name = config.get("name", self.model_id)
+        self.context_window: Optional[int] = config.get("context_window")
+        self.pricing: Optional[Dict[str, float]] = config.get("pricing")
+        # Model limits, or the provider's when the model has none
+        self.rate_limits = rate_limits
+        self.fallbacks = fallbacks
+        self.config = config
+
+class ProviderRecord:
+    """Compiled configuration of one provider and its models by id"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.provider_id = config["id"]
+        self.name = config.get("name", self.provider_id)
+        self.rate_limits: Optional[Dict[str, Any]] = config.get("rate_limits")
+        self.models: Dict[str, ModelRecord] = {}
+        self.config = config
+
+class RegistrySnapshot:
+    """An immutable, fully validated view of the configuration; replaced as a whole on reload"""
+
+    def __init__(self, providers: Dict[str, ProviderRecord], mtime: Optional[float], version: int):
+        self.providers = providers
+        self.models: Dict[Tuple[str, str], ModelRecord] = {
+            (provider.provider_id, model.model_id): model
+            for provider in providers.values() for model in provider.models.values()
+        }
+        self.mtime = mtime
+        self.version = version
+        self.loaded_at = time.time()
+
+def _check_numbers(values: Any, allowed: set, where: str, problems: List[str]):
+    if not isinstance(values, dict):
+        problems.append(f"{where} must be an object")
+        return
+    for key, value in values.items():
+        if key not in allowed:
+            problems.append(f"{where} has unknown key '{key}'")
+        elif isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            problems.append(f"{where}.{key} must be a non-negative number")
+
+def compile_config(raw: Any, mtime: Optional[float] = None, version: int = 0, path: str = CONFIG_FILE_NAME) -> RegistrySnapshot:
+    """Validate the parsed configuration and index it by provider and (provider, model); raises ConfigError"""
+    problems: List[str] = []
+    if not isinstance(raw, list):
+        raise ConfigError(path, ["top level must be a list of providers"])
+
+    providers: Dict[str, ProviderRecord] = {}
+    pending_fallbacks: List[Tuple[ProviderRecord, Dict[str, Any]]] = []
+    for index, provider_config in enumerate(raw):
+        if not isinstance(provider_config, dict) or not isinstance(provider_config.get("id"), str):
+            problems.append(f"provider #{index} needs a string 'id'")
+            continue
+        provider_id = provider_config["id"]
+        if provider_id in providers:
+            problems.append(f"duplicate provider '{provider_id}'")
+            continue
+        if "rate_limits" in provider_config:
+            _check_numbers(provider_config["rate_limits"], RATE_LIMIT_KEYS, f"{provider_id}.rate_limits", problems)
+        models = provider_config.get("models")
+        if not isinstance(models, list):
+            problems.append(f"provider '{provider_id}' needs a 'models' list")
+            continue
+
+        provider = providers[provider_id] = ProviderRecord(provider_config)
+        for model_config in models:
+            if not isinstance(model_config, dict) or not isinstance(model_config.get("id"), str):
+                problems.append(f"{provider_id} has a model without a string 'id'")
+                continue
+            where = f"{provider_id}/{model_config['id']}"
+            if model_config["id"] in provider.models:
+                problems.append(f"duplicate model '{where}'")
+                continue
+            context_window = model_config.get("context_window")
+            if context_window is not None and (isinstance(context_window, bool) or not isinstance(context_window, int) or context_window <= 0):
+                problems.append(f"{where}.context_window must be a positive integer")
+            if "rate_limits" in model_config:
+                _check_numbers(model_config["rate_limits"], RATE_LIMIT_KEYS, f"{where}.rate_limits", problems)
+            if "pricing" in model_config:
+                _check_numbers(model_config["pricing"], PRICING_KEYS, f"{where}.pricing", problems)
+            provider.models[model_config["id"]] = ModelRecord(
+                provider_id, model_config, model_config.get("rate_limits") or provider.rate_limits, ()
+            )
+            pending_fallbacks.append((provider, model_config))
+
+    # Fallbacks are resolved once every model is known, so they may point forward in the file
+    for provider, model_config in pending_fallbacks:
+        model = provider.models[model_config["id"]]
+        where = f"{provider.provider_id}/{model.model_id}"
+        fallbacks = model_config.get("fallbacks", [])
+        if not isinstance(fallbacks, list):
+            problems.append(f"{where}.fallbacks must be a list")
+            continue
+        chain: List[Tuple[str, str]] = []
+        for fallback in fallbacks:
+            if not isinstance(fallback, dict) or "provider" not in fallback or "model" not in fallback:
+                problems.append(f"{where} has a fallback without 'provider' and 'model'")
+                continue
+            target = (fallback["provider"], fallback["model"])
+            target_provider = providers.get(target[0])
+            if target_provider is None or target[1] not in target_provider.models:
+                problems.append(f"{where} falls back to unknown model {target[0]}/{target[1]}")
+            elif target != (provider.provider_id, model.model_id) and target not in chain:
+                chain.append(target)
+        model.fallbacks = tuple(chain)
+
+    if problems:
+        raise ConfigError(path, problems)
+    return RegistrySnapshot(providers, mtime, version)
+
+def find_config_file(file_name: str = CONFIG_FILE_NAME) -> str:
+    """Locate the provider configuration: AI_PROVIDERS_CONFIG, then the working directory, then backend/"""
+    configured = os.getenv("AI_PROVIDERS_CONFIG")
+    if configured:
+        return configured
+    candidates = [
+        os.path.join(os.getcwd(), file_name),
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name)
+    ]
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    logger.error(f"Could not find {file_name}")
+    return candidates[-1]
+
+class ProviderRegistry:
+    """
+    Provider/model configuration compiled into dict-indexed records so that
+    lookups on the routing path are O(1). The file is re-read when its
+    modification time changes; a new snapshot is swapped in whole, and an
+    invalid file is logged and ignored, keeping the last good configuration.
+    """
+
+    def __init__(self, config_path: Optional[str] = None, reload_interval: float = 5.0):
+        self.config_path = config_path or find_config_file()
+        self.reload_interval = reload_interval
+        self._listeners: List[Callable[[RegistrySnapshot], None]] = []
+        self._watcher: Optional[asyncio.Task] = None
+        self.reloads = 0
+        self.reload_errors = 0
+        self._rejected_mtime: Optional[float] = None
+        try:
+            self._snapshot = self._load(version=1)
+            logger.info(f"Loaded provider configuration from {self.config_path}")
+        except ConfigError as e:
+            logger.error(str(e))
+            self._snapshot = RegistrySnapshot({}, None, 0)
+
+    @property
+    def snapshot(self) -> RegistrySnapshot:
+        return self._snapshot
+
+    def _load(self, version: int) -> RegistrySnapshot:
+        try:
+            mtime = os.path.getmtime(self.config_path)
+            with open(self.config_path, 'r') as f:
+                raw = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ConfigError(self.config_path, [str(e)])
+        return compile_config(raw, mtime, version, self.config_path)
+
+    def providers(self) -> List[ProviderRecord]:
+        return list(self._snapshot.providers.values())
+
+    def provider(self, provider_id: str) -> Optional[ProviderRecord]:
+        return self._snapshot.providers.get(provider_id)
+
+    def model(self, provider_id: str, model_id: str) -> Optional[ModelRecord]:
+        return self._snapshot.models.get((provider_id, model_id))
+
+    def add_listener(self, listener: Callable[[RegistrySnapshot], None]):
+        """Call listener with the new snapshot after every successful reload"""
+        self._listeners.append(listener)
+
+    def reload(self) -> bool:
+        """Re-read the configuration file; returns False (keeping the current configuration) if it is invalid"""
+        try:
+            snapshot = self._load(version=self._snapshot.version + 1)
+        except ConfigError as e:
+            self.reload_errors += 1
+            logger.error(f"{str(e)}; keeping version {self._snapshot.version}")
+            return False
+        self._snapshot = snapshot
+        self.reloads += 1
+        logger.info(f"Reloaded provider configuration (version {snapshot.version}) from {self.config_path}")
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error(f"Provider configuration listener failed: {str(e)}")
+        return True
+
+    def reload_if_changed(self) -> bool:
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError:
+            return False
+        # An invalid file is reported once per change rather than on every poll
+        if mtime == self._snapshot.mtime or mtime == self._rejected_mtime:
+            return False
+        if self.reload():
+            return True
+        self._rejected_mtime = mtime
+        return False
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            self.reload_if_changed()
+
+    def start_watching(self):
+        """Poll the file for changes (called on app startup); each worker process watches on its own"""
+        if self.reload_interval > 0 and (self._watcher is None or self._watcher.done()):
+            self._watcher = asyncio.ensure_future(self._watch())
+
+    async def stop_watching(self):
+        watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version,
+            "providers": len(snapshot.providers),
+            "models": len(snapshot.models),
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors
+        }
@@ -0,0 +1,94 @@
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import Date, func, select
+from models import User, ChatThread, Message, AIJob, user_thread
+from loaders import THREAD_WITH_MESSAGES, MESSAGE_WITH_FILES, JOB_WITH_MESSAGE
+from jobs import JOB_QUEUED
+from pagination import after_cursor, after_row
+
+# Statements of the hot queries on the request path. The routes execute
+# them and check_query_plans.py EXPLAINs the very same statements, so an
+# index regression shows up in the check before it shows up in production.
+# Builders return the statement without a LIMIT where the caller pages it.
+
+def thread_list_query(user_id: str, cursor: Optional[str] = None):
+    """A user's threads latest first, summary columns only, after a (updated_at, id) cursor"""
+    query = select(
+        ChatThread.id, ChatThread.title, ChatThread.created_at, ChatThread.updated_at
+    ).join(
+        user_thread, user_thread.c.thread_id == ChatThread.id
+    ).where(
+        user_thread.c.user_id == user_id
+    )
+    keyset = after_cursor(ChatThread.updated_at, ChatThread.id, cursor)
+    if keyset is not None:
+        query = query.where(keyset)
+    return query.order_by(ChatThread.updated_at.desc(), ChatThread.id.desc())
+
+def history_query(user_id: str, offset: str):
+    """A user's threads latest first with the local day ("day") of their last update at a "+HH:MM" UTC offset"""
+    day = func.date(func.convert_tz(ChatThread.updated_at, "+00:00", offset), type_=Date).label("day")
+    return select(
+        day, ChatThread.id, ChatThread.title, ChatThread.created_at, ChatThread.updated_at
+    ).join(
+        user_thread, user_thread.c.thread_id == ChatThread.id
+    ).where(
+        user_thread.c.user_id == user_id
+    ).order_by(ChatThread.updated_at.desc(), ChatThread.id.desc())
+
+def membership_query(user_id: str, thread_id: str):
+    """The (user_id, thread_id) membership row and the thread's archived_at"""
+    return select(user_thread.c.thread_id, ChatThread.archived_at).join(
+        ChatThread, ChatThread.id == user_thread.c.thread_id
+    ).where(
+        user_thread.c.user_id == user_id,
+        user_thread.c.thread_id == thread_id
+    )
+
+def thread_archived_query(thread_id: str):
+    """A thread's archived_at by primary key"""
+    return select(ChatThread.archived_at).where(ChatThread.id == thread_id)
+
+def thread_with_messages_query(thread_id: str):
+    return select(ChatThread).options(*THREAD_WITH_MESSAGES).where(ChatThread.id == thread_id)
+
+def message_page_query(thread_id: str, cursor: Optional[str] = None):
+    """A thread's messages with their attachments newest first, after a (timestamp, id) cursor"""
+    query = select(Message).options(*MESSAGE_WITH_FILES).where(Message.thread_id == thread_id)
+    keyset = after_cursor(Message.timestamp, Message.id, cursor)
+    if keyset is not None:
+        query = query.where(keyset)
+    return query.order_by(Message.timestamp.desc(), Message.id.desc())
+
+def context_history_query(thread_id: str, before: Optional[Tuple[datetime, str]] = None):
+    """A thread's (id, sender, content, timestamp) newest first, for packing the prompt, after a (timestamp, id) row"""
+    query = select(Message.id, Message.sender, Message.content, Message.timestamp).where(
+        Message.thread_id == thread_id
+    )
+    if before is not None:
+        query = query.where(after_row(Message.timestamp, Message.id, *before))
+    return query.order_by(Message.timestamp.desc(), Message.id.desc())
+
+def last_user_message_query(thread_id: str):
+    """A thread's latest user message with its attachments"""
+    return select(Message).options(*MESSAGE_WITH_FILES).where(
+        Message.thread_id == thread_id,
+        Message.sender == "user"
+    ).order_by(Message.timestamp.desc()).limit(1)
+
+def thread_members_query(thread_id: str):
+    return select(user_thread.c.user_id).where(user_thread.c.thread_id == thread_id)
+
+def job_query(job_id: str, user_id: str):
+    """A user's job with its answer message"""
+    return select(AIJob).options(*JOB_WITH_MESSAGE).where(
+        AIJob.id == job_id,
+        AIJob.user_id == user_id
+    )
+
+def queued_jobs_query(limit: int):
+    """Ids of queued jobs oldest first"""
+    return select(AIJob.id).where(AIJob.status == JOB_QUEUED).order_by(AIJob.created_at).limit(limit)
+
+def user_by_email_query(email: str):
+    return select(User).where(User.email == email)
@@ -0,0 +1,46 @@
+from contextlib import contextmanager
+from typing import List
+from sqlalchemy import event
+
+class QueryCounter:
+    """Statements executed on an engine while the counter is active"""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+def _sync_engine(engine):
+    # AsyncEngine events are registered on its underlying sync engine
+    return getattr(engine, "sync_engine", engine)
+
+@contextmanager
+def count_queries(engine):
+    """
+    Count the statements run on engine (sync or async) inside the block:
+
+        with count_queries(async_engine) as counter:
+            ...
+        print(counter.count)
+    """
+    counter = QueryCounter()
+    target = _sync_engine(engine)
+    event.listen(target, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(target, "before_cursor_execute", counter._record)
+
+@contextmanager
+def assert_max_queries(engine, max_queries: int):
+    """Fail with the offending statements if the block runs more than max_queries statements"""
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > max_queries:
+        statements = "\n".join(f"  {index + 1}. {statement.strip()[:200]}" for index, statement in enumerate(counter.statements))
+        raise AssertionError(f"Expected at most {max_queries} queries, got {counter.count}:\n{statements}")
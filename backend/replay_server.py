@@ -0,0 +1,80 @@
+"""
+Local replay server for recorded provider cassettes.
+
+Serves every provider from one process under a path prefix per provider, so
+the app can be pointed at it through the *_BASE_URL settings:
+
+    OPENAI_BASE_URL=http://127.0.0.1:9000/openai
+    GEMINI_BASE_URL=http://127.0.0.1:9000/gemini
+    MISTRAL_BASE_URL=http://127.0.0.1:9000/mistral
+    DEEPSEEK_BASE_URL=http://127.0.0.1:9000/deepseek
+
+Responses are replayed with their original timing (time to headers and the
+offset of every streamed chunk), multiplied by --latency-scale.
+
+Usage:
+    python replay_server.py --cassettes cassettes [--port 9000] [--latency-scale 1.0]
+"""
+import asyncio
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from cassettes import CassetteLibrary, cassette_key, decode_chunk, parse_body
+
+def create_replay_app(cassette_dir: str, latency_scale: float = 1.0) -> FastAPI:
+    library = CassetteLibrary(cassette_dir)
+    app = FastAPI(title="Provider Replay Server")
+    app.state.hits = 0
+    app.state.misses = 0
+
+    @app.get("/_replay/stats")
+    async def replay_stats():
+        return {"cassettes": len(library), "hits": app.state.hits, "misses": app.state.misses}
+
+    @app.api_route("/{provider}/{path:path}", methods=["GET", "POST"])
+    async def replay(provider: str, path: str, request: Request):
+        body = await request.body()
+        key = cassette_key(request.method, f"/{path}", request.url.query, parse_body(body))
+        cassette = library.find(provider, key)
+        if cassette is None:
+            app.state.misses += 1
+            return JSONResponse(
+                status_code=404,
+                content={"detail": f"No cassette recorded for {request.method} /{provider}/{path}", "key": key}
+            )
+
+        app.state.hits += 1
+        response = cassette["response"]
+        await asyncio.sleep(response.get("headers_ms", 0) / 1000 * latency_scale)
+
+        async def replay_chunks():
+            elapsed_ms = response.get("headers_ms", 0)
+            for chunk in response["chunks"]:
+                delay_ms = max(0.0, chunk["offset_ms"] - elapsed_ms)
+                await asyncio.sleep(delay_ms / 1000 * latency_scale)
+                elapsed_ms = chunk["offset_ms"]
+                yield decode_chunk(chunk)
+
+        return StreamingResponse(
+            replay_chunks(),
+            status_code=response["status_code"],
+            headers=response.get("headers", {})
+        )
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded provider cassettes")
+    parser.add_argument("--cassettes", default="cassettes", help="Directory of recorded cassettes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiply recorded latencies (0 replays instantly, 0.5 at double speed)")
+    args = parser.parse_args()
+
+    app = create_replay_app(args.cassettes, args.latency_scale)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+def file_digest(file: Dict[str, Any]) -> Dict[str, Any]:
+    """Describe a prepared file by its metadata and a digest of its content"""
+    return {
+        "name": file.get("name"),
+        "type": file.get("type"),
+        "is_image": file.get("is_image", False),
+        "content": _digest(file["content"]) if file.get("content") else None,
+        "base64": _digest(file["base64"]) if file.get("base64") else None
+    }
+
+def build_cache_key(
+    provider_id: str,
+    model_id: str,
+    messages: List[Dict[str, Any]],
+    files: Optional[List[Dict[str, Any]]] = None,
+    params: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Build a canonical hash for a completion request. Files are reduced to
+    content digests so large attachments are not serialized into the key.
+    """
+    canonical = json.dumps(
+        {
+            "provider": provider_id,
+            "model": model_id,
+            "messages": messages,
+            "files": [file_digest(f) for f in files or []],
+            "params": params or {}
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+    return _digest(canonical)
+
+class ResponseCache:
+    """
+    In-process LRU cache for provider completions with a TTL per entry
+    and a bound on the total size of the cached responses in bytes.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, size = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str):
+        """Store a response, evicting least recently used entries to stay within bounds"""
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds, size)
+            self._bytes += size
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
@@ -0,0 +1,153 @@
+import time
+import random
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Optional
+import httpx
+from fastapi import HTTPException, status
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upstream statuses worth retrying: throttling and transient server errors
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Absolute time.monotonic() deadline of the request being served
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Raised when the request deadline has passed before or during a provider call"""
+
+    def __init__(self, message: str = "Request deadline exceeded"):
+        super().__init__(message)
+
+class ProviderAPIError(HTTPException):
+    """
+    Non-200 response from a provider API. Surfaces as a 500 like before, but
+    keeps the upstream status and Retry-After hint so callers can decide to retry.
+    """
+
+    def __init__(self, provider_name: str, upstream_status: int, body: str, retry_after: Optional[float] = None):
+        super().__init__(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"{provider_name} API error: {body}"
+        )
+        self.provider_name = provider_name
+        self.upstream_status = upstream_status
+        self.retry_after = retry_after
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Run a block under a deadline; a nested scope can only shorten an outer one"""
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining_time() -> Optional[float]:
+    """Seconds left until the current deadline (None when no deadline is set)"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def deadline_expired() -> bool:
+    left = remaining_time()
+    return left is not None and left <= 0
+
+def check_deadline():
+    if deadline_expired():
+        raise DeadlineExceeded()
+
+def request_timeout(timeout: httpx.Timeout) -> httpx.Timeout:
+    """Clip a client's connect/read/write/pool timeouts to the time left before the deadline"""
+    left = remaining_time()
+    if left is None:
+        return timeout
+    left = max(0.001, left)
+
+    def clip(value: Optional[float]) -> float:
+        return left if value is None else min(value, left)
+
+    return httpx.Timeout(
+        connect=clip(timeout.connect),
+        read=clip(timeout.read),
+        write=clip(timeout.write),
+        pool=clip(timeout.pool)
+    )
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, ProviderAPIError):
+        return error.upstream_status in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+class RetryPolicy:
+    """
+    Bounded retries with exponential backoff and full jitter. A Retry-After
+    hint from the provider is honoured, and no retry is attempted when its
+    delay would run past the request deadline.
+    """
+
+    def __init__(self, max_retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def run(self, func: Callable[[], Awaitable[Any]], description: str) -> Any:
+        attempt = 0
+        while True:
+            check_deadline()
+            try:
+                return await func()
+            except Exception as e:
+                if deadline_expired():
+                    raise DeadlineExceeded() from e
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+
+                delay = self.backoff(attempt)
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                left = remaining_time()
+                if left is not None and delay >= left:
+                    raise
+
+                attempt += 1
+                reason = getattr(e, "detail", None) or str(e) or type(e).__name__
+                logger.warning(f"{description} request failed ({str(reason)[:200]}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
@@ -1,21 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body, File, UploadFile, Form
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from fastapi import APIRouter, Depends, HTTPException, status, Body, File, UploadFile, Form, Query, Response
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 import json
+import math
+import time
+import asyncio
 import os
-import requests
-from database import get_db
-from models import User, ChatThread, Message, FileAttachment
-from schemas import ChatThreadCreate, ChatThreadResponse, MessageCreate, MessageResponse, ChatHistoryByDate
+from database import get_db, AsyncSessionLocal
+from models import User, ChatThread, Message, FileAttachment, AIJob, MessageArchive, user_thread
+from schemas import (
+    ChatThreadCreate, ChatThreadResponse, ChatThreadSummary, MessageCreate, MessageResponse, ChatHistoryByDate, JobResponse
+)
 from utils import get_current_user
 from dotenv import load_dotenv
 from file_processors import prepare_files_for_ai, format_files_for_provider
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+from http_client import http_clients, provider_url
+from local_inference import local_engine
 import logging
 from ai_provider_manager import AIProviderManager
+from provider_health import ProviderUnavailableError
+from admission import AdmissionRejected
+from retry import (
+    RetryPolicy, ProviderAPIError, DeadlineExceeded, deadline_scope, check_deadline,
+    request_timeout, parse_retry_after
+)
+from context_builder import ContextBuilder, ThreadContextCache
+from metrics import stats_collector
+from tracing import tracer
+from jobs import JobRunner, JOB_QUEUED, JOB_RUNNING, JOB_COMPLETED, JOB_FAILED, FINISHED_STATES
+from pagination import NEXT_CURSOR_HEADER, MAX_PAGE_SIZE, encode_cursor, page_size
+from history_cache import HistoryCache, utc_offset
+from membership import MembershipCache
+from queries import (
+    thread_list_query, history_query, thread_with_messages_query, message_page_query,
+    thread_members_query, job_query, queued_jobs_query
+)
+from archive import rehydrate_thread
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,37 +48,126 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Determine the correct path for the config file
-current_dir = os.path.dirname(os.path.abspath(__file__))
-config_paths = [
-    "ai_providers_config.json",  # Try direct path
-    os.path.join(current_dir, "..", "ai_providers_config.json"),  # Try relative to router directory
-    os.path.join(os.getcwd(), "ai_providers_config.json")  # Try from current working directory
-]
-
-# Initialize AI Provider Manager with the first config file that exists
-config_file = None
-for path in config_paths:
-    if os.path.exists(path):
-        config_file = path
-        logger.info(f"Using configuration file: {path}")
-        break
-
-if not config_file:
-    logger.error("Could not find ai_providers_config.json file")
-    # Default to the first path as a fallback
-    config_file = config_paths[0]
-
-# Initialize AI Provider Manager
-ai_manager = AIProviderManager(config_file)
+# Initialize AI Provider Manager; the provider configuration is located and hot-reloaded by its registry
+ai_manager = AIProviderManager()
+
+# Per-thread context cache, kept current by the message write paths below
+thread_context_cache = ThreadContextCache(
+    max_threads=int(os.getenv("CONTEXT_CACHE_MAX_THREADS", "512")),
+    max_messages=int(os.getenv("CONTEXT_CACHE_MAX_MESSAGES", "200")),
+    ttl_seconds=float(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "300")),
+    max_bytes=int(os.getenv("CONTEXT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+)
+
+# Per-user history grouped by day, dropped whenever one of the user's threads changes
+history_cache = HistoryCache(
+    max_users=int(os.getenv("HISTORY_CACHE_MAX_USERS", "1024")),
+    ttl_seconds=float(os.getenv("HISTORY_CACHE_TTL_SECONDS", "60"))
+)
+
+async def rehydrate_archived_thread(thread_id: str) -> int:
+    """Restore an archived thread's messages in a session of its own, leaving the request's session untouched"""
+    async with AsyncSessionLocal() as db:
+        return await rehydrate_thread(db, thread_id)
+
+# Thread membership checks of the thread-scoped routes, cached per (user, thread);
+# an archived thread's messages are restored when a member first accesses it
+thread_membership = MembershipCache(
+    max_entries=int(os.getenv("MEMBERSHIP_CACHE_MAX_ENTRIES", "100000")),
+    ttl_seconds=float(os.getenv("MEMBERSHIP_CACHE_TTL_SECONDS", "60")),
+    rehydrate=rehydrate_archived_thread
+)
+
+# Retries of transient provider failures (429/5xx, network errors) within the request deadline
+provider_retry = RetryPolicy(
+    max_retries=int(os.getenv("PROVIDER_MAX_RETRIES", "2")),
+    base_delay=float(os.getenv("PROVIDER_RETRY_BASE_DELAY_SECONDS", "0.5")),
+    max_delay=float(os.getenv("PROVIDER_RETRY_MAX_DELAY_SECONDS", "8"))
+)
+
+# Default deadlines per route in seconds; clients may pass their own `timeout` up to DEADLINE_MAX_SECONDS
+DEADLINE_PROCESS_MESSAGE_SECONDS = float(os.getenv("DEADLINE_PROCESS_MESSAGE_SECONDS", "120"))
+DEADLINE_STREAM_SECONDS = float(os.getenv("DEADLINE_STREAM_SECONDS", "300"))
+DEADLINE_FAN_OUT_SECONDS = float(os.getenv("DEADLINE_FAN_OUT_SECONDS", "120"))
+DEADLINE_MAX_SECONDS = float(os.getenv("DEADLINE_MAX_SECONDS", "600"))
+
+# Background job workers for long generations
+job_runner = JobRunner(
+    max_workers=int(os.getenv("JOB_MAX_WORKERS", "8")),
+    max_queue=int(os.getenv("JOB_MAX_QUEUE", "1000")),
+    poll_interval=float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+)
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "600"))
+JOB_MAX_WAIT_SECONDS = float(os.getenv("JOB_MAX_WAIT_SECONDS", "30"))
+
+# Export component counters (cache hit rates, queue depths) on /metrics
+stats_collector.register("response_cache", ai_manager.response_cache.stats)
+stats_collector.register("single_flight", ai_manager.single_flight.stats)
+stats_collector.register("context_cache", thread_context_cache.stats)
+stats_collector.register("history_cache", history_cache.stats)
+stats_collector.register("membership_cache", thread_membership.stats)
+stats_collector.register("admission", ai_manager.admission.stats)
+stats_collector.register("provider_config", ai_manager.registry.stats)
+stats_collector.register("jobs", job_runner.stats)
+
+# Upper bound on the number of provider/models a single fan-out request may target
+MAX_FAN_OUT_TARGETS = int(os.getenv("FAN_OUT_MAX_TARGETS", "4"))
+
+# Token-budget context packing, sized per model from the provider config
+context_builder = ContextBuilder(
+    ai_manager.get_model_config,
+    max_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "16000")),
+    thread_cache=thread_context_cache,
+    restore_archived=thread_membership.restore_if_archived
+)
 
 router = APIRouter()
 
+async def require_thread_member(db: AsyncSession, thread_id: Optional[str], user: User):
+    """Raise a 404 unless the user belongs to the thread"""
+    if not await thread_membership.is_member(db, user.id, thread_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Thread not found"
+        )
+
+async def load_thread_with_messages(db: AsyncSession, thread_id: str) -> Optional[ChatThread]:
+    """Load a thread with its messages, restoring them if the thread was archived since its membership was cached"""
+    thread = (await db.execute(thread_with_messages_query(thread_id))).scalar_one_or_none()
+    if thread is not None and thread.archived_at is not None:
+        await thread_membership.restore(db, thread_id)
+        thread = (await db.execute(
+            thread_with_messages_query(thread_id).execution_options(populate_existing=True)
+        )).scalar_one_or_none()
+    return thread
+
+def touch_thread(thread_id: str):
+    """Statement bumping a thread's updated_at, which orders the history"""
+    return update(ChatThread).where(ChatThread.id == thread_id).values(
+        updated_at=datetime.utcnow()
+    ).execution_options(synchronize_session=False)
+
+# Get provider health and circuit breaker state
+@router.get("/providers/health")
+async def get_provider_health(
+    current_user: User = Depends(get_current_user)
+):
+    """Get the health score and circuit breaker state of each provider/model"""
+    return ai_manager.health.snapshot()
+
+# Get rate limit queue state
+@router.get("/providers/admission")
+async def get_provider_admission(
+    current_user: User = Depends(get_current_user)
+):
+    """Get the admission queue depth and counters of each rate-limited provider/model"""
+    return ai_manager.admission.stats()
+
 # Create a new chat thread
 @router.post("/threads", response_model=ChatThreadResponse)
 async def create_thread(
     thread: ChatThreadCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create a new chat thread for the current user"""
@@ -62,7 +175,8 @@ async def create_thread(
     new_thread = ChatThread(
         title=thread.title,
         created_at=datetime.utcnow(),
-        updated_at=datetime.utcnow()
+        updated_at=datetime.utcnow(),
+        messages=[]
     )
     
     # Associate the thread with the user
@@ -70,38 +184,52 @@ async def create_thread(
     
     # Add to database
     db.add(new_thread)
-    db.commit()
-    db.refresh(new_thread)
+    await db.commit()
+    thread_membership.add(current_user.id, new_thread.id)
+    history_cache.invalidate(current_user.id)
     
     return new_thread
 
-# Get all threads for the current user
-@router.get("/threads", response_model=List[ChatThreadResponse])
+# Get a page of the current user's threads
+@router.get("/threads", response_model=List[ChatThreadSummary])
 async def get_threads(
-    db: Session = Depends(get_db),
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all chat threads for the current user"""
-    # Get threads sorted by updated_at (latest first)
-    threads = db.query(ChatThread).filter(
-        ChatThread.users.any(id=current_user.id)
-    ).order_by(ChatThread.updated_at.desc()).all()
+    """
+    Get the current user's threads, latest first, without their messages.
+    Without `limit` or `cursor` every thread is returned. Otherwise pages are
+    keyed on (updated_at, id); pass the X-Next-Cursor header of a response as
+    `cursor` to get the next page.
+    """
+    # Clients written before pagination existed expect the whole list
+    if limit is None and cursor is None:
+        return (await db.execute(thread_list_query(current_user.id))).all()
     
-    return threads
+    size = page_size(limit)
+    # Fetch one extra row to learn whether another page follows
+    rows = (await db.execute(thread_list_query(current_user.id, cursor).limit(size + 1))).all()
+    if len(rows) > size:
+        rows = rows[:size]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].updated_at, rows[-1].id)
+    
+    return rows
 
 # Get a specific thread by ID
 @router.get("/threads/{thread_id}", response_model=ChatThreadResponse)
 async def get_thread(
     thread_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get a specific chat thread by ID"""
+    await require_thread_member(db, thread_id, current_user)
+    
     # Get thread with messages
-    thread = db.query(ChatThread).filter(
-        ChatThread.id == thread_id,
-        ChatThread.users.any(id=current_user.id)
-    ).first()
+    thread = await load_thread_with_messages(db, thread_id)
     
     if thread is None:
         raise HTTPException(
@@ -116,15 +244,14 @@ async def get_thread(
 async def update_thread(
     thread_id: str,
     thread_update: ChatThreadCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Update a chat thread's title"""
+    await require_thread_member(db, thread_id, current_user)
+    
     # Find thread
-    thread = db.query(ChatThread).filter(
-        ChatThread.id == thread_id,
-        ChatThread.users.any(id=current_user.id)
-    ).first()
+    thread = await load_thread_with_messages(db, thread_id)
     
     if thread is None:
         raise HTTPException(
@@ -137,8 +264,8 @@ async def update_thread(
     thread.updated_at = datetime.utcnow()
     
     # Save changes
-    db.commit()
-    db.refresh(thread)
+    await db.commit()
+    history_cache.invalidate(current_user.id)
     
     return thread
 
@@ -146,25 +273,30 @@ async def update_thread(
 @router.delete("/threads/{thread_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_thread(
     thread_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Delete a chat thread"""
-    # Find thread
-    thread = db.query(ChatThread).filter(
-        ChatThread.id == thread_id,
-        ChatThread.users.any(id=current_user.id)
-    ).first()
+    await require_thread_member(db, thread_id, current_user)
     
-    if thread is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Thread not found"
-        )
+    # Members whose history lists the thread
+    member_ids = (await db.execute(thread_members_query(thread_id))).scalars().all()
     
-    # Delete the thread
-    db.delete(thread)
-    db.commit()
+    # Delete the thread with set-based statements; an ORM cascade would first load
+    # every message and then the attachments of each message one by one
+    message_ids = select(Message.id).where(Message.thread_id == thread_id)
+    await db.execute(
+        delete(FileAttachment).where(FileAttachment.message_id.in_(message_ids)).execution_options(synchronize_session=False)
+    )
+    await db.execute(delete(Message).where(Message.thread_id == thread_id).execution_options(synchronize_session=False))
+    await db.execute(delete(MessageArchive).where(MessageArchive.thread_id == thread_id))
+    await db.execute(delete(user_thread).where(user_thread.c.thread_id == thread_id))
+    await db.execute(delete(ChatThread).where(ChatThread.id == thread_id).execution_options(synchronize_session=False))
+    await db.commit()
+    thread_context_cache.invalidate(thread_id)
+    thread_membership.invalidate_thread(thread_id)
+    for member_id in member_ids:
+        history_cache.invalidate(member_id)
     
     return None
 
@@ -173,17 +305,18 @@ async def delete_thread(
 async def create_message(
     thread_id: str,
     message: MessageCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Add a message to a chat thread"""
-    # Find thread
-    thread = db.query(ChatThread).filter(
-        ChatThread.id == thread_id,
-        ChatThread.users.any(id=current_user.id)
-    ).first()
+    await require_thread_member(db, thread_id, current_user)
     
-    if thread is None:
+    # Update thread's updated_at timestamp; no row means the thread was archived
+    # since its membership was cached (restore it first) or deleted by another worker
+    touched = (await db.execute(touch_thread(thread_id).where(ChatThread.archived_at.is_(None)))).rowcount
+    if touched == 0 and await thread_membership.restore_if_archived(db, thread_id):
+        touched = (await db.execute(touch_thread(thread_id))).rowcount
+    if touched == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Thread not found"
@@ -194,8 +327,9 @@ async def create_message(
         content=message.content,
         sender=message.sender,
         timestamp=datetime.utcnow(),
-        thread_id=thread.id,
-        user_id=current_user.id if message.sender == "user" else None
+        thread_id=thread_id,
+        user_id=current_user.id if message.sender == "user" else None,
+        files=[]
     )
     
     # Add files if any
@@ -214,46 +348,99 @@ async def create_message(
     # Add message to database
     db.add(new_message)
     
-    # Update thread's updated_at timestamp
-    thread.updated_at = datetime.utcnow()
-    
     # Commit changes
-    db.commit()
-    db.refresh(new_message)
+    await db.commit()
+    
+    # Keep the cached thread context in step with what was just written
+    thread_context_cache.append_message(
+        thread_id, new_message.id, new_message.sender, new_message.content, new_message.timestamp, new_message.files
+    )
+    history_cache.invalidate(current_user.id)
     
     return new_message
 
+# Get a page of a thread's messages
+@router.get("/threads/{thread_id}/messages", response_model=List[MessageResponse])
+async def get_messages(
+    thread_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get a thread's messages, newest first, keyed on (timestamp, id); pass the
+    X-Next-Cursor header of a response as `cursor` to get older messages
+    """
+    await require_thread_member(db, thread_id, current_user)
+    
+    size = page_size(limit)
+    messages = (await db.execute(message_page_query(thread_id, cursor).limit(size + 1))).scalars().all()
+    # An archived thread has no rows in messages; restore it and read again
+    if not messages and cursor is None and await thread_membership.restore_if_archived(db, thread_id):
+        messages = (await db.execute(message_page_query(thread_id).limit(size + 1))).scalars().all()
+    if len(messages) > size:
+        messages = messages[:size]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(messages[-1].timestamp, messages[-1].id)
+    
+    return messages
+
 # Get chat history grouped by date
-@router.get("/history", response_model=Dict[str, List[ChatThreadResponse]])
+@router.get("/history", response_model=Dict[str, List[ChatThreadSummary]])
 async def get_chat_history(
-    db: Session = Depends(get_db),
+    tz: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get chat history grouped by date"""
-    # Get threads for the current user
-    threads = db.query(ChatThread).filter(
-        ChatThread.users.any(id=current_user.id)
-    ).order_by(ChatThread.updated_at.desc()).all()
+    """
+    Get the current user's threads, without their messages, grouped by the
+    day they were last updated in the `tz` time zone (IANA name or "+HH:MM"
+    offset, UTC by default)
+    """
+    offset = utc_offset(tz)
+    history_by_date = history_cache.get(current_user.id, offset)
+    if history_by_date is not None:
+        return history_by_date
     
-    # Group threads by date
-    history_by_date = {}
+    # Bucket the threads by local day in the query, selecting only the summary columns
+    rows = (await db.execute(history_query(current_user.id, offset))).all()
     
-    for thread in threads:
-        # Format date string
-        date_str = thread.updated_at.strftime("%B %d, %Y")
-        
-        # Add to the appropriate date group
-        if date_str not in history_by_date:
-            history_by_date[date_str] = []
-        
-        history_by_date[date_str].append(thread)
+    # Rows arrive latest first, so each day's threads keep that order
+    history_by_date = {}
+    for row in rows:
+        date_str = row.day.strftime("%B %d, %Y")
+        history_by_date.setdefault(date_str, []).append(ChatThreadSummary.model_validate(row))
     
+    history_cache.put(current_user.id, offset, history_by_date)
     return history_by_date
 
+async def build_message_context(db: AsyncSession, thread_id: str, content: str, provider: str, model: str):
+    """
+    Build the provider message list and file payloads for a thread,
+    packed into the model's token budget
+    Returns: (messages, files_content)
+    """
+    return await context_builder.build(db, thread_id, content, provider, model)
+
+def request_deadline(message_content: dict, default_seconds: float) -> float:
+    """Deadline of a request in seconds: the client's `timeout` (capped by DEADLINE_MAX_SECONDS) or the route default"""
+    requested = message_content.get("timeout")
+    if requested is None:
+        return default_seconds
+    try:
+        requested = float(requested)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="timeout must be a number of seconds"
+        )
+    return max(1.0, min(requested, DEADLINE_MAX_SECONDS))
+
 @router.post("/process-message", response_model=MessageResponse)
 async def process_message(
     message_content: dict = Body(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -264,86 +451,70 @@ async def process_message(
     provider = message_content.get("provider", "openai")
     model = message_content.get("model", "gpt-4o")
     has_images = message_content.get("has_images", False)
+    use_cache = message_content.get("use_cache", True)
+    deadline = request_deadline(message_content, DEADLINE_PROCESS_MESSAGE_SECONDS)
     
     # Validate thread
-    thread = db.query(ChatThread).filter(
-        ChatThread.id == thread_id,
-        ChatThread.users.any(id=current_user.id)
-    ).first()
-    
-    if thread is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Thread not found"
-        )
+    with tracer.child_span("thread.validate"):
+        await require_thread_member(db, thread_id, current_user)
     
     try:
-        # Get message history and format for AI
-        messages = []
-        
-        # Include system instruction for better response quality
-        system_message = {
-            "role": "system",
-            "content": "You are a helpful assistant that provides accurate, informative, and friendly responses."
-        }
-        messages.append(system_message)
-        
-        # Get the thread's message history (limited to last 10 messages for context)
-        thread_messages = db.query(Message).filter(
-            Message.thread_id == thread_id
-        ).order_by(Message.timestamp.desc()).limit(10).all()
-        
-        # Reverse to get chronological order
-        thread_messages.reverse()
-        
-        # Convert to AI format
-        for msg in thread_messages:
-            messages.append({
-                "role": "user" if msg.sender == "user" else "assistant",
-                "content": msg.content
-            })
+        # Get message history and file attachments formatted for AI
+        messages, files_content = await build_message_context(db, thread_id, content, provider, model)
+        # End the read transaction so no pooled connection is held during the provider call
+        await db.commit()
         
-        # Add the current message
-        messages.append({
-            "role": "user",
-            "content": content
-        })
-        
-        # Process file attachments if any
-        files_content = None
-        last_message = db.query(Message).filter(
-            Message.thread_id == thread_id,
-            Message.sender == "user"
-        ).order_by(Message.timestamp.desc()).first()
-        
-        if last_message and last_message.files:
-            files_content = prepare_files_for_ai(last_message.files)
-        
-        # Get response using the AI provider manager with fallback
-        response_text = ai_manager.execute_with_fallback(
-            provider, model, 
-            get_ai_response, 
-            messages, files_content, has_images
-        )
+        # Get response using the AI provider manager with fallback, bounded by the request deadline
+        with deadline_scope(deadline):
+            response_text = await ai_manager.execute_with_fallback(
+                provider, model, 
+                get_ai_response, 
+                messages, files_content, has_images,
+                use_cache=use_cache,
+                user_id=current_user.id
+            )
         
         # Create AI response message
         ai_message = Message(
             content=response_text,
             sender="assistant",
-            thread_id=thread.id
+            timestamp=datetime.utcnow(),
+            thread_id=thread_id,
+            files=[]
         )
         
-        # Add to database
-        db.add(ai_message)
-        db.commit()
-        db.refresh(ai_message)
-        
-        # Update thread's updated_at timestamp
-        thread.updated_at = datetime.utcnow()
-        db.commit()
+        # Add to database, updating the thread's updated_at timestamp in the same transaction
+        with tracer.child_span("message.persist"):
+            db.add(ai_message)
+            await db.execute(touch_thread(thread_id))
+            await db.commit()
+            thread_context_cache.append_message(thread_id, ai_message.id, ai_message.sender, ai_message.content, ai_message.timestamp)
+            history_cache.invalidate(current_user.id)
         
         return ai_message
         
+    except AdmissionRejected as e:
+        # Shed load instead of queueing past the provider's rate limits
+        logger.warning(f"Error processing message: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    except DeadlineExceeded as e:
+        logger.warning(f"Error processing message: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        )
+    except ProviderUnavailableError as e:
+        # Every candidate provider has an open circuit breaker, fail fast
+        logger.warning(f"Error processing message: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_after)))}
+        )
     except Exception as e:
         # Handle any errors during API processing
         logger.error(f"Error processing message: {str(e)}")
@@ -352,9 +523,415 @@ async def process_message(
             detail=f"Error processing message: {str(e)}"
         )
 
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a single Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/process-message/stream")
+async def process_message_stream(
+    message_content: dict = Body(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Process a user message and stream the AI response as Server-Sent Events.
+    Emits `delta` events with incremental content, then a `done` event carrying
+    the persisted assistant message (or an `error` event if the provider fails).
+    """
+    content = message_content.get("content", "")
+    thread_id = message_content.get("thread_id")
+    provider = message_content.get("provider", "openai")
+    model = message_content.get("model", "gpt-4o")
+    has_images = message_content.get("has_images", False)
+    use_cache = message_content.get("use_cache", True)
+    
+    # Validate thread
+    with tracer.child_span("thread.validate"):
+        await require_thread_member(db, thread_id, current_user)
+    
+    deadline = request_deadline(message_content, DEADLINE_STREAM_SECONDS)
+    
+    # Build the context before the response starts so file errors surface as HTTP errors
+    messages, files_content = await build_message_context(db, thread_id, content, provider, model)
+    # Release the pooled connection before streaming; it is taken again to persist the answer
+    await db.commit()
+    
+    # Admit the request before streaming starts so rate limiting can still answer with a 429
+    try:
+        await ai_manager.admit(current_user.id, provider, model, messages, files_content)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    
+    async def event_stream():
+        chunks = []
+        try:
+            with deadline_scope(deadline):
+                async for delta in ai_manager.stream_with_fallback(
+                    provider, model,
+                    stream_ai_response,
+                    messages, files_content, has_images,
+                    use_cache=use_cache,
+                    user_id=current_user.id,
+                    admitted=True
+                ):
+                    chunks.append(delta)
+                    yield format_sse_event("delta", {"content": delta})
+        except Exception as e:
+            logger.error(f"Error streaming message: {str(e)}")
+            yield format_sse_event("error", {"detail": f"Error processing message: {str(e)}"})
+            return
+        
+        # Persist the complete AI response once the stream has finished
+        ai_message = Message(
+            content="".join(chunks),
+            sender="assistant",
+            timestamp=datetime.utcnow(),
+            thread_id=thread_id,
+            files=[]
+        )
+        with tracer.child_span("message.persist"):
+            db.add(ai_message)
+            await db.execute(touch_thread(thread_id))
+            await db.commit()
+            thread_context_cache.append_message(thread_id, ai_message.id, ai_message.sender, ai_message.content, ai_message.timestamp)
+            history_cache.invalidate(current_user.id)
+        
+        response = MessageResponse.model_validate(ai_message)
+        yield format_sse_event("done", response.model_dump(mode="json"))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def provider_error_status(error: Exception):
+    """
+    Map an error from a provider call to the status code process_message would answer with
+    Returns: (status_code, detail)
+    """
+    if isinstance(error, AdmissionRejected):
+        status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    elif isinstance(error, ProviderUnavailableError):
+        status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    elif isinstance(error, DeadlineExceeded):
+        status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    elif isinstance(error, HTTPException):
+        status_code = error.status_code
+    else:
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    detail = error.detail if isinstance(error, HTTPException) else str(error)
+    return status_code, detail
+
+def fan_out_error(provider: str, model: str, error: Exception) -> Dict[str, Any]:
+    """Result entry for a fan-out target that failed"""
+    status_code, detail = provider_error_status(error)
+    return {"provider": provider, "model": model, "status": "error", "status_code": status_code, "detail": detail}
+
+@router.post("/process-message/fan-out")
+async def process_message_fan_out(
+    message_content: dict = Body(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Send one user message to several provider/models concurrently. The thread
+    context and attachments are prepared once, every answer is persisted as an
+    assistant message, and results are streamed as NDJSON lines in completion
+    order (or returned together in request order when `stream` is false).
+    """
+    content = message_content.get("content", "")
+    thread_id = message_content.get("thread_id")
+    targets = message_content.get("targets") or []
+    has_images = message_content.get("has_images", False)
+    use_cache = message_content.get("use_cache", True)
+    stream = message_content.get("stream", True)
+    deadline = request_deadline(message_content, DEADLINE_FAN_OUT_SECONDS)
+    
+    # Validate targets
+    target_pairs = []
+    for target in targets:
+        if not isinstance(target, dict) or not target.get("provider") or not target.get("model"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Each target needs a provider and a model"
+            )
+        if (target["provider"], target["model"]) not in target_pairs:
+            target_pairs.append((target["provider"], target["model"]))
+    
+    if not target_pairs or len(target_pairs) > MAX_FAN_OUT_TARGETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Between 1 and {MAX_FAN_OUT_TARGETS} targets are required"
+        )
+    
+    # Validate thread
+    await require_thread_member(db, thread_id, current_user)
+    
+    # Load the thread and process attachments once, then pack per model budget
+    contexts = await context_builder.build_many(db, thread_id, content, target_pairs)
+    # Release the pooled connection while the provider calls run
+    await db.commit()
+    
+    async def run_target(index: int):
+        provider, model = target_pairs[index]
+        messages, files_content = contexts[index]
+        try:
+            # No fallback: each answer must come from the model it is labelled with
+            response_text = await ai_manager.execute_with_fallback(
+                provider, model,
+                get_ai_response,
+                messages, files_content, has_images,
+                use_cache=use_cache,
+                user_id=current_user.id,
+                fallback=False
+            )
+            return index, response_text, None
+        except Exception as e:
+            logger.error(f"Error processing message with {provider}/{model}: {str(e)}")
+            return index, None, e
+    
+    async def iter_results():
+        # Tasks inherit the deadline from the context they are created in
+        with deadline_scope(deadline):
+            tasks = [asyncio.ensure_future(run_target(index)) for index in range(len(target_pairs))]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                index, response_text, error = await next_result
+                provider, model = target_pairs[index]
+                if error is not None:
+                    yield fan_out_error(provider, model, error)
+                    continue
+                
+                # Persist each answer as soon as it arrives
+                ai_message = Message(
+                    content=response_text,
+                    sender="assistant",
+                    timestamp=datetime.utcnow(),
+                    thread_id=thread_id,
+                    files=[]
+                )
+                db.add(ai_message)
+                await db.execute(touch_thread(thread_id))
+                await db.commit()
+                thread_context_cache.append_message(thread_id, ai_message.id, ai_message.sender, ai_message.content, ai_message.timestamp)
+                history_cache.invalidate(current_user.id)
+                
+                yield {
+                    "provider": provider,
+                    "model": model,
+                    "status": "ok",
+                    "message": MessageResponse.model_validate(ai_message).model_dump(mode="json")
+                }
+        finally:
+            # Stop outstanding provider calls if the client goes away
+            for task in tasks:
+                task.cancel()
+    
+    if not stream:
+        results = [result async for result in iter_results()]
+        order = {pair: index for index, pair in enumerate(target_pairs)}
+        results.sort(key=lambda result: order[(result["provider"], result["model"])])
+        return {"results": results}
+    
+    async def ndjson_stream():
+        async for result in iter_results():
+            yield json.dumps(result, default=str) + "\n"
+    
+    return StreamingResponse(
+        ndjson_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/process-message/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_message_job(
+    message_content: dict = Body(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Queue a user message for background processing and return the job at once.
+    Poll GET /process-message/jobs/{job_id} for the result.
+    """
+    content = message_content.get("content", "")
+    thread_id = message_content.get("thread_id")
+    provider = message_content.get("provider", "openai")
+    model = message_content.get("model", "gpt-4o")
+    has_images = message_content.get("has_images", False)
+    use_cache = message_content.get("use_cache", True)
+    
+    # Validate thread
+    await require_thread_member(db, thread_id, current_user)
+    
+    queue_full = HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many queued jobs",
+        headers={"Retry-After": str(max(1, int(job_runner.poll_interval)))}
+    )
+    if job_runner.is_full():
+        raise queue_full
+    
+    job = AIJob(
+        status=JOB_QUEUED,
+        provider=provider,
+        model=model,
+        content=content,
+        has_images=has_images,
+        use_cache=use_cache,
+        user_id=current_user.id,
+        thread_id=thread_id
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job, ["created_at", "message"])
+    
+    # The queue may have filled while the job was written; fail it rather than leave it queued
+    if not job_runner.submit(job.id):
+        await db.execute(
+            update(AIJob).where(AIJob.id == job.id).values(
+                status=JOB_FAILED, status_code=queue_full.status_code, error=queue_full.detail,
+                finished_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        raise queue_full
+    return job
+
+@router.get("/process-message/jobs/{job_id}", response_model=JobResponse)
+async def get_message_job(
+    job_id: str,
+    wait: float = 0,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get a background job. With wait > 0 the request long-polls, returning as soon
+    as the job finishes or after wait seconds (capped by JOB_MAX_WAIT_SECONDS).
+    """
+    deadline = time.monotonic() + min(max(wait, 0), JOB_MAX_WAIT_SECONDS)
+    user_id = current_user.id
+    
+    while True:
+        job = (await db.execute(job_query(job_id, user_id))).scalar_one_or_none()
+        
+        if job is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Job not found"
+            )
+        
+        remaining = deadline - time.monotonic()
+        if job.status in FINISHED_STATES or remaining <= 0:
+            return job
+        
+        # End the read transaction so no connection is held while waiting
+        await db.rollback()
+        await job_runner.wait(job_id, remaining)
+
+async def run_message_job(job_id: str):
+    """Execute a queued job: build the context, call the provider and persist the answer"""
+    async with AsyncSessionLocal() as db:
+        # Claim the job atomically so it runs once even if several workers pick it up
+        claimed = (await db.execute(
+            update(AIJob).where(
+                AIJob.id == job_id,
+                AIJob.status == JOB_QUEUED
+            ).values(status=JOB_RUNNING, started_at=datetime.utcnow()).execution_options(synchronize_session=False)
+        )).rowcount
+        await db.commit()
+        if not claimed:
+            return
+        
+        job = (await db.execute(select(AIJob).where(AIJob.id == job_id))).scalar_one()
+        thread_id, user_id = job.thread_id, job.user_id
+        
+        try:
+            messages, files_content = await build_message_context(db, thread_id, job.content or "", job.provider, job.model)
+            provider, model, has_images, use_cache = job.provider, job.model, job.has_images, job.use_cache
+            # Release the connection for the duration of the provider call
+            await db.commit()
+            
+            with deadline_scope(JOB_TIMEOUT_SECONDS):
+                response_text = await asyncio.wait_for(
+                    ai_manager.execute_with_fallback(
+                        provider, model,
+                        get_ai_response,
+                        messages, files_content, has_images,
+                        use_cache=use_cache,
+                        user_id=user_id
+                    ),
+                    JOB_TIMEOUT_SECONDS
+                )
+            
+            # Persist the answer and complete the job in one transaction
+            ai_message = Message(
+                content=response_text,
+                sender="assistant",
+                timestamp=datetime.utcnow(),
+                thread_id=thread_id
+            )
+            db.add(ai_message)
+            await db.flush()
+            job.status = JOB_COMPLETED
+            job.message_id = ai_message.id
+            job.finished_at = datetime.utcnow()
+            await db.execute(touch_thread(thread_id))
+            await db.commit()
+            thread_context_cache.append_message(thread_id, ai_message.id, ai_message.sender, ai_message.content, ai_message.timestamp)
+            history_cache.invalidate(user_id)
+            
+        except Exception as e:
+            await db.rollback()
+            if isinstance(e, asyncio.TimeoutError):
+                status_code, detail = status.HTTP_504_GATEWAY_TIMEOUT, f"Job timed out after {JOB_TIMEOUT_SECONDS:.0f} seconds"
+            else:
+                status_code, detail = provider_error_status(e)
+            logger.error(f"Error processing job {job_id}: {detail}")
+            await db.execute(
+                update(AIJob).where(AIJob.id == job_id).values(
+                    status=JOB_FAILED, status_code=status_code, error=str(detail), finished_at=datetime.utcnow()
+                ).execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+async def resubmit_queued_jobs():
+    """
+    Queue jobs left in the queued state, e.g. by a restart, and fail running jobs
+    that outlived the job timeout (called on app startup)
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            stale_before = datetime.utcnow() - timedelta(seconds=JOB_TIMEOUT_SECONDS)
+            await db.execute(
+                update(AIJob).where(
+                    AIJob.status == JOB_RUNNING,
+                    AIJob.started_at < stale_before
+                ).values(
+                    status=JOB_FAILED, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    error="Job was interrupted", finished_at=datetime.utcnow()
+                ).execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            
+            job_ids = (await db.execute(queued_jobs_query(job_runner.max_queue))).scalars().all()
+    except Exception as e:
+        logger.warning(f"Could not recover queued jobs: {str(e)}")
+        return
+    
+    for job_id in job_ids:
+        if not job_runner.submit(job_id):
+            break
+    if job_ids:
+        logger.info(f"Resubmitted {len(job_ids)} queued jobs")
+
 # AI Provider API Handlers
-def process_openai_request(messages, model, files=None, has_images=False):
-    """Process request using OpenAI API with message history and files"""
+def build_openai_request(messages, model, files=None, has_images=False):
+    """Build the OpenAI request (url, headers, payload) with message history and files"""
     api_key = os.getenv("OPENAI_API_KEY")
     headers = {
         "Authorization": f"Bearer {api_key}",
@@ -414,7 +991,10 @@ def process_openai_request(messages, model, files=None, has_images=False):
                 # Find the last user message and add file content
                 for i in range(len(formatted_messages) - 1, -1, -1):
                     if formatted_messages[i]["role"] == "user":
-                        formatted_messages[i]["content"] = f"{file_content}\n\n{formatted_messages[i]['content']}"
+                        formatted_messages[i] = {
+                            **formatted_messages[i],
+                            "content": f"{file_content}\n\n{formatted_messages[i]['content']}"
+                        }
                         break
     
     # Create the payload
@@ -424,24 +1004,26 @@ def process_openai_request(messages, model, files=None, has_images=False):
         "max_tokens": 1500
     }
     
-    # Make the API request
-    response = requests.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers=headers,
-        json=payload
-    )
+    return provider_url("openai", "/v1/chat/completions"), headers, payload
+
+async def process_openai_request(messages, model, files=None, has_images=False):
+    """Process request using OpenAI API with message history and files"""
+    url, headers, payload = build_openai_request(messages, model, files, has_images)
     
-    if response.status_code != 200:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"OpenAI API error: {response.text}"
-        )
+    # Make the API request over the pooled provider connection, retrying transient failures
+    response = await post_provider("openai", "OpenAI", url, headers, payload)
     
     response_data = response.json()
     return response_data["choices"][0]["message"]["content"]
 
-def process_gemini_request(messages, model, files=None, has_images=False):
-    """Process request using Google's Gemini API with message history and files"""
+async def stream_openai_request(messages, model, files=None, has_images=False):
+    """Stream response deltas from the OpenAI API"""
+    url, headers, payload = build_openai_request(messages, model, files, has_images)
+    async for delta in stream_chat_completions("openai", "OpenAI", url, headers, payload):
+        yield delta
+
+def build_gemini_request(messages, model, files=None, has_images=False, stream=False):
+    """Build the Gemini request (url, headers, payload) with message history and files"""
     api_key = os.getenv("GEMINI_API_KEY")
     
     # Determine the model to use based on image presence
@@ -452,7 +1034,10 @@ def process_gemini_request(messages, model, files=None, has_images=False):
         # Use standard Gemini Pro
         gemini_model = "gemini-pro"
     
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{gemini_model}:generateContent?key={api_key}"
+    if stream:
+        url = provider_url("gemini", f"/v1beta/models/{gemini_model}:streamGenerateContent?alt=sse&key={api_key}")
+    else:
+        url = provider_url("gemini", f"/v1beta/models/{gemini_model}:generateContent?key={api_key}")
     
     # Format messages for Gemini
     formatted_contents = []
@@ -514,23 +1099,32 @@ def process_gemini_request(messages, model, files=None, has_images=False):
         }
     }
     
-    response = requests.post(
-        url,
-        json=payload,
-        headers={"Content-Type": "application/json"}
-    )
+    return url, {"Content-Type": "application/json"}, payload
+
+async def process_gemini_request(messages, model, files=None, has_images=False):
+    """Process request using Google's Gemini API with message history and files"""
+    url, headers, payload = build_gemini_request(messages, model, files, has_images)
     
-    if response.status_code != 200:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Gemini API error: {response.text}"
-        )
+    # Make the API request over the pooled provider connection, retrying transient failures
+    response = await post_provider("gemini", "Gemini", url, headers, payload)
     
     response_data = response.json()
     return response_data["candidates"][0]["content"]["parts"][0]["text"]
 
-def process_mistral_request(messages, model, files=None, has_images=False):
-    """Process request using Mistral API with message history and files"""
+async def stream_gemini_request(messages, model, files=None, has_images=False):
+    """Stream response deltas from the Gemini API"""
+    url, headers, payload = build_gemini_request(messages, model, files, has_images, stream=True)
+    
+    async with open_provider_stream("gemini", "Gemini", url, headers, payload) as response:
+        async for data in iter_sse_data(response):
+            chunk = json.loads(data)
+            for candidate in chunk.get("candidates", []):
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+
+def build_mistral_request(messages, model, files=None, has_images=False):
+    """Build the Mistral request (url, headers, payload) with message history and files"""
     api_key = os.getenv("MISTRAL_API_KEY")
     headers = {
         "Authorization": f"Bearer {api_key}",
@@ -566,24 +1160,26 @@ def process_mistral_request(messages, model, files=None, has_images=False):
         "max_tokens": 1500
     }
     
-    # Make the API request
-    response = requests.post(
-        "https://api.mistral.ai/v1/chat/completions",
-        headers=headers,
-        json=payload
-    )
+    return provider_url("mistral", "/v1/chat/completions"), headers, payload
+
+async def process_mistral_request(messages, model, files=None, has_images=False):
+    """Process request using Mistral API with message history and files"""
+    url, headers, payload = build_mistral_request(messages, model, files, has_images)
     
-    if response.status_code != 200:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Mistral API error: {response.text}"
-        )
+    # Make the API request over the pooled provider connection, retrying transient failures
+    response = await post_provider("mistral", "Mistral", url, headers, payload)
     
     response_data = response.json()
     return response_data["choices"][0]["message"]["content"]
 
-def process_deepseek_request(messages, model, files=None, has_images=False):
-    """Process request using DeepSeek API with message history and files"""
+async def stream_mistral_request(messages, model, files=None, has_images=False):
+    """Stream response deltas from the Mistral API"""
+    url, headers, payload = build_mistral_request(messages, model, files, has_images)
+    async for delta in stream_chat_completions("mistral", "Mistral", url, headers, payload):
+        yield delta
+
+def build_deepseek_request(messages, model, files=None, has_images=False):
+    """Build the DeepSeek request (url, headers, payload) with message history and files"""
     api_key = os.getenv("DEEPSEEK_API_KEY")
     headers = {
         "Authorization": f"Bearer {api_key}",
@@ -613,7 +1209,7 @@ def process_deepseek_request(messages, model, files=None, has_images=False):
                     break
     
     # Determine which endpoint to use based on the model
-    endpoint = "https://api.deepseek.com/v1/chat/completions"
+    endpoint = provider_url("deepseek", "/v1/chat/completions")
     model_param = "deepseek-chat" if "chat" in model else "deepseek-coder"
     
     # Create the payload
@@ -623,34 +1219,152 @@ def process_deepseek_request(messages, model, files=None, has_images=False):
         "max_tokens": 1500
     }
     
-    # Make the API request
-    response = requests.post(
-        endpoint,
-        headers=headers,
-        json=payload
-    )
+    return endpoint, headers, payload
+
+async def process_deepseek_request(messages, model, files=None, has_images=False):
+    """Process request using DeepSeek API with message history and files"""
+    url, headers, payload = build_deepseek_request(messages, model, files, has_images)
     
-    if response.status_code != 200:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"DeepSeek API error: {response.text}"
-        )
+    # Make the API request over the pooled provider connection, retrying transient failures
+    response = await post_provider("deepseek", "DeepSeek", url, headers, payload)
     
     response_data = response.json()
     return response_data["choices"][0]["message"]["content"]
 
-def get_ai_response(provider, model, messages, files=None, has_images=False):
+async def stream_deepseek_request(messages, model, files=None, has_images=False):
+    """Stream response deltas from the DeepSeek API"""
+    url, headers, payload = build_deepseek_request(messages, model, files, has_images)
+    async for delta in stream_chat_completions("deepseek", "DeepSeek", url, headers, payload):
+        yield delta
+
+def build_huggingface_messages(messages, files=None):
+    """Format messages for a local Hugging Face chat model with text file content inlined"""
+    formatted_messages = [
+        {"role": msg["role"], "content": msg["content"] or ""}
+        for msg in messages
+    ]
+    
+    # Local models are text-only, so only non-image files are included
+    if files:
+        text_files = [f for f in files if not f.get('is_image', False) and f.get('content')]
+        if text_files:
+            file_content = "\n\n".join([f"--- File: {file['name']} ---\n{file['content']}" for file in text_files])
+            
+            # Find the last user message and add file content
+            for i in range(len(formatted_messages) - 1, -1, -1):
+                if formatted_messages[i]["role"] == "user":
+                    formatted_messages[i]["content"] = f"{file_content}\n\n{formatted_messages[i]['content']}"
+                    break
+    
+    return formatted_messages
+
+async def process_huggingface_request(messages, model, files=None, has_images=False):
+    """Process request with a local Hugging Face model, batched with concurrent requests"""
+    return await local_engine.generate(model, build_huggingface_messages(messages, files))
+
+async def stream_huggingface_request(messages, model, files=None, has_images=False):
+    """Local generation is batched, so the completion is delivered as a single chunk"""
+    yield await process_huggingface_request(messages, model, files, has_images)
+
+async def post_provider(provider, provider_name, url, headers, payload):
+    """POST to a provider API with timeouts bound by the request deadline, retrying transient failures"""
+    client = http_clients.get(provider)
+    
+    async def attempt():
+        response = await client.post(url, headers=headers, json=payload, timeout=request_timeout(client.timeout))
+        if response.status_code != 200:
+            raise ProviderAPIError(
+                provider_name, response.status_code, response.text,
+                parse_retry_after(response.headers.get("retry-after"))
+            )
+        return response
+    
+    return await provider_retry.run(attempt, provider_name)
+
+@asynccontextmanager
+async def open_provider_stream(provider, provider_name, url, headers, payload):
+    """
+    Open a streaming POST to a provider API. Failures before the response
+    headers arrive are retried; once streaming has started nothing is retried.
+    """
+    client = http_clients.get(provider)
+    
+    async def attempt():
+        request = client.build_request("POST", url, headers=headers, json=payload, timeout=request_timeout(client.timeout))
+        response = await client.send(request, stream=True)
+        if response.status_code != 200:
+            await response.aread()
+            await response.aclose()
+            raise ProviderAPIError(
+                provider_name, response.status_code, response.text,
+                parse_retry_after(response.headers.get("retry-after"))
+            )
+        return response
+    
+    response = await provider_retry.run(attempt, provider_name)
+    try:
+        yield response
+    finally:
+        await response.aclose()
+
+async def iter_sse_data(response):
+    """Yield the `data:` payloads of a Server-Sent Events response, stopping at the request deadline"""
+    async for line in response.aiter_lines():
+        check_deadline()
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        yield data
+
+async def stream_chat_completions(provider, provider_name, url, headers, payload):
+    """Stream content deltas from an OpenAI-compatible chat completions endpoint"""
+    async with open_provider_stream(provider, provider_name, url, headers, {**payload, "stream": True}) as response:
+        async for data in iter_sse_data(response):
+            chunk = json.loads(data)
+            for choice in chunk.get("choices", []):
+                delta = choice.get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+async def get_ai_response(provider, model, messages, files=None, has_images=False):
     """Route the request to the appropriate AI provider with message history and files"""
     logger.info(f"Processing with provider: {provider}, model: {model}")
     
     if provider == "openai":
-        return process_openai_request(messages, model, files, has_images)
+        return await process_openai_request(messages, model, files, has_images)
     elif provider == "gemini":
-        return process_gemini_request(messages, model, files, has_images)
+        return await process_gemini_request(messages, model, files, has_images)
     elif provider == "mistral":
-        return process_mistral_request(messages, model, files, has_images)
+        return await process_mistral_request(messages, model, files, has_images)
     elif provider == "deepseek":
-        return process_deepseek_request(messages, model, files, has_images)
+        return await process_deepseek_request(messages, model, files, has_images)
+    elif provider == "huggingface":
+        return await process_huggingface_request(messages, model, files, has_images)
     else:
         # Fallback to a generic response if provider not supported
         return f"Using {provider}'s {model}: I understand your message and am here to help."
+
+async def stream_ai_response(provider, model, messages, files=None, has_images=False):
+    """Route a streaming request to the appropriate AI provider, yielding content deltas"""
+    logger.info(f"Streaming with provider: {provider}, model: {model}")
+    
+    if provider == "openai":
+        async for delta in stream_openai_request(messages, model, files, has_images):
+            yield delta
+    elif provider == "gemini":
+        async for delta in stream_gemini_request(messages, model, files, has_images):
+            yield delta
+    elif provider == "mistral":
+        async for delta in stream_mistral_request(messages, model, files, has_images):
+            yield delta
+    elif provider == "deepseek":
+        async for delta in stream_deepseek_request(messages, model, files, has_images):
+            yield delta
+    elif provider == "huggingface":
+        async for delta in stream_huggingface_request(messages, model, files, has_images):
+            yield delta
+    else:
+        # Fallback to a generic response if provider not supported
+        yield f"Using {provider}'s {model}: I understand your message and am here to help."
@@ -1,9 +1,10 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Body
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from database import get_db
 from models import User
+from queries import user_by_email_query
 from utils import get_current_user
 from dotenv import load_dotenv
 import os
@@ -166,11 +167,11 @@ def get_password_reset_email(name: str, reset_link: str) -> tuple:
 async def send_verification_email(
     background_tasks: BackgroundTasks,
     email: EmailStr = Body(..., embed=True),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Send a verification email to a user"""
     # Find user by email
-    user = db.query(User).filter(User.email == email).first()
+    user = (await db.execute(user_by_email_query(email))).scalar_one_or_none()
     
     if not user:
         raise HTTPException(
@@ -199,11 +200,11 @@ async def send_verification_email(
 async def send_password_reset_email(
     background_tasks: BackgroundTasks,
     email: EmailStr = Body(..., embed=True),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Send a password reset email to a user"""
     # Find user by email
-    user = db.query(User).filter(User.email == email).first()
+    user = (await db.execute(user_by_email_query(email))).scalar_one_or_none()
     
     if not user:
         raise HTTPException(
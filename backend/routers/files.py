@@ -1,11 +1,13 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 from typing import List
 from database import get_db
 from models import User, FileAttachment
 from schemas import FileAttachmentResponse
+from loaders import FILE_WITH_MESSAGE
 from utils import get_current_user, save_file, is_image_file
 from dotenv import load_dotenv
 
@@ -17,7 +19,7 @@ router = APIRouter()
 @router.post("/upload", response_model=List[FileAttachmentResponse])
 async def upload_files(
     files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     upload_dir = os.getenv("UPLOAD_DIRECTORY", "uploads")
@@ -58,11 +60,13 @@ async def upload_files(
 @router.delete("/files/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_file(
     file_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     # Find file by ID
-    file = db.query(FileAttachment).filter(FileAttachment.id == file_id).first()
+    file = (await db.execute(
+        select(FileAttachment).options(*FILE_WITH_MESSAGE).where(FileAttachment.id == file_id)
+    )).scalar_one_or_none()
     
     if not file:
         raise HTTPException(
@@ -84,7 +88,7 @@ async def delete_file(
         os.remove(file_path)
     
     # Delete file record
-    db.delete(file)
-    db.commit()
+    await db.delete(file)
+    await db.commit()
     
     return None
@@ -71,15 +71,34 @@ class ChatThreadBase(BaseModel):
 class ChatThreadCreate(ChatThreadBase):
     pass
 
-class ChatThreadResponse(ChatThreadBase):
+class ChatThreadSummary(ChatThreadBase):
     id: str
     created_at: datetime
     updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class ChatThreadResponse(ChatThreadSummary):
     messages: List[MessageResponse] = []
+
+# Background job schemas
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    thread_id: str
+    provider: str
+    model: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+    message: Optional[MessageResponse] = None
     
     class Config:
         from_attributes = True
 
 class ChatHistoryByDate(BaseModel):
     date: str
-    threads: List[ChatThreadResponse]
+    threads: List[ChatThreadSummary]
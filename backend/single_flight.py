@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+from retry import DeadlineExceeded, remaining_time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key onto a single execution.
+    The first caller for a key starts the call; callers arriving while it is
+    in flight wait on the same task and receive its result or exception.
+    """
+
+    def __init__(self, default_timeout: Optional[float] = None):
+        self.default_timeout = default_timeout
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """
+        Run func() once per key at a time and share the outcome with all waiters.
+        timeout bounds how long this caller waits; it does not cancel the shared call.
+        Under a request deadline the wait lasts until the deadline, and
+        default_timeout only applies to callers without one. A caller that
+        runs out of time gets DeadlineExceeded.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalescing request onto in-flight call ({len(self._inflight)} keys in flight)")
+
+        left = remaining_time()
+        if left is not None:
+            wait_timeout = max(0.0, left) if timeout is None else min(timeout, max(0.0, left))
+        else:
+            wait_timeout = timeout if timeout is not None else self.default_timeout
+        # Shield the shared task so one waiter timing out or disconnecting
+        # does not cancel the call for everyone else
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), wait_timeout)
+        except asyncio.TimeoutError as e:
+            if task.done():
+                # The shared call itself failed with a timeout
+                raise
+            raise DeadlineExceeded(f"Timed out after {wait_timeout:.0f} seconds waiting for an in-flight call") from e
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "executions": self.executions,
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,41 @@
+import asyncio
+from routers import chat
+
+class StubEngine:
+    """Records what the route hands to the local inference engine"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def generate(self, model_id, messages):
+        self.calls.append((model_id, messages))
+        return "stub answer"
+
+def test_process_huggingface_request_passes_formatted_messages(monkeypatch):
+    engine = StubEngine()
+    monkeypatch.setattr(chat, "local_engine", engine)
+    messages = [
+        {"role": "system", "content": "Be brief"},
+        {"role": "user", "content": "Summarise the file"}
+    ]
+    files = [
+        {"name": "notes.txt", "content": "line one", "is_image": False},
+        {"name": "photo.png", "content": "base64", "is_image": True}
+    ]
+
+    answer = asyncio.run(chat.process_huggingface_request(messages, "Qwen/Qwen2.5-0.5B-Instruct", files))
+
+    assert answer == "stub answer"
+    model_id, sent = engine.calls[0]
+    assert model_id == "Qwen/Qwen2.5-0.5B-Instruct"
+    assert isinstance(sent, list)
+    assert sent[0] == {"role": "system", "content": "Be brief"}
+    assert sent[1]["content"] == "--- File: notes.txt ---\nline one\n\nSummarise the file"
+
+def test_stream_huggingface_request_yields_one_chunk(monkeypatch):
+    monkeypatch.setattr(chat, "local_engine", StubEngine())
+
+    async def collect():
+        return [chunk async for chunk in chat.stream_huggingface_request([{"role": "user", "content": "hi"}], "m")]
+
+    assert asyncio.run(collect()) == ["stub answer"]
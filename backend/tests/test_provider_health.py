@@ -0,0 +1,58 @@
+import asyncio
+import httpx
+import pytest
+from ai_provider_manager import AIProviderManager
+from retry import DeadlineExceeded, ProviderAPIError, deadline_scope
+
+def make_manager():
+    """A manager with one unlimited candidate and no hedging"""
+    manager = AIProviderManager()
+    manager.admission.limits_lookup = lambda provider_id, model_id: None
+    manager.hedging_enabled = False
+    manager.get_candidates = lambda provider_id, model_id, fallback=True: [(provider_id, model_id)]
+    return manager
+
+def circuit(manager):
+    return {(entry["provider"], entry["model"]): entry for entry in manager.health.snapshot()}
+
+def test_short_client_deadline_leaves_circuit_closed():
+    manager = make_manager()
+
+    async def slow_provider(provider_id, model_id, messages, files, has_images):
+        # The provider client's timeout is clipped to the deadline and fires with it
+        await asyncio.sleep(0.02)
+        raise httpx.ReadTimeout("read timed out")
+
+    async def call(i):
+        with deadline_scope(0.01):
+            await manager.execute_with_fallback(
+                "openai", "gpt-4o", slow_provider, [{"role": "user", "content": f"question {i}"}], use_cache=False
+            )
+
+    for i in range(manager.health.min_requests * 2):
+        with pytest.raises((DeadlineExceeded, httpx.ReadTimeout)):
+            asyncio.run(call(i))
+
+    entry = circuit(manager)[("openai", "gpt-4o")]
+    assert entry["state"] == "closed"
+    assert entry["timeout_rate"] == 0
+    assert manager.health.is_available("openai", "gpt-4o")
+
+def fail_repeatedly(manager, error):
+    """Record enough failures to trip the circuit and return its state"""
+    for _ in range(manager.health.min_requests * 2):
+        manager.health.on_request("openai", "gpt-4o")
+        manager.health.record_failure("openai", "gpt-4o", error)
+    return circuit(manager)[("openai", "gpt-4o")]["state"]
+
+def test_deadline_exceeded_is_not_a_provider_failure():
+    assert fail_repeatedly(make_manager(), DeadlineExceeded()) == "closed"
+
+def test_bad_request_is_not_a_provider_failure():
+    manager = make_manager()
+    assert fail_repeatedly(manager, ProviderAPIError("OpenAI", 400, "invalid model")) == "closed"
+    assert manager.health.is_available("openai", "gpt-4o")
+
+def test_server_errors_and_throttling_open_the_circuit():
+    assert fail_repeatedly(make_manager(), ProviderAPIError("OpenAI", 503, "overloaded")) == "open"
+    assert fail_repeatedly(make_manager(), ProviderAPIError("OpenAI", 429, "rate limited")) == "open"
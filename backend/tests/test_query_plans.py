@@ -0,0 +1,17 @@
+from sqlalchemy import create_engine, event
+import migrate
+from check_query_plans import _sqlite_convert_tz, check, remove_seed, seed
+
+def test_hot_queries_use_indexes_on_a_migrated_database(tmp_path, capsys):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    event.listen(engine, "connect", lambda dbapi_conn, record: dbapi_conn.create_function("convert_tz", 3, _sqlite_convert_tz))
+    migrate.upgrade(engine)
+
+    sample = seed(engine, users=3, threads=3, messages=10)
+    try:
+        ok = check(engine, sample, verbose=False)
+    finally:
+        remove_seed(engine, sample)
+        engine.dispose()
+
+    assert ok, capsys.readouterr().out
@@ -0,0 +1,27 @@
+import asyncio
+import pytest
+from retry import DeadlineExceeded, deadline_scope
+from single_flight import SingleFlight
+
+async def slow_answer():
+    await asyncio.sleep(0.1)
+    return "answer"
+
+def test_waiter_under_a_deadline_outlasts_the_default_timeout():
+    flight = SingleFlight(default_timeout=0.01)
+
+    async def call():
+        with deadline_scope(1):
+            return await flight.do("key", slow_answer)
+
+    assert asyncio.run(call()) == "answer"
+
+def test_waiter_past_its_deadline_gets_deadline_exceeded():
+    flight = SingleFlight(default_timeout=10)
+
+    async def call():
+        with deadline_scope(0.01):
+            return await flight.do("key", slow_answer)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(call())
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from database import Base
+from models import Message
+from queries import thread_with_messages_query
+from schemas import ChatThreadResponse
+from query_counter import assert_max_queries
+from benchmark_thread_load import create_thread
+
+async def load_thread(tmp_path, max_queries: int, lazy: bool = False) -> ChatThreadResponse:
+    """Create a thread with messages and attachments, then load and serialise it like GET /api/threads/{thread_id}"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'threads.db'}")
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        thread_id = await create_thread(Session, messages=20, attachments=15)
+
+        async with Session() as db:
+            with assert_max_queries(engine, max_queries):
+                thread = (await db.execute(thread_with_messages_query(thread_id))).scalar_one()
+                if lazy:
+                    # One more statement per message, as a lazy load of the attachments would cost
+                    for message in thread.messages:
+                        await db.execute(select(Message.id).where(Message.id == message.id))
+                return ChatThreadResponse.model_validate(thread)
+    finally:
+        await engine.dispose()
+
+def test_thread_with_messages_and_attachments_loads_in_two_queries(tmp_path):
+    thread = asyncio.run(load_thread(tmp_path, max_queries=2))
+
+    assert len(thread.messages) == 20
+    assert sum(len(message.files) for message in thread.messages) == 15
+
+def test_assert_max_queries_fails_when_the_budget_is_exceeded(tmp_path):
+    with pytest.raises(AssertionError, match="Expected at most 2 queries, got 22"):
+        asyncio.run(load_thread(tmp_path, max_queries=2, lazy=True))
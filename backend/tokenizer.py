@@ -0,0 +1,38 @@
+import math
+import logging
+from functools import lru_cache
+from typing import Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Approximate characters per token for the fallback counter
+CHARS_PER_TOKEN = 4
+
+def tokenizer_family(provider_id: str, model_id: str) -> str:
+    """Map a provider/model to the tokenizer family used to count its tokens"""
+    if provider_id == "openai":
+        return "o200k_base" if model_id.startswith("gpt-4o") else "cl100k_base"
+    return "approximate"
+
+@lru_cache(maxsize=None)
+def get_encoding(family: str):
+    """Load a tiktoken encoding once per family; None when tiktoken is unavailable"""
+    if family == "approximate":
+        return None
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(family)
+    except Exception as e:
+        logger.warning(f"Falling back to approximate token counts for {family}: {str(e)}")
+        return None
+
+def count_tokens(text: Optional[str], provider_id: str, model_id: str) -> int:
+    """Count the tokens of a text for a provider/model"""
+    if not text:
+        return 0
+    encoding = get_encoding(tokenizer_family(provider_id, model_id))
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
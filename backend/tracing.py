@@ -0,0 +1,337 @@
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+import httpx
+from sqlalchemy import event
+from dotenv import load_dotenv
+from metrics import route_label
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+TRACE_HEADER = "X-Trace-Id"
+
+class _Trace:
+    """Spans finished so far in one sampled trace; exported together when the root span ends"""
+
+    def __init__(self):
+        self.spans: List["Span"] = []
+        self.closed = False
+
+class Span:
+    """A timed operation within a trace"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 trace: Optional[_Trace], attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.trace = trace
+        self.attributes = dict(attributes) if attributes else {}
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        otlp = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 2 if self.parent_id is None else 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent_id:
+            otlp["parentSpanId"] = self.parent_id
+        return otlp
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class TraceExporter:
+    """
+    Exports finished traces from a background thread, in batches, either as
+    JSON lines to a local file or as OTLP/HTTP JSON to a collector. Traces
+    are dropped rather than blocking requests when the queue is full.
+    """
+
+    def __init__(self, exporter: str, file_path: str, otlp_endpoint: str, service_name: str,
+                 max_queue: int = 2048, batch_size: int = 256, flush_interval: float = 2.0):
+        self.exporter = exporter
+        self.file_path = file_path
+        self.otlp_endpoint = otlp_endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[List[Span]]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.Client] = None
+        self.exported = 0
+        self.dropped = 0
+
+    def submit(self, spans: List[Span]):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch: List[Span] = []
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    spans = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if spans is None:
+                    stop = True
+                    break
+                batch.extend(spans)
+            if batch:
+                try:
+                    self._export(batch)
+                    self.exported += len(batch)
+                except Exception as e:
+                    logger.warning(f"Could not export {len(batch)} spans: {str(e)}")
+            if stop:
+                return
+
+    def _export(self, spans: List[Span]):
+        if self.exporter == "file":
+            with open(self.file_path, "a", encoding="utf-8") as f:
+                for span in spans:
+                    f.write(json.dumps(span.to_dict(), default=str) + "\n")
+        elif self.exporter == "otlp":
+            if self._client is None:
+                self._client = httpx.Client(timeout=5.0)
+            payload = {
+                "resourceSpans": [{
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                    "scopeSpans": [{"scope": {"name": "chat-api"}, "spans": [span.to_otlp() for span in spans]}]
+                }]
+            }
+            response = self._client.post(self.otlp_endpoint, json=payload)
+            response.raise_for_status()
+
+    def shutdown(self):
+        """Flush queued traces and stop the export thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        self._thread = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+class Tracer:
+    """
+    Minimal in-process tracer. The sampling decision is made once per trace
+    at the root span (or taken from an incoming traceparent header); spans of
+    unsampled traces only carry ids, so tracing costs almost nothing for them.
+    """
+
+    def __init__(self, exporter: Optional[TraceExporter], sample_rate: float):
+        self.exporter = exporter
+        self.sample_rate = sample_rate if exporter is not None else 0.0
+        self._current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    def current_trace_id(self) -> Optional[str]:
+        span = self._current.get()
+        return span.trace_id if span else None
+
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None,
+                   traceparent: Optional[str] = None) -> Span:
+        parent = self._current.get()
+        if parent is not None:
+            return Span(name, parent.trace_id, parent.span_id, parent.sampled, parent.trace,
+                        attributes if parent.sampled else None)
+
+        # New trace, continuing the caller's trace when it sent a W3C traceparent header
+        remote = _parse_traceparent(traceparent) if traceparent else None
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+            sampled = sampled and self.exporter is not None
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+            sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        return Span(name, trace_id, parent_id, sampled, _Trace() if sampled else None,
+                    attributes if sampled else None)
+
+    def end_span(self, span: Span, root: bool = False):
+        if not span.sampled or span.trace.closed:
+            return
+        span.end_ns = time.time_ns()
+        span.trace.spans.append(span)
+        if root:
+            span.trace.closed = True
+            self.exporter.submit(span.trace.spans)
+
+    @contextmanager
+    def use_span(self, span: Span):
+        """Make span the current span for a block without ending it"""
+        token = self._current.set(span)
+        try:
+            yield span
+        finally:
+            self._current.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Trace a block; starts a new trace when there is no current span"""
+        span = self.start_span(name, attributes)
+        root = self._current.get() is None
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if span.sampled:
+                span.error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            self._current.reset(token)
+            self.end_span(span, root=root)
+
+    @contextmanager
+    def child_span(self, name: str, **attributes):
+        """Trace a block only inside an existing sampled trace"""
+        parent = self._current.get()
+        if parent is None or not parent.sampled:
+            yield None
+            return
+        with self.span(name, **attributes) as span:
+            yield span
+
+    def instrument_engine(self, engine):
+        """Record a span for every statement run on a SQLAlchemy engine inside a sampled trace"""
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            parent = self._current.get()
+            span = None
+            if parent is not None and parent.sampled:
+                span = self.start_span("db.query", {"db.statement": statement[:500]})
+            conn.info.setdefault("trace_spans", []).append(span)
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            span = conn.info["trace_spans"].pop()
+            if span is not None:
+                self.end_span(span)
+
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+def _parse_traceparent(header: str):
+    """Parse a W3C traceparent header: (trace_id, parent_span_id, sampled) or None"""
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+class TracingMiddleware:
+    """ASGI middleware opening the root span of each request and returning its trace id in X-Trace-Id"""
+
+    def __init__(self, app, tracer: "Tracer"):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        traceparent = headers.get(b"traceparent")
+        span = self.tracer.start_span(
+            f"{scope['method']} {scope['path']}",
+            {"http.method": scope["method"], "http.target": scope["path"]},
+            traceparent=traceparent.decode("latin-1") if traceparent else None
+        )
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(TRACE_HEADER.lower().encode(), span.trace_id.encode())]
+                span.set_attribute("http.status_code", message["status"])
+            await send(message)
+
+        try:
+            with self.tracer.use_span(span):
+                await self.app(scope, receive, send_with_trace_id)
+        except BaseException as e:
+            if span.sampled:
+                span.error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            # Name the root span after the matched route template once routing is done
+            if span.sampled:
+                span.name = f"{scope['method']} {route_label(scope)}"
+            self.tracer.end_span(span, root=True)
+
+def _build_tracer() -> Tracer:
+    exporter_name = os.getenv("TRACE_EXPORTER", "none").lower()
+    exporter = None
+    if exporter_name in ["file", "otlp"]:
+        exporter = TraceExporter(
+            exporter_name,
+            file_path=os.getenv("TRACE_FILE", "traces.jsonl"),
+            otlp_endpoint=os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"),
+            service_name=os.getenv("TRACE_SERVICE_NAME", "chat-api"),
+            max_queue=int(os.getenv("TRACE_MAX_QUEUE", "2048"))
+        )
+    return Tracer(exporter, sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.1")))
+
+# Shared tracer used across the app
+tracer = _build_tracer()
@@ -4,13 +4,15 @@ from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 import uuid
 from dotenv import load_dotenv
 from models import User
 from schemas import TokenData
 from database import get_db
+from tracing import tracer
 
 # Load environment variables
 load_dotenv()
@@ -41,7 +43,7 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -57,7 +59,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         raise credentials_exception
     
     # Get user from database
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+    with tracer.child_span("auth.get_current_user"):
+        user = (await db.execute(select(User).where(User.id == token_data.user_id))).scalar_one_or_none()
     if user is None:
         raise credentials_exception
     return user
@@ -24,8 +24,9 @@ export function useThreadManagement() {
       const threadsData = await api.get("/threads");
       setThreads(threadsData);
       
-      // Get history by date
-      const historyData = await api.get("/history");
+      // Get history grouped by the user's local day
+      const timeZone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+      const historyData = await api.get(`/history?tz=${encodeURIComponent(timeZone)}`);
       setThreadsByDate(historyData);
     } catch (error) {
       console.error("Error fetching threads:", error);